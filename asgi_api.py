@@ -0,0 +1,362 @@
+"""
+ASGI API for the RAG System for Portfolio Support (async-native counterpart of flask_api.py)
+
+The Flask app runs the whole request path synchronously: the API calls block on `requests`,
+`similarity_search` blocks on the embedding model and FAISS, and `llm.invoke` blocks on Ollama,
+so a worker thread sits idle during every network wait. This app serves the same pipeline from
+an asyncio event loop:
+  1. The backend API endpoints are called with an async HTTP client, and all lookups needed by a
+     query are awaited concurrently instead of one after another, each until its stage deadline
+     (request_executor.py); a lookup that misses it becomes a "data unavailable" note.
+  2. The CPU-bound query embedding and FAISS search run in the default thread pool executor,
+     overlapping with the API calls. Concurrent queries are batched by query_encoding.QueryBatcher.
+  3. The LLM is awaited on the session's pinned Ollama instance (llm_sessions.SessionLLMPool).
+
+The /chat endpoint keeps the request and response JSON contract of the Flask app:
+    POST /chat  {"query": "...", "corpus": "...", "session_id": "...", "filter": {...}}  ->  {"response": "..."}
+    (or 400 {"error": "Missing 'query' parameter"}, 404 for an unknown corpus)
+"corpus" is optional and routes the query to a corpus of the index registry (index_registry.py).
+"session_id" is optional; each session has its own history and index of scraped pages.
+"filter" is optional and restricts retrieval by chunk metadata, e.g. {"doc_type": "csv", "genre": "Business"}.
+POST /chat/batch?corpus=...  takes a JSONL body of {"query": ...} objects and streams JSONL results,
+one line per query as it finishes (with stage timings), then a summary line (batch_answering.py).
+GET /corpora reports memory and load-time metrics for each corpus.
+GET /refresh reports the background corpus refresh (corpus_refresher.py): last duration and index generation.
+GET /llm reports the prompt tokens and time Ollama spent re-evaluating prompts, per session, and
+the context tokens saved by context assembly (context_assembly.py).
+GET /latency reports per-request critical-path latency (stage durations, deadline misses, LLM time).
+
+Run it with:
+    uvicorn asgi_api:app --host 0.0.0.0 --port 8000
+
+Use `python benchmarks.py chat` to compare concurrent-client throughput against flask_api.py.
+
+Before running, ensure you have installed these packages:
+    !pip install langchain_community faiss-cpu sentence-transformers requests httpx starlette uvicorn
+"""
+
+import asyncio
+import contextlib
+import logging
+import time
+
+import httpx
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Route
+
+from rag_langchain_ai_system import (
+    API_BASE_URL,
+    API_TIMEOUT_SECONDS,
+    API_TOKEN,
+    download_documents_zip_with_etag,
+    extract_documents,
+    build_vector_store,
+    load_embeddings,
+    plan_api_lookups,
+    format_api_result,
+    format_api_error,
+    scraped_context,
+    canned_answer,
+    is_fresh_start,
+    scrape_sessions,
+    entity_store,
+    NOT_IN_SNAPSHOT,
+    DEFAULT_SESSION,
+    build_prompt,
+    context_assembler,
+    llm_pool,
+    latency_tracker,
+    request_executor,
+)
+from request_executor import STAGE_DEADLINES, RequestTimings, stage_kind, unavailable_note
+from index_registry import IndexRegistry, UnknownCorpusError, DEFAULT_CORPUS
+from corpus_refresher import CorpusRefresher
+from batch_answering import BATCH_WORKERS, answer_batch_lines, clamp_workers, parse_batch
+
+# Shared async HTTP client, corpus registry and background refresher, all created in the app lifespan below
+http_client = None
+registry = None
+refresher = None
+
+###############################
+# Async API Helper Functions  #
+###############################
+
+async def async_api_get(endpoint: str, params: dict) -> dict:
+    """
+    Call a GET endpoint with Authorization, without blocking the event loop.
+    """
+    response = await http_client.get(endpoint, params=params)
+    response.raise_for_status()
+    return response.json()
+
+
+async def resolve_lookup(item: dict, query: str, session_id: str):
+    """
+    Await one planned lookup. Entity lookups are answered from the local snapshot when possible.
+    Scrape lookups go through the scrape cache and the session's scrape
+    index (which embed on a cache miss), so they run in the default executor.
+    """
+    if item["name"] == "scrape":
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, scraped_context, item, query, session_id)
+    result = entity_store.answer(item)
+    if result is NOT_IN_SNAPSHOT:
+        result = await async_api_get(item["endpoint"], item["params"])
+    return result
+
+
+async def run_stage(name: str, awaitable, fallback, timings: RequestTimings):
+    """
+    Await one request stage until its deadline (request_executor.STAGE_DEADLINES, measured from
+    the start of the request). A stage that misses it or fails yields `fallback`.
+    """
+    deadline = STAGE_DEADLINES[stage_kind(name)]
+    start = time.perf_counter()
+    try:
+        result = await asyncio.wait_for(awaitable, max(deadline - (start - timings.started), 0))
+    except asyncio.TimeoutError:
+        logging.error("Stage %s missed its %.1fs deadline", name, deadline)
+        timings.stage(name, deadline, timed_out=True)
+        return fallback
+    except Exception as e:
+        logging.error("Stage %s failed: %s", name, e)
+        result = fallback
+    timings.stage(name, time.perf_counter() - start)
+    return result
+
+
+async def resolve_api_info(item: dict, query: str, session_id: str) -> str:
+    """
+    Async version of rag_langchain_ai_system.resolve_api_info: the formatted section for one
+    planned lookup, or a friendly note.
+    """
+    try:
+        result = await resolve_lookup(item, query, session_id)
+    except Exception as e:
+        logging.error("Error fetching %s with %s: %s", item["endpoint"], item["params"], e)
+        return format_api_error(item)
+    if item["name"] == "scrape":
+        # scraped_context returns the formatted section (or note) itself
+        return result
+    return format_api_result(item, result, query)
+
+
+async def fetch_api_info(query: str, conversation_history: str, session_id: str = DEFAULT_SESSION,
+                         timings: RequestTimings = None) -> str:
+    """
+    Async version of rag_langchain_ai_system.fetch_api_info.
+    All lookups planned for the query are awaited concurrently, each until its stage deadline;
+    the formatted output keeps the order of the plan.
+    """
+    timings = timings or RequestTimings()
+    plan = plan_api_lookups(query, conversation_history)
+    sections = await asyncio.gather(*(
+        run_stage(f"{'scrape' if item['name'] == 'scrape' else 'api'}:{index}:{item['name']}",
+                  resolve_api_info(item, query, session_id), unavailable_note(item["label"]), timings)
+        for index, item in enumerate(plan) if not isinstance(item, str)
+    ))
+    sections = iter(sections)
+    return "".join(item if isinstance(item, str) else next(sections) for item in plan)
+
+
+async def retrieve_context(retriever, query: str, search_filter: dict = None) -> str:
+    """
+    Run the CPU-bound query embedding, FAISS search and context assembly in the default executor.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, context_assembler.retrieve, retriever, query, search_filter)
+
+
+##################################
+# Retrieval-Augmented Generation #
+##################################
+
+async def generate_answer(query: str, conversation_history: str, retriever,
+                          session_id: str = DEFAULT_SESSION, search_filter: dict = None) -> str:
+    """
+    Async version of rag_langchain_ai_system.generate_answer.
+    Retrieval, the API lookups and the LLM warm-up start together, each stage bounded by its
+    deadline; the LLM call is awaited. The request's timing report goes to the latency tracker.
+    """
+    canned = canned_answer(query)
+    if canned is not None:
+        return canned
+
+    timings = RequestTimings()
+    request_executor.background("warmup", lambda: llm_pool.warm_up(session_id))
+    context_text, api_info = await asyncio.gather(
+        run_stage("retrieval", retrieve_context(retriever, query, search_filter), "", timings),
+        fetch_api_info(query, conversation_history, session_id, timings),
+    )
+    timings.inputs_ready()
+
+    prompt = build_prompt(query, conversation_history, context_text, api_info)
+
+    llm_start = time.perf_counter()
+    try:
+        return await llm_pool.ainvoke(prompt, session_id)
+    except Exception as e:
+        logging.error("Error invoking the LLM: %s", e)
+        return "Sorry, I encountered an error while generating the answer."
+    finally:
+        latency_tracker.add(timings.report(llm_seconds=time.perf_counter() - llm_start))
+
+
+##################################
+# ASGI App Setup                 #
+##################################
+
+# Global conversation history per corpus and session (for demo purposes, same as the Flask app)
+conversation_histories = {}
+
+
+async def chat(request: Request) -> JSONResponse:
+    try:
+        data = await request.json()
+    except ValueError:
+        data = None
+    if not isinstance(data, dict) or 'query' not in data:
+        return JSONResponse({'error': "Missing 'query' parameter"}, status_code=400)
+    user_query = data['query']
+    corpus = data.get('corpus', DEFAULT_CORPUS)
+    search_filter = data.get('filter')
+    if search_filter is not None and not isinstance(search_filter, dict):
+        return JSONResponse({'error': "'filter' must be an object"}, status_code=400)
+    try:
+        # A first query to a corpus loads its index from disk, so keep that off the event loop.
+        retriever = await asyncio.get_running_loop().run_in_executor(None, registry.get, corpus)
+    except UnknownCorpusError:
+        return JSONResponse({'error': f"Unknown corpus '{corpus}'"}, status_code=404)
+
+    # Each session keeps its own history and its own index of scraped pages.
+    session = f"{corpus}:{data.get('session_id', DEFAULT_SESSION)}"
+
+    # If query is a greeting or introductory query, reset history for a fresh start.
+    if is_fresh_start(user_query):
+        conversation_histories[session] = ""
+        scrape_sessions.reset(session)
+        response_text = await generate_answer(user_query, "", retriever, session)
+        return JSONResponse({'response': response_text})
+
+    history = conversation_histories.get(session, "") + f"\nUser: {user_query}"
+    conversation_histories[session] = history
+    answer = await generate_answer(user_query, history, retriever, session, search_filter)
+    conversation_histories[session] = conversation_histories[session] + f"\nAssistant: {answer}"
+    return JSONResponse({'response': answer})
+
+
+async def chat_batch(request: Request):
+    """
+    Answer a JSONL body of queries and stream the results back as JSONL. The batch runs on worker
+    threads (Starlette iterates the result generator in its thread pool).
+    """
+    corpus = request.query_params.get('corpus', DEFAULT_CORPUS)
+    try:
+        items = parse_batch((await request.body()).decode("utf-8", errors="replace").splitlines())
+    except ValueError as e:
+        return JSONResponse({'error': str(e)}, status_code=413)
+    try:
+        retriever = await asyncio.get_running_loop().run_in_executor(None, registry.get, corpus)
+    except UnknownCorpusError:
+        return JSONResponse({'error': f"Unknown corpus '{corpus}'"}, status_code=404)
+    try:
+        workers = clamp_workers(request.query_params.get('workers', BATCH_WORKERS))
+    except ValueError:
+        return JSONResponse({'error': "'workers' must be an integer"}, status_code=400)
+    return StreamingResponse(answer_batch_lines(items, retriever, workers), media_type='application/x-ndjson')
+
+
+async def corpora(request: Request) -> JSONResponse:
+    """
+    Memory and load-time metrics for each corpus.
+    """
+    return JSONResponse(registry.metrics())
+
+
+async def refresh_status(request: Request) -> JSONResponse:
+    """
+    Duration of the last background refresh and the current index generation.
+    """
+    return JSONResponse(refresher.status())
+
+
+async def llm_status(request: Request) -> JSONResponse:
+    """
+    Prompt tokens and time spent re-evaluating prompts, per session, and context tokens saved
+    by context assembly.
+    """
+    return JSONResponse(dict(llm_pool.stats(), context=context_assembler.stats()))
+
+
+async def latency(request: Request) -> JSONResponse:
+    """
+    Per-request critical-path latency: stage durations, deadline misses, LLM and total time.
+    """
+    return JSONResponse(latency_tracker.stats())
+
+
+##################################
+# App Startup and Initialization #
+##################################
+
+@contextlib.asynccontextmanager
+async def lifespan(app: Starlette):
+    global http_client, registry, refresher
+    http_client = httpx.AsyncClient(
+        base_url=API_BASE_URL,
+        headers={"Authorization": f"Bearer {API_TOKEN}"},
+        timeout=API_TIMEOUT_SECONDS,
+    )
+
+    # 1. Verify API credentials via the ping endpoint
+    try:
+        ping_info = await async_api_get("/ping", {})
+        logging.info("API Ping successful: %s", ping_info)
+    except Exception as e:
+        await http_client.aclose()
+        raise RuntimeError("Unable to verify API credentials. Please check your token.") from e
+
+    # 2. Pull the entity datasets once, then keep them in sync in the background
+    loop = asyncio.get_running_loop()
+    await loop.run_in_executor(None, entity_store.start)
+
+    # 3. Download and process documents (off the event loop; this is CPU and network heavy)
+    zip_bytes, etag = await loop.run_in_executor(None, download_documents_zip_with_etag, API_TOKEN)
+    docs = extract_documents(zip_bytes)
+    if not docs:
+        await http_client.aclose()
+        raise RuntimeError("No documents found.")
+    # The startup corpus stays in memory; other corpora load from disk on first use
+    registry = IndexRegistry(load_embeddings())
+    registry.put(DEFAULT_CORPUS, await loop.run_in_executor(None, build_vector_store, docs), pinned=True)
+    refresher = CorpusRefresher(registry, docs, etag=etag)
+    refresher.start()
+    print("Documents are loaded and indexed. The ASGI app is ready.")
+
+    try:
+        yield
+    finally:
+        refresher.stop()
+        entity_store.stop()
+        await http_client.aclose()
+
+
+app = Starlette(
+    routes=[
+        Route('/chat', chat, methods=['POST']),
+        Route('/chat/batch', chat_batch, methods=['POST']),
+        Route('/corpora', corpora, methods=['GET']),
+        Route('/refresh', refresh_status, methods=['GET']),
+        Route('/llm', llm_status, methods=['GET']),
+        Route('/latency', latency, methods=['GET']),
+    ],
+    lifespan=lifespan,
+)
+
+if __name__ == "__main__":
+    import uvicorn
+
+    uvicorn.run(app, host="0.0.0.0", port=8000)
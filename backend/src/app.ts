@@ -21,6 +21,7 @@ import investmentsRoutes from "./routes/investments";
 import sectorsRoutes from "./routes/sectors";
 import consultationsRoutes from "./routes/consultations";
 import scrapeRoutes from "./routes/scrape";
+import syncRoutes from "./routes/sync";
 
 // Auth middleware (applied to all routes except /auth/token)
 import { bearerAuth } from "./middleware/auth";
@@ -84,6 +85,7 @@ const options = {
       { name: "Sectors", description: "Sector endpoints" },
       { name: "Consultations", description: "Consultation endpoints" },
       { name: "Scrape", description: "Web scraping endpoints" },
+      { name: "Sync", description: "Bulk entity data export endpoints" },
     ],
   },
   // Point to the API docs in your route files (make sure your route files contain proper JSDoc annotations)
@@ -119,6 +121,7 @@ app.use("/api/investments", investmentsRoutes);
 app.use("/api/sectors", sectorsRoutes);
 app.use("/api/consultations", consultationsRoutes);
 app.use("/api/scrape", scrapeRoutes);
+app.use("/api/sync", syncRoutes);
 
 // Connect to MongoDB and seed data, then start the server.
 connectDB().then(() => {
@@ -1,5 +1,6 @@
 import { Router, Request, Response } from "express";
 import archiver from "archiver";
+import crypto from "crypto";
 import fs from "fs";
 import path from "path";
 
@@ -12,14 +13,28 @@ const router = Router();
  *     summary: Zips and downloads all documents from the documents folder.
  *     tags:
  *       - Documents
+ *     parameters:
+ *       - in: header
+ *         name: If-None-Match
+ *         required: false
+ *         schema:
+ *           type: string
+ *         description: ETag from a previous download. Returns 304 if the documents have not changed.
  *     responses:
  *       200:
  *         description: A zip file containing the documents.
+ *         headers:
+ *           ETag:
+ *             schema:
+ *               type: string
+ *             description: Identifies the current set of documents.
  *         content:
  *           application/zip:
  *             schema:
  *               type: string
  *               format: binary
+ *       304:
+ *         description: The documents have not changed since the ETag in If-None-Match.
  *       500:
  *         description: Documents directory not found or an error occurred while creating the zip.
  */
@@ -31,6 +46,22 @@ router.get("/download", (req: Request, res: Response) => {
     return res.status(500).json({ error: "Documents directory not found." });
   }
 
+  // The ETag is derived from file names, sizes and modification times, so clients polling for
+  // new documents can skip the download when nothing changed.
+  const signature = fs
+    .readdirSync(documentsDir)
+    .sort()
+    .map((file) => {
+      const stats = fs.statSync(path.join(documentsDir, file));
+      return `${file}:${stats.size}:${stats.mtimeMs}`;
+    })
+    .join("|");
+  const etag = `"${crypto.createHash("sha1").update(signature).digest("hex")}"`;
+  res.setHeader("ETag", etag);
+  if (req.headers["if-none-match"] === etag) {
+    return res.status(304).end();
+  }
+
   res.setHeader("Content-Type", "application/zip");
   res.setHeader("Content-Disposition", 'attachment; filename="documents.zip"');
 
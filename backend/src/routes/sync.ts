@@ -0,0 +1,70 @@
+import { Router, Request, Response } from "express";
+import TeamMember from "../models/TeamMember";
+import Investment from "../models/Investment";
+import Sector from "../models/Sector";
+import Consultation from "../models/Consultation";
+
+const router = Router();
+
+/**
+ * @openapi
+ * /api/sync:
+ *   get:
+ *     summary: Returns the full team, investment, sector and consultation datasets.
+ *     description: Bulk export for clients that keep a local snapshot of the entity data and refresh it periodically, instead of looking entities up one at a time.
+ *     tags:
+ *       - Sync
+ *     responses:
+ *       200:
+ *         description: All entity datasets.
+ *         content:
+ *           application/json:
+ *             schema:
+ *               type: object
+ *               properties:
+ *                 team:
+ *                   type: array
+ *                   items:
+ *                     type: object
+ *                 investments:
+ *                   type: array
+ *                   items:
+ *                     type: object
+ *                 sectors:
+ *                   type: array
+ *                   items:
+ *                     type: object
+ *                 consultations:
+ *                   type: array
+ *                   items:
+ *                     type: object
+ *                 synced_at:
+ *                   type: string
+ *                   example: "2025-02-02T12:00:00.000Z"
+ *       500:
+ *         description: Server error.
+ */
+router.get("/", async (req: Request, res: Response) => {
+  try {
+    const projection = { _id: 0, __v: 0 };
+    const [team, investments, sectors, consultations] = await Promise.all([
+      TeamMember.find({}, { ...projection, "related_insights._id": 0 }).lean(),
+      Investment.find({}, { ...projection, "insights._id": 0 }).lean(),
+      Sector.find({}, projection).lean(),
+      Consultation.find({}, projection).lean(),
+    ]);
+
+    res.json({
+      team,
+      investments,
+      sectors,
+      consultations,
+      synced_at: new Date().toISOString(),
+    });
+  } catch (error) {
+    console.error("Error exporting entity data:", error);
+    res.status(500).json({ error: "Server error" });
+  }
+});
+
+export default router;
@@ -0,0 +1,294 @@
+"""
+Batch Question Answering for the RAG System for Portfolio Support
+
+Questions could only be asked one at a time, through /chat or the interactive loop, so nightly
+evaluation and bulk Q&A jobs sent thousands of HTTP requests one after another and each paid for
+its own query encoding, FAISS search and API lookups. BatchRun answers a whole JSONL batch:
+  1. Every query of the batch is encoded in one pass and searched with one FAISS call
+     (query_encoding.QueryBatcher.search_positions_batch); filtered queries search their metadata
+     candidates.
+  2. API lookups are planned for every item first and de-duplicated across the batch: a lookup
+     with the same endpoint and parameters is made once and its data formatted for each query
+     that needs it. Lookups run on a pool of their own (so a large batch does not hold up /chat
+     requests) while the batch is searched, each bounded by its stage deadline
+     (request_executor.STAGE_DEADLINES).
+  3. Context assembly, prompt building and the LLM call run per item on a pool of BATCH_WORKERS
+     threads (one per available core). A caller can ask for fewer (`?workers=`, `--workers`), not
+     more: the count is clamped to 1..BATCH_WORKERS (see clamp_workers).
+  4. Results are yielded as items finish, one JSON object per item with its index, id, response
+     and stage timings (request_executor.RequestTimings), followed by a summary line. If the
+     consumer stops reading (e.g. the client disconnects), items not started yet are cancelled.
+
+Input lines are JSON objects: {"query": "...", "id": ..., "history": "...", "filter": {...},
+"session_id": "..."}; only "query" is required. Invalid lines produce an error result.
+Used by `POST /chat/batch` (flask_api.py, asgi_api.py) and `python rag_cli.py batch`.
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import TimeoutError as FutureTimeoutError
+
+from rag_langchain_ai_system import (
+    DEFAULT_SESSION,
+    build_prompt,
+    canned_answer,
+    context_assembler,
+    format_api_error,
+    format_api_result,
+    llm_pool,
+    plan_api_lookups,
+    request_executor,
+    resolve_api_info,
+    resolve_api_lookup,
+)
+from request_executor import STAGE_WORKERS, RequestTimings, unavailable_note
+
+BATCH_WORKERS = os.cpu_count() or 4
+MAX_BATCH_ITEMS = 10000
+
+
+def parse_batch(lines) -> list:
+    """
+    Parse JSONL lines into batch items: {"index", "id", "query", "history", "filter", "session_id"},
+    or {"index", "id", "error"} for a line that is not a valid item. Blank lines are skipped.
+    Raises ValueError for more than MAX_BATCH_ITEMS items.
+    """
+    items = []
+    for line in lines:
+        if isinstance(line, bytes):
+            line = line.decode("utf-8")
+        if not line.strip():
+            continue
+        if len(items) >= MAX_BATCH_ITEMS:
+            raise ValueError(f"A batch holds at most {MAX_BATCH_ITEMS} queries")
+        index = len(items)
+        try:
+            data = json.loads(line)
+        except ValueError as e:
+            items.append({"index": index, "id": None, "error": f"Invalid JSON: {e}"})
+            continue
+        if not isinstance(data, dict) or not isinstance(data.get("query"), str):
+            items.append({"index": index, "id": None, "error": "Missing 'query' parameter"})
+            continue
+        if data.get("filter") is not None and not isinstance(data["filter"], dict):
+            items.append({"index": index, "id": data.get("id"), "error": "'filter' must be an object"})
+            continue
+        if not isinstance(data.get("history", ""), str):
+            items.append({"index": index, "id": data.get("id"), "error": "'history' must be a string"})
+            continue
+        items.append({
+            "index": index,
+            "id": data.get("id", index),
+            "query": data["query"],
+            "history": data.get("history", "") + f"\nUser: {data['query']}",
+            "filter": data.get("filter"),
+            "session_id": data.get("session_id", DEFAULT_SESSION),
+        })
+    return items
+
+
+def clamp_workers(workers) -> int:
+    """
+    The number of answer threads for a requested count: between 1 and BATCH_WORKERS.
+    """
+    return min(max(1, int(workers)), BATCH_WORKERS)
+
+
+def lookup_key(lookup: dict) -> str:
+    return lookup["endpoint"] + "?" + json.dumps(lookup["params"], sort_keys=True)
+
+
+class BatchRun:
+    """
+    Answer a batch of parsed items (see parse_batch) against one retriever.
+    """
+
+    def __init__(self, items: list, retriever, workers: int = BATCH_WORKERS):
+        self.items = items
+        self.retriever = retriever
+        self.workers = clamp_workers(workers)
+        self.started = None
+        self.search_seconds = 0.0
+        self.lookups_planned = 0
+        self.lookups_made = 0
+        self.answered = 0
+        self.failed = 0
+        self._lookups = {}
+        self._lookup_pool = None
+        self._lock = threading.Lock()
+
+    def _submit_lookup(self, key: str, function):
+        """
+        Run a lookup on the batch's lookup pool. A large batch can queue many lookups, so the
+        deadline counts from when the lookup starts running, not from when it was submitted.
+        """
+        state = {"started": threading.Event(), "start": None, "seconds": 0.0}
+
+        def run():
+            state["start"] = time.perf_counter()
+            state["started"].set()
+            try:
+                return function()
+            finally:
+                state["seconds"] = time.perf_counter() - state["start"]
+        state["future"] = self._lookup_pool.submit(run)
+        return state
+
+    def _await_lookup(self, stage: str, key: str, lookup: dict, query: str, timings: RequestTimings) -> str:
+        state = self._lookups[key]
+        deadline = request_executor.deadlines.get(stage.split(":", 1)[0], max(request_executor.deadlines.values()))
+        while not state["started"].wait(1.0):
+            if state["future"].cancelled():
+                return unavailable_note(lookup["label"])
+        try:
+            result = state["future"].result(timeout=max(deadline - (time.perf_counter() - state["start"]), 0))
+        except FutureTimeoutError:
+            logging.error("Batch lookup %s missed its %.1fs deadline", key, deadline)
+            timings.stage(stage, deadline, timed_out=True)
+            return unavailable_note(lookup["label"])
+        except Exception as e:
+            logging.error("Error fetching %s with %s: %s", lookup["endpoint"], lookup["params"], e)
+            timings.stage(stage, state["seconds"])
+            return format_api_error(lookup)
+        timings.stage(stage, state["seconds"])
+        # Scrape lookups are resolved per item (they answer from the item's session index)
+        return result if lookup["name"] == "scrape" else format_api_result(lookup, result, query)
+
+    def _answer(self, item: dict, plan: list, searched) -> dict:
+        timings = RequestTimings()
+        timings.stage("search", self.search_seconds)
+        query, session_id = item["query"], item["session_id"]
+        start = time.perf_counter()
+        if searched is None:
+            context_text = context_assembler.retrieve(self.retriever, query, item["filter"])
+        else:
+            query_vector, positions = searched
+            context_text = context_assembler.assemble(self.retriever.vector_store, query_vector, positions)
+        timings.stage("assemble", time.perf_counter() - start)
+
+        api_info = ""
+        for index, entry in enumerate(plan):
+            if isinstance(entry, str):
+                api_info += entry
+                continue
+            key, lookup = entry
+            stage = f"{'scrape' if lookup['name'] == 'scrape' else 'api'}:{index}:{lookup['name']}"
+            api_info += self._await_lookup(stage, key, lookup, query, timings)
+        timings.inputs_ready()
+
+        prompt = build_prompt(query, item["history"], context_text, api_info)
+        llm_start = time.perf_counter()
+        try:
+            response = llm_pool.invoke(prompt, session_id)
+            error = None
+        except Exception as e:
+            logging.error("Error invoking the LLM: %s", e)
+            response, error = None, f"LLM error: {e}"
+        return self._result(item, response, error, timings.report(llm_seconds=time.perf_counter() - llm_start))
+
+    def _result(self, item: dict, response, error, timings: dict = None) -> dict:
+        with self._lock:
+            if error is None:
+                self.answered += 1
+            else:
+                self.failed += 1
+        result = {"index": item["index"], "id": item["id"], "response": response}
+        if error is not None:
+            result["error"] = error
+        if timings is not None:
+            result["timings"] = timings
+        return result
+
+    def results(self):
+        """
+        Yield one result per item, in completion order, then a {"summary": ...} line.
+        """
+        self.started = time.perf_counter()
+        self._lookup_pool = ThreadPoolExecutor(max_workers=STAGE_WORKERS, thread_name_prefix="batch-lookup")
+        pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="batch-answer")
+        try:
+            yield from self._run(pool)
+        finally:
+            pool.shutdown(wait=False, cancel_futures=True)
+            self._lookup_pool.shutdown(wait=False, cancel_futures=True)
+        yield {"summary": self.summary()}
+
+    def _run(self, pool: ThreadPoolExecutor):
+        pending = []
+        for item in self.items:
+            if "error" in item:
+                yield self._result(item, None, item["error"])
+                continue
+            canned = canned_answer(item["query"])
+            if canned is not None:
+                yield self._result(item, canned, None)
+                continue
+            pending.append(item)
+
+        # Plan every item's lookups and start each distinct one once, before the batch search
+        plans = []
+        for session_id in {item["session_id"] for item in pending}:
+            request_executor.background("warmup", lambda session_id=session_id: llm_pool.warm_up(session_id))
+        for item in pending:
+            plan = []
+            for entry in plan_api_lookups(item["query"], item["history"]):
+                if isinstance(entry, str):
+                    plan.append(entry)
+                    continue
+                self.lookups_planned += 1
+                if entry["name"] == "scrape":
+                    key = f"{item['session_id']}:{lookup_key(entry)}:{item['query']}"
+                    function = (lambda lookup=entry, item=item:
+                                resolve_api_info(lookup, item["query"], item["session_id"]))
+                else:
+                    key = lookup_key(entry)
+                    function = lambda lookup=entry: resolve_api_lookup(lookup, request_executor.deadlines["api"])
+                if key not in self._lookups:
+                    self._lookups[key] = self._submit_lookup(key, function)
+                    self.lookups_made += 1
+                plan.append((key, entry))
+            plans.append(plan)
+
+        searched = [None] * len(pending)
+        if pending and hasattr(self.retriever, "search_positions_batch"):
+            start = time.perf_counter()
+            searched = self.retriever.search_positions_batch([item["query"] for item in pending],
+                                                             context_assembler.fetch_k,
+                                                             [item["filter"] for item in pending])
+            self.search_seconds = time.perf_counter() - start
+            logging.info("Batch of %d queries encoded and searched in %.2fs", len(pending), self.search_seconds)
+
+        futures = {pool.submit(self._answer, item, plan, result): item
+                   for item, plan, result in zip(pending, plans, searched)}
+        for future in as_completed(futures):
+            try:
+                yield future.result()
+            except Exception as e:
+                logging.error("Batch item %s failed: %s", futures[future]["index"], e)
+                yield self._result(futures[future], None, str(e))
+
+    def summary(self) -> dict:
+        elapsed = time.perf_counter() - self.started if self.started else 0.0
+        return {
+            "items": len(self.items),
+            "answered": self.answered,
+            "failed": self.failed,
+            "workers": self.workers,
+            "search_seconds": self.search_seconds,
+            "lookups_planned": self.lookups_planned,
+            "lookups_made": self.lookups_made,
+            "total_seconds": elapsed,
+            "items_per_second": len(self.items) / elapsed if elapsed else 0.0,
+        }
+
+
+def answer_batch_lines(items: list, retriever, workers: int = BATCH_WORKERS):
+    """
+    Answer parsed items (see parse_batch) and yield the JSONL result lines, each ending in a newline.
+    """
+    for result in BatchRun(items, retriever, workers).results():
+        yield json.dumps(result) + "\n"
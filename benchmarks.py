@@ -0,0 +1,635 @@
+"""
+Benchmarks for the RAG System for Portfolio Support.
+
+Usage:
+    python benchmarks.py chat --url http://localhost:5000/chat --url http://localhost:8000/chat
+    python benchmarks.py query-encoding --concurrency 8
+    python benchmarks.py chunking --overlap 0,40
+    python benchmarks.py prompt-format --generate
+    python benchmarks.py prompt-prefix
+    python benchmarks.py embeddings --backends huggingface,onnx,onnx-fp32
+    python benchmarks.py context --chunk-overlap 40
+
+The `chat` benchmark fires a fixed set of queries at one or more running /chat endpoints (e.g. the
+Flask app from flask_api.py and the ASGI app from asgi_api.py) at several client concurrency
+levels, and reports throughput (requests per second) and latency percentiles for each.
+
+The `query-encoding` benchmark builds the vector store from the local MasterClass documents and
+compares the CPU time per query of plain `similarity_search` against the cached, batched
+query_encoding.QueryBatcher at a given client concurrency.
+
+The `chunking` benchmark compares the original CharacterTextSplitter against
+chunking.TranscriptChunker: chunk count, index build time and document-level recall@k on a small
+labelled query set.
+
+The `prompt-prefix` benchmark plays the same multi-turn conversation through the LLM twice, once
+with the original context-first prompt layout and once with build_prompt()'s stable-prefix layout,
+and reports the prompt tokens Ollama had to evaluate (and the time it took) on every turn.
+
+The `embeddings` benchmark runs each embedding backend in a fresh process and reports import and
+model load time, index build throughput, per-query latency, peak RSS, recall@k on the chunking
+query set and top-k agreement with the first backend. A backend whose recall drops more than
+EMBEDDING_RECALL_TOLERANCE below the first backend's is flagged.
+
+The `context` benchmark compares the prompt context of the plain top-k chunks against
+context_assembly.ContextAssembler (merged overlapping chunks, MMR selection): estimated context
+tokens, distinct passages and document-level recall on the chunking query set.
+
+Before running, ensure you have installed these packages:
+    !pip install requests langchain_community faiss-cpu sentence-transformers
+"""
+
+import argparse
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+LOCAL_DOCUMENTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend", "documents")
+
+# A fixed query set so runs are comparable. Greetings are left out on purpose: they short-circuit
+# the pipeline and reset the conversation history.
+BENCH_QUERIES = [
+    "What are the common failures of leadership teams?",
+    "How should a SaaS company plan for an exit in 2024?",
+    "What makes a world class channel strategy?",
+    "How do you scale organizational culture?",
+    "What does a GTM ops team do?",
+    "Tell me about the sector of Software",
+    "Show me the team profile for John Doe",
+    "What investments does the company Acme Corp have?",
+]
+
+
+def percentile(values: list, pct: float) -> float:
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+#######################################
+# /chat Concurrent-Client Throughput  #
+#######################################
+
+def bench_chat(url: str, concurrency: int, total_requests: int, queries: list = None) -> dict:
+    """
+    Send `total_requests` POST /chat requests to `url` from `concurrency` client threads.
+    Returns throughput and latency statistics (latencies in seconds).
+    """
+    queries = queries or BENCH_QUERIES
+    latencies = []
+    errors = 0
+
+    def one_request(i: int):
+        start = time.perf_counter()
+        response = requests.post(url, json={"query": queries[i % len(queries)]}, timeout=600)
+        response.raise_for_status()
+        return time.perf_counter() - start
+
+    wall_start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        futures = [pool.submit(one_request, i) for i in range(total_requests)]
+        for future in futures:
+            try:
+                latencies.append(future.result())
+            except Exception:
+                errors += 1
+    wall = time.perf_counter() - wall_start
+
+    return {
+        "url": url,
+        "concurrency": concurrency,
+        "requests": total_requests,
+        "errors": errors,
+        "wall_seconds": wall,
+        "throughput_rps": len(latencies) / wall if wall else 0.0,
+        "latency_mean": statistics.mean(latencies) if latencies else 0.0,
+        "latency_p50": percentile(latencies, 50),
+        "latency_p95": percentile(latencies, 95),
+    }
+
+
+def run_chat_benchmark(args):
+    concurrency_levels = [int(c) for c in args.concurrency.split(",")]
+    print(f"{'url':40} {'conc':>5} {'ok':>5} {'err':>4} {'rps':>8} {'p50 s':>8} {'p95 s':>8}")
+    for url in args.url:
+        for concurrency in concurrency_levels:
+            total = max(args.requests, concurrency)
+            stats = bench_chat(url, concurrency, total)
+            print(f"{url:40} {concurrency:>5} {total - stats['errors']:>5} {stats['errors']:>4} "
+                  f"{stats['throughput_rps']:>8.2f} {stats['latency_p50']:>8.2f} {stats['latency_p95']:>8.2f}")
+
+
+def load_local_documents(directory: str = LOCAL_DOCUMENTS_DIR) -> dict:
+    """
+    Read the MasterClass documents from disk (same shape as extract_documents returns).
+    """
+    documents = {}
+    for filename in sorted(os.listdir(directory)):
+        if filename.endswith(".txt"):
+            with open(os.path.join(directory, filename), encoding="utf-8") as f:
+                documents[filename] = f.read()
+    return documents
+
+
+def build_local_vector_store():
+    from rag_langchain_ai_system import build_vector_store
+
+    return build_vector_store(load_local_documents())
+
+
+#######################################
+# Query Encoding: Cache and Batching  #
+#######################################
+
+def query_workload(total: int, seed: int = 0) -> list:
+    """
+    A realistic query stream: mostly the fixed query set, with case and whitespace variations
+    (which the cache treats as identical), plus some one-off questions that always miss.
+    """
+    rng = random.Random(seed)
+    workload = []
+    for i in range(total):
+        query = rng.choice(BENCH_QUERIES)
+        roll = rng.random()
+        if roll < 0.2:
+            query = query.upper()
+        elif roll < 0.3:
+            query = f"  {query}  "
+        elif roll < 0.5:
+            query = f"{query} (question {i})"
+        workload.append(query)
+    return workload
+
+
+def bench_query_encoding(vector_store, concurrency: int, total_queries: int) -> dict:
+    """
+    Compare CPU seconds per query for plain similarity_search (re-encoding every query one at a
+    time) against QueryBatcher (LRU cache plus batched encoding and FAISS search).
+    """
+    from query_encoding import CachedQueryEmbeddings, QueryBatcher
+
+    workload = query_workload(total_queries)
+    base_embeddings = vector_store.embedding_function
+    if isinstance(base_embeddings, CachedQueryEmbeddings):
+        base_embeddings = base_embeddings.embeddings
+
+    def plain_search(query: str):
+        return vector_store.similarity_search_by_vector(base_embeddings.embed_query(query), k=3)
+
+    def measure(search) -> float:
+        start = time.process_time()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            list(pool.map(search, workload))
+        return (time.process_time() - start) / len(workload)
+
+    plain_cpu = measure(plain_search)
+    batcher = QueryBatcher(vector_store)
+    batcher.embeddings = CachedQueryEmbeddings(base_embeddings)
+    batched_cpu = measure(lambda query: batcher.similarity_search(query, k=3))
+
+    stats = batcher.stats()
+    return {
+        "concurrency": concurrency,
+        "queries": len(workload),
+        "plain_cpu_ms_per_query": plain_cpu * 1000,
+        "batched_cpu_ms_per_query": batched_cpu * 1000,
+        "saved_cpu_ms_per_query": (plain_cpu - batched_cpu) * 1000,
+        "cache_hit_rate": stats["hit_rate"],
+        "mean_batch_size": stats["mean_batch_size"],
+    }
+
+
+def run_query_encoding_benchmark(args):
+    vector_store = build_local_vector_store()
+    for concurrency in [int(c) for c in args.concurrency.split(",")]:
+        stats = bench_query_encoding(vector_store, concurrency, args.queries)
+        print(f"concurrency={stats['concurrency']:>3}  plain={stats['plain_cpu_ms_per_query']:.2f} ms/query  "
+              f"cached+batched={stats['batched_cpu_ms_per_query']:.2f} ms/query  "
+              f"saved={stats['saved_cpu_ms_per_query']:.2f} ms/query  "
+              f"hit_rate={stats['cache_hit_rate']:.0%}  mean_batch={stats['mean_batch_size']:.1f}")
+
+
+#######################################
+# Chunking: Count, Build Time, Recall #
+#######################################
+
+# Questions answered by exactly one transcript, for document-level recall
+CHUNKING_EVAL_SET = [
+    ("How do white label partners lower support costs?",
+     "peakspan_master_class_building_a_world_class_channel_strategy.txt"),
+    ("What is product partner fit?",
+     "peakspan_master_class_building_a_world_class_channel_strategy.txt"),
+    ("Which partners competed with Shopify or Square?",
+     "peakspan_master_class_building_a_world_class_channel_strategy.txt"),
+    ("How does a CEO accidentally install an unintended rule in the company culture?",
+     "peakspan_master_class_building_and_scaling_organizational_culture.txt"),
+    ("Why are values and culture terms not interchangeable?",
+     "peakspan_master_class_building_and_scaling_organizational_culture.txt"),
+    ("When should sales ops, marketing ops and CS ops be split into separate teams?",
+     "peakspan_master_class_gtm_ops_fireside_chat.txt"),
+    ("What does a VP of GTM ops at Carta do?",
+     "peakspan_master_class_gtm_ops_fireside_chat.txt"),
+    ("Should leadership teams disagree and commit on big decisions?",
+     "peakspan_master_class_the_four_fundamental_failures_of_leadership_teams_and_how_to_avoid_them.txt"),
+    ("How do you spot candidates who talk about the collective we?",
+     "peakspan_master_class_the_four_fundamental_failures_of_leadership_teams_and_how_to_avoid_them.txt"),
+    ("How should founders prepare two years ahead of an exit?",
+     "peakspan_master_class_the_state_of_saas_ma_in_2024_strategic_planning_for_an_optimal_exit.txt"),
+    ("What is the state of SaaS M&A in 2024?",
+     "peakspan_master_class_the_state_of_saas_ma_in_2024_strategic_planning_for_an_optimal_exit.txt"),
+]
+
+
+def legacy_chunks(documents: dict) -> list:
+    """
+    The original splitter, with the source recorded as metadata so recall can be scored.
+    """
+    from langchain.docstore.document import Document
+    from langchain.text_splitter import CharacterTextSplitter
+
+    text_splitter = CharacterTextSplitter(separator="\n", chunk_size=500, chunk_overlap=100)
+    chunks = []
+    for filename, content in documents.items():
+        for text in text_splitter.split_text(f"[{filename}]\n{content}"):
+            chunks.append(Document(page_content=text, metadata={"source": filename}))
+    return chunks
+
+
+def bench_chunking(name: str, split, documents: dict, embeddings, k: int = 3) -> dict:
+    from langchain.vectorstores import FAISS
+
+    start = time.perf_counter()
+    chunks = split(documents)
+    split_seconds = time.perf_counter() - start
+    vector_store = FAISS.from_documents(chunks, embeddings)
+    build_seconds = time.perf_counter() - start
+
+    hits = 0
+    for query, expected_source in CHUNKING_EVAL_SET:
+        sources = [doc.metadata["source"] for doc in vector_store.similarity_search(query, k=k)]
+        hits += expected_source in sources
+    return {
+        "splitter": name,
+        "chunks": len(chunks),
+        "characters": sum(len(chunk.page_content) for chunk in chunks),
+        "split_seconds": split_seconds,
+        "build_seconds": build_seconds,
+        f"recall@{k}": hits / len(CHUNKING_EVAL_SET),
+    }
+
+
+def run_chunking_benchmark(args):
+    from langchain.embeddings import HuggingFaceEmbeddings
+    from chunking import TranscriptChunker, load_tokenizer
+    from rag_langchain_ai_system import EMBEDDING_MODEL_NAME
+
+    documents = load_local_documents()
+    embeddings = HuggingFaceEmbeddings(model_name=EMBEDDING_MODEL_NAME)
+    tokenizer = load_tokenizer()
+    runs = [("CharacterTextSplitter(500, 100)", legacy_chunks)]
+    for overlap in [int(o) for o in args.overlap.split(",")]:
+        chunker = TranscriptChunker(chunk_tokens=args.chunk_tokens, overlap_tokens=overlap, tokenizer=tokenizer)
+        runs.append((f"TranscriptChunker({args.chunk_tokens}, {overlap})", chunker.split_documents))
+
+    for name, split in runs:
+        stats = bench_chunking(name, split, documents, embeddings, k=args.k)
+        print(f"{stats['splitter']:34} chunks={stats['chunks']:>5}  chars={stats['characters']:>7}  "
+              f"split={stats['split_seconds']:.2f}s  build={stats['build_seconds']:.2f}s  "
+              f"recall@{args.k}={stats[f'recall@{args.k}']:.2f}")
+
+
+#######################################
+# Prompt Format: Raw Repr vs Compact  #
+#######################################
+
+# Backend-shaped responses (including Mongo internals), so the benchmark needs no running backend
+PROMPT_FORMAT_FIXTURES = {
+    "team_profile": {"_id": "65b9f0c2a1b2c3d4e5f60718", "name": "John Doe", "role": "Chief Technology Officer",
+                     "bio": "John has over 15 years of experience building and scaling engineering organizations "
+                            "at high growth SaaS companies, leading platform, data and security teams through "
+                            "multiple funding rounds and two acquisitions.",
+                     "personal_quote": "Innovation distinguishes between a leader and a follower.", "__v": 0},
+    "team_insights": [{"_id": f"65b9f0c2a1b2c3d4e5f6071{i}", "title": f"Scaling GTM teams, part {i}",
+                       "date": "1/15/2024", "link": f"https://example.com/insights/{i}"} for i in range(4)],
+    "investments": {"company_name": "Acme Corp", "location": "Austin, TX", "website": "https://acme.example.com",
+                    "sectors": ["Software", "Fintech"]},
+    "investment_insights": [{"_id": f"65b9f0c2a1b2c3d4e5f6072{i}", "date": "2/2/2024",
+                             "title": f"Acme Corp quarterly update {i}",
+                             "url": f"https://example.com/acme/{i}"} for i in range(4)],
+    "sectors": {"_id": "65b9f0c2a1b2c3d4e5f60730", "sector": "Software",
+                "description": "Vertical and horizontal SaaS businesses with efficient growth and strong net "
+                               "revenue retention, typically between $5M and $30M ARR.",
+                "companies": ["Acme Corp", "Globex", "Initech", "Umbrella", "Hooli", "Vandelay"],
+                "investment_team": ["John Doe", "Jane Smith"], "__v": 0},
+    "consultations": [{"_id": f"65b9f0c2a1b2c3d4e5f6074{i}", "date": "3/3/2024", "company_name": "Acme Corp",
+                       "consultation_details": "Consulted with John Doe on pricing and packaging for the "
+                                               "enterprise tier, and on sales compensation plans.",
+                       "hours": 2, "__v": 0} for i in range(3)],
+}
+
+PROMPT_FORMAT_QUERIES = [
+    "Show me the team profile for John Doe",
+    "What investments does the company Acme Corp have?",
+    "Tell me about the sector of Software",
+    "When did we consult with John Doe?",
+    "Show me the team profile for John Doe and links to his insights",
+]
+
+
+def render_api_info(query: str, compact: bool) -> str:
+    from rag_langchain_ai_system import plan_api_lookups, format_api_result
+
+    api_info = ""
+    for item in plan_api_lookups(query, ""):
+        if isinstance(item, str):
+            api_info += item
+            continue
+        result = PROMPT_FORMAT_FIXTURES.get(item["name"])
+        if compact:
+            api_info += format_api_result(item, result, query)
+        else:
+            api_info += f"\n[{item['label']}]\n" + str(result) + "\n"
+    return api_info
+
+
+def run_prompt_format_benchmark(args):
+    from rag_langchain_ai_system import build_prompt, get_llm
+
+    totals = {"raw": [0, 0, 0.0], "compact": [0, 0, 0.0]}
+    for query in PROMPT_FORMAT_QUERIES:
+        for style in ("raw", "compact"):
+            prompt = build_prompt(query, "", "", render_api_info(query, style == "compact"))
+            totals[style][0] += len(prompt)
+            line = f"{style:8} chars={len(prompt):>5}"
+            if args.generate:
+                start = time.perf_counter()
+                result = get_llm().generate([prompt])
+                elapsed = time.perf_counter() - start
+                info = result.generations[0][0].generation_info or {}
+                totals[style][1] += info.get("prompt_eval_count", 0)
+                totals[style][2] += elapsed
+                line += f"  prompt_tokens={info.get('prompt_eval_count', '?'):>5}  latency={elapsed:.2f}s"
+            print(f"{query[:50]:50} {line}")
+
+    raw, compact = totals["raw"], totals["compact"]
+    print(f"\nprompt chars: raw={raw[0]} compact={compact[0]} ({1 - compact[0] / raw[0]:.0%} smaller)")
+    if args.generate and raw[1]:
+        print(f"prompt tokens: raw={raw[1]} compact={compact[1]} ({1 - compact[1] / raw[1]:.0%} fewer)")
+        print(f"generation latency: raw={raw[2]:.2f}s compact={compact[2]:.2f}s "
+              f"({raw[2] - compact[2]:+.2f}s saved over {len(PROMPT_FORMAT_QUERIES)} queries)")
+
+
+def legacy_prompt(query: str, conversation_history: str, context_text: str, api_info: str) -> str:
+    """
+    The original prompt layout: volatile context first, conversation history last.
+    """
+    return (
+        "You are a knowledgeable assistant with access to PeakSpan MasterClass documents and external API data.\n\n"
+        "Relevant Document Context:\n"
+        f"{context_text}\n\n"
+        "Additional API Information:\n"
+        f"{api_info}\n\n"
+        "Conversation History:\n"
+        f"{conversation_history}\n\n"
+        f"User: {query}\n"
+        "Assistant:"
+    )
+
+
+def run_prompt_prefix_benchmark(args):
+    from rag_langchain_ai_system import build_prompt, llm_pool
+
+    totals = {}
+    for layout, make_prompt in (("legacy", legacy_prompt), ("stable", build_prompt)):
+        session = f"bench-{layout}-{random.random()}"
+        history = ""
+        totals[layout] = [0, 0.0]
+        for turn, query in enumerate(PROMPT_FORMAT_QUERIES[:args.turns] * 2, start=1):
+            history += f"\nUser: {query}"
+            prompt = make_prompt(query, history, f"(context for turn {turn})", render_api_info(query, True))
+            before = llm_pool.stats()["sessions"].get(session, {"prompt_eval_tokens": 0, "prompt_eval_seconds": 0.0})
+            answer = llm_pool.invoke(prompt, session)
+            after = llm_pool.stats()["sessions"][session]
+            tokens = after["prompt_eval_tokens"] - before["prompt_eval_tokens"]
+            seconds = after["prompt_eval_seconds"] - before["prompt_eval_seconds"]
+            totals[layout][0] += tokens
+            totals[layout][1] += seconds
+            history += f"\nAssistant: {answer}"
+            print(f"{layout:6} turn {turn:>2}  prompt chars={len(prompt):>6}  "
+                  f"evaluated tokens={tokens:>5}  prompt eval={seconds:.2f}s")
+
+    legacy, stable = totals["legacy"], totals["stable"]
+    print(f"\nevaluated prompt tokens: legacy={legacy[0]} stable={stable[0]}")
+    print(f"prompt eval time: legacy={legacy[1]:.2f}s stable={stable[1]:.2f}s "
+          f"({legacy[1] - stable[1]:+.2f}s saved)")
+
+
+#######################################
+# Embedding Backends: PyTorch vs ONNX #
+#######################################
+
+EMBEDDING_RECALL_TOLERANCE = 0.05
+
+
+def load_embedding_backend(backend: str):
+    """
+    Import and load one embedding backend: "huggingface", "onnx" (int8) or "onnx-fp32".
+    """
+    if backend == "huggingface":
+        from langchain.embeddings import HuggingFaceEmbeddings
+        from onnx_embeddings import MODEL_NAME
+
+        return HuggingFaceEmbeddings(model_name=MODEL_NAME)
+    from onnx_embeddings import OnnxEmbeddings
+
+    return OnnxEmbeddings(quantized=backend == "onnx")
+
+
+def bench_embedding_backend(backend: str, k: int = 3) -> dict:
+    """
+    Measure one backend in the current process; meant to run in a fresh interpreter so import
+    time and RSS are not shared with other backends.
+    """
+    import resource
+
+    start = time.perf_counter()
+    embeddings = load_embedding_backend(backend)
+    embeddings.embed_query("warm up")
+    load_seconds = time.perf_counter() - start
+
+    from langchain.vectorstores import FAISS
+    from chunking import TranscriptChunker, embeddings_tokenizer
+
+    # Chunk with the backend's own tokenizer, so an ONNX run does not import transformers
+    chunks = TranscriptChunker(tokenizer=embeddings_tokenizer(embeddings)).split_documents(load_local_documents())
+    texts = [chunk.page_content for chunk in chunks]
+    start = time.perf_counter()
+    vectors = embeddings.embed_documents(texts)
+    build_seconds = time.perf_counter() - start
+
+    latencies = []
+    for query in BENCH_QUERIES + [query for query, _ in CHUNKING_EVAL_SET]:
+        start = time.perf_counter()
+        embeddings.embed_query(query)
+        latencies.append(time.perf_counter() - start)
+
+    vector_store = FAISS.from_embeddings(list(zip(texts, vectors)), embeddings,
+                                         metadatas=[dict(chunk.metadata, position=i) for i, chunk in enumerate(chunks)])
+    hits, top_k = 0, []
+    for query, expected_source in CHUNKING_EVAL_SET:
+        docs = vector_store.similarity_search_by_vector(embeddings.embed_query(query), k=k)
+        hits += expected_source in [doc.metadata["source"] for doc in docs]
+        top_k.append([doc.metadata["position"] for doc in docs])
+
+    return {
+        "backend": backend,
+        "load_seconds": load_seconds,
+        "chunks": len(texts),
+        "chunks_per_second": len(texts) / build_seconds if build_seconds else 0.0,
+        "query_p50_ms": percentile(latencies, 50) * 1000,
+        "query_p95_ms": percentile(latencies, 95) * 1000,
+        "max_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "recall": hits / len(CHUNKING_EVAL_SET),
+        "top_k": top_k,
+    }
+
+
+def run_embeddings_benchmark(args):
+    if args.worker:
+        print(json.dumps(bench_embedding_backend(args.worker, k=args.k)))
+        return
+
+    results = []
+    for backend in args.backends.split(","):
+        command = [sys.executable, "-X", "importtime", os.path.abspath(__file__),
+                   "embeddings", "--worker", backend, "--k", str(args.k)]
+        completed = subprocess.run(command, capture_output=True, text=True, check=True)
+        stats = json.loads(completed.stdout.strip().splitlines()[-1])
+        # -X importtime reports cumulative microseconds per top-level import on stderr
+        stats["import_seconds"] = sum(int(line.split("|")[1]) for line in completed.stderr.splitlines()
+                                      if line.startswith("import time:") and line.split("|")[1].strip().isdigit()
+                                      and not line.split("|")[2].startswith("  ")) / 1e6
+        results.append(stats)
+
+    baseline = results[0]
+    for stats in results:
+        agreement = statistics.mean(len(set(ours) & set(theirs)) / len(theirs)
+                                    for ours, theirs in zip(stats["top_k"], baseline["top_k"]))
+        within = stats["recall"] >= baseline["recall"] - EMBEDDING_RECALL_TOLERANCE
+        print(f"{stats['backend']:12} import={stats['import_seconds']:.2f}s  load={stats['load_seconds']:.2f}s  "
+              f"build={stats['chunks_per_second']:.1f} chunks/s  query p50={stats['query_p50_ms']:.1f}ms "
+              f"p95={stats['query_p95_ms']:.1f}ms  rss={stats['max_rss_mb']:.0f}MB  "
+              f"recall@{args.k}={stats['recall']:.2f}  agreement@{args.k}={agreement:.2f}"
+              f"{'' if within else '  RECALL BELOW TOLERANCE'}")
+
+
+#######################################
+# Context Assembly: Dedup and MMR     #
+#######################################
+
+def run_context_benchmark(args):
+    from langchain.vectorstores import FAISS
+    from chunking import TranscriptChunker, embeddings_tokenizer
+    from context_assembly import ContextAssembler, estimate_tokens
+    from query_encoding import QueryBatcher
+    from rag_langchain_ai_system import load_embeddings
+    from structured_ingest import split_corpus
+
+    documents = load_local_documents()
+    embeddings = load_embeddings()
+    chunker = TranscriptChunker(overlap_tokens=args.chunk_overlap, tokenizer=embeddings_tokenizer(embeddings))
+    retriever = QueryBatcher(FAISS.from_documents(split_corpus(documents, chunker), embeddings))
+    assembler = ContextAssembler(passages=args.k)
+
+    totals = {"plain": [0, 0], "assembled": [0, 0]}
+    queries = [(query, None) for query in BENCH_QUERIES] + CHUNKING_EVAL_SET
+    for query, expected_source in queries:
+        plain = "\n\n".join(doc.page_content for doc in retriever.similarity_search(query, k=args.k))
+        assembled = assembler.retrieve(retriever, query)
+        for name, context_text in (("plain", plain), ("assembled", assembled)):
+            totals[name][0] += estimate_tokens(context_text)
+            if expected_source is not None:
+                totals[name][1] += f"[{expected_source}]" in context_text
+        print(f"{query[:50]:50} plain={estimate_tokens(plain):>5} tokens  "
+              f"assembled={estimate_tokens(assembled):>5} tokens  passages={assembled.count(chr(10) + chr(10)) + 1}")
+
+    plain, assembled = totals["plain"], totals["assembled"]
+    print(f"\ncontext tokens per prompt: plain={plain[0] / len(queries):.0f} "
+          f"assembled={assembled[0] / len(queries):.0f}")
+    print(f"recall@{args.k}: plain={plain[1] / len(CHUNKING_EVAL_SET):.2f} "
+          f"assembled={assembled[1] / len(CHUNKING_EVAL_SET):.2f}")
+    stats = assembler.stats()
+    print(f"tokens saved against the plain top {args.k} per prompt: {stats['tokens_saved_per_prompt']:.1f}")
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Benchmarks for the RAG system.")
+    subparsers = parser.add_subparsers(dest="benchmark", required=True)
+
+    chat = subparsers.add_parser("chat", help="Concurrent-client throughput of one or more /chat endpoints.")
+    chat.add_argument("--url", action="append", required=True,
+                      help="A /chat endpoint to benchmark (repeat to compare servers).")
+    chat.add_argument("--concurrency", default="1,4,16",
+                      help="Comma separated client concurrency levels (default: 1,4,16).")
+    chat.add_argument("--requests", type=int, default=32,
+                      help="Requests per concurrency level (default: 32).")
+    chat.set_defaults(func=run_chat_benchmark)
+
+    encoding = subparsers.add_parser("query-encoding",
+                                      help="CPU per query of cached, batched query encoding vs plain search.")
+    encoding.add_argument("--concurrency", default="1,8,32",
+                          help="Comma separated client concurrency levels (default: 1,8,32).")
+    encoding.add_argument("--queries", type=int, default=512,
+                          help="Queries per concurrency level (default: 512).")
+    encoding.set_defaults(func=run_query_encoding_benchmark)
+
+    chunking = subparsers.add_parser("chunking",
+                                     help="Chunk count, build time and recall of the splitters.")
+    chunking.add_argument("--chunk-tokens", type=int, default=200,
+                          help="TranscriptChunker chunk size in model tokens (default: 200).")
+    chunking.add_argument("--overlap", default="0,40",
+                          help="Comma separated TranscriptChunker overlaps in tokens (default: 0,40).")
+    chunking.add_argument("--k", type=int, default=3, help="Top-k for recall (default: 3).")
+    chunking.set_defaults(func=run_chunking_benchmark)
+
+    prompt_format = subparsers.add_parser("prompt-format",
+                                          help="Prompt size (and LLM latency) of raw vs compact API context.")
+    prompt_format.add_argument("--generate", action="store_true",
+                               help="Also send both prompts to the LLM and report tokens and latency.")
+    prompt_format.set_defaults(func=run_prompt_format_benchmark)
+
+    prompt_prefix = subparsers.add_parser("prompt-prefix",
+                                          help="Prompt tokens re-evaluated per turn, legacy vs stable-prefix layout.")
+    prompt_prefix.add_argument("--turns", type=int, default=len(PROMPT_FORMAT_QUERIES),
+                               help="Distinct queries in the conversation; each is asked twice (default: all).")
+    prompt_prefix.set_defaults(func=run_prompt_prefix_benchmark)
+
+    embeddings = subparsers.add_parser("embeddings",
+                                       help="Import time, build throughput, latency, RSS and recall per embedding backend.")
+    embeddings.add_argument("--backends", default="huggingface,onnx,onnx-fp32",
+                            help="Comma separated backends; the first is the recall baseline "
+                                 "(default: huggingface,onnx,onnx-fp32).")
+    embeddings.add_argument("--k", type=int, default=3, help="Top-k for recall (default: 3).")
+    embeddings.add_argument("--worker", help=argparse.SUPPRESS)
+    embeddings.set_defaults(func=run_embeddings_benchmark)
+
+    context = subparsers.add_parser("context", help="Context tokens and recall of plain top-k vs assembled context.")
+    context.add_argument("--k", type=int, default=3, help="Passages per prompt (default: 3).")
+    context.add_argument("--chunk-overlap", type=int, default=0,
+                         help="TranscriptChunker overlap in tokens, to measure merging of overlapping chunks (default: 0).")
+    context.set_defaults(func=run_context_benchmark)
+    return parser
+
+
+if __name__ == "__main__":
+    arguments = build_parser().parse_args()
+    arguments.func(arguments)
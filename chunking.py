@@ -0,0 +1,237 @@
+"""
+Sentence- and Token-Aware Chunking for the RAG System for Portfolio Support
+
+The original splitter, `CharacterTextSplitter(separator="\\n", chunk_size=500, chunk_overlap=100)`,
+cuts on newlines by character count. The MasterClass transcripts are a single line each, so it
+cannot cut them at all and emits one ~54k character chunk per transcript, of which the embedding
+model only ever sees the first 256 tokens. Where it can cut, the 100 character overlap re-embeds
+about 20% of the text, and the `[filename]` prefix only lands in the first chunk.
+
+TranscriptChunker instead:
+  1. Splits text into speaker turns and sentences. A turn starts at a "Name:" label at the start
+     of a line. Labels right after a sentence end (single-line transcripts) start a turn only if
+     the name also labels a line, or if the document labels turns inline consistently: at least
+     two names each label INLINE_TURN_REPEATS or more turns. So "Note:", "Step 1:" or "Q3 2024:"
+     in prose do not split it. The label stays in the chunk text. Text without labels (like the
+     current MasterClass transcripts) is one turn. Chunkers of text that is not a transcript (CSV
+     and JSONL fields, scraped pages) are created with `speaker_turns=False`.
+  2. Packs whole sentences into chunks sized by embedding model tokens, so no chunk is silently
+     truncated by the model. A single sentence longer than the budget is split on words.
+  3. Prefixes every chunk with its `[filename]` and attaches metadata to every chunk:
+     source, start/end character offsets in the source document, speaker, chunk index and
+     token count.
+  4. Overlaps consecutive chunks by whole sentences up to `overlap_tokens` (0 by default).
+
+Tokens are counted with the tokenizer of the embeddings the chunks are for (`embeddings_tokenizer`):
+the exported tokenizer.json of the ONNX backend, read with the `tokenizers` library alone so
+chunking does not import transformers, or else the embedding model's transformers tokenizer.
+"""
+
+import re
+from collections import Counter
+
+# all-MiniLM-L6-v2 truncates its input at 256 word pieces; leave room for the [filename] prefix
+CHUNK_TOKENS = 200
+CHUNK_OVERLAP_TOKENS = 0
+TOKENIZER_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+
+# Sentence ends: terminal punctuation (optionally followed by a closing quote) and whitespace
+SENTENCE_BOUNDARY = re.compile(r"(?<=[.!?])[\"')\]]?\s+")
+# Speaker labels: "Name:" or "Speaker 1:" at the start of a line or after a sentence end
+SPEAKER_TURN = re.compile(r"(?:^[ \t]*|(?<=[.!?]\s)\s*)([A-Z][\w.'-]*(?:[ \t][A-Z0-9][\w.'-]*){0,3}):[ \t]+",
+                          re.MULTILINE)
+# Turns each of two or more inline names must label before inline labels count as speaker turns
+INLINE_TURN_REPEATS = 2
+
+
+class JsonTokenizer:
+    """
+    A `tokenizers.Tokenizer` loaded from a tokenizer.json, called like a transformers tokenizer.
+    """
+
+    def __init__(self, path: str):
+        from tokenizers import Tokenizer
+
+        self.tokenizer = Tokenizer.from_file(path)
+        self.tokenizer.no_truncation()
+        self.tokenizer.no_padding()
+
+    def __call__(self, texts: list, add_special_tokens: bool = True) -> dict:
+        encodings = self.tokenizer.encode_batch(texts, add_special_tokens=add_special_tokens)
+        return {"input_ids": [encoding.ids for encoding in encodings]}
+
+
+def load_tokenizer(name: str = TOKENIZER_NAME, tokenizer_file: str = None):
+    """
+    Load the embedding model's tokenizer: from `tokenizer_file` with the `tokenizers` library if
+    given, otherwise the transformers tokenizer that ships with sentence-transformers.
+    """
+    if tokenizer_file:
+        return JsonTokenizer(tokenizer_file)
+    from transformers import AutoTokenizer
+
+    return AutoTokenizer.from_pretrained(name)
+
+
+def at_line_start(text: str, position: int) -> bool:
+    return not text[text.rfind("\n", 0, position) + 1:position].strip()
+
+
+def speaker_labels(text: str) -> list:
+    """
+    The SPEAKER_TURN matches of text that are speaker labels: every label at the start of a line,
+    and inline labels whose name also labels a line or that the document uses consistently.
+    """
+    matches = list(SPEAKER_TURN.finditer(text))
+    line_start = {match.start(1) for match in matches if at_line_start(text, match.start(1))}
+    names = {match.group(1) for match in matches if match.start(1) in line_start}
+    inline = Counter(match.group(1) for match in matches if match.start(1) not in line_start)
+    recurring = {name for name, count in inline.items() if count >= INLINE_TURN_REPEATS}
+    if len(recurring) >= 2:
+        names |= recurring
+    return [match for match in matches if match.group(1) in names]
+
+
+def embeddings_tokenizer(embeddings):
+    """
+    The tokenizer to count chunk tokens with for an embeddings object: its `tokenizer_file` if it
+    has one (onnx_embeddings.OnnxEmbeddings), otherwise the transformers tokenizer.
+    """
+    return load_tokenizer(tokenizer_file=getattr(embeddings, "tokenizer_file", None))
+
+
+def split_speaker_turns(text: str) -> list:
+    """
+    Split text into (speaker, start, end) spans; a turn starts at its label. Text before the
+    first label, or text without any labels, is a single turn with speaker None.
+    """
+    turns = []
+    labels = speaker_labels(text)
+    if not labels or labels[0].start(1) > 0:
+        first_end = labels[0].start(1) if labels else len(text)
+        turns.append((None, 0, first_end))
+    for i, label in enumerate(labels):
+        end = labels[i + 1].start(1) if i + 1 < len(labels) else len(text)
+        turns.append((label.group(1), label.start(1), end))
+    return turns
+
+
+def split_sentences(text: str, start: int, end: int) -> list:
+    """
+    Split text[start:end] into sentence spans, returned as (start, end) offsets into text.
+    """
+    spans = []
+    position = start
+    for match in SENTENCE_BOUNDARY.finditer(text, start, end):
+        if text[position:match.start()].strip():
+            spans.append((position, match.end()))
+        position = match.end()
+    if text[position:end].strip():
+        spans.append((position, end))
+    return spans
+
+
+class TranscriptChunker:
+    """
+    Chunk documents on sentence and speaker-turn boundaries, sized by model tokens.
+    """
+
+    def __init__(self, chunk_tokens: int = CHUNK_TOKENS, overlap_tokens: int = CHUNK_OVERLAP_TOKENS,
+                 tokenizer=None, speaker_turns: bool = True):
+        if overlap_tokens >= chunk_tokens:
+            raise ValueError("overlap_tokens must be smaller than chunk_tokens")
+        self.chunk_tokens = chunk_tokens
+        self.overlap_tokens = overlap_tokens
+        self.speaker_turns = speaker_turns
+        self.tokenizer = tokenizer or load_tokenizer()
+
+    def count_tokens(self, texts: list) -> list:
+        if not texts:
+            return []
+        encoded = self.tokenizer(texts, add_special_tokens=False)["input_ids"]
+        return [len(ids) for ids in encoded]
+
+    def _split_long_sentence(self, text: str, start: int, end: int, budget: int) -> list:
+        """
+        Split a sentence longer than the budget on word boundaries.
+        """
+        words = [(m.start(), m.end()) for m in re.finditer(r"\S+", text[start:end])]
+        counts = self.count_tokens([text[start + s:start + e] for s, e in words])
+        pieces = []
+        piece_start, piece_tokens = None, 0
+        for (s, e), count in zip(words, counts):
+            if piece_start is not None and piece_tokens + count > budget:
+                pieces.append((piece_start, start + s, piece_tokens))
+                piece_start, piece_tokens = None, 0
+            if piece_start is None:
+                piece_start = start + s
+            piece_tokens += count
+            piece_end = start + e
+        if piece_start is not None:
+            pieces.append((piece_start, piece_end, piece_tokens))
+        return pieces
+
+    def split_document(self, source: str, text: str) -> list:
+        """
+        Split one document into Documents with source, offset and speaker metadata.
+        """
+        from langchain.docstore.document import Document
+
+        prefix = f"[{source}]\n"
+        budget = self.chunk_tokens - self.count_tokens([prefix])[0]
+        chunks = []
+
+        turns = split_speaker_turns(text) if self.speaker_turns else [(None, 0, len(text))]
+        for speaker, turn_start, turn_end in turns:
+            spans = split_sentences(text, turn_start, turn_end)
+            counts = self.count_tokens([text[s:e] for s, e in spans])
+            sentences = []
+            for (s, e), count in zip(spans, counts):
+                if count > budget:
+                    sentences.extend(self._split_long_sentence(text, s, e, budget))
+                else:
+                    sentences.append((s, e, count))
+
+            window, window_tokens = [], 0
+            for sentence in sentences:
+                if window and window_tokens + sentence[2] > budget:
+                    chunks.append((speaker, window))
+                    # Carry whole trailing sentences over as overlap.
+                    carried, carried_tokens = [], 0
+                    for previous in reversed(window):
+                        if carried_tokens + previous[2] > self.overlap_tokens:
+                            break
+                        carried.insert(0, previous)
+                        carried_tokens += previous[2]
+                    if carried_tokens + sentence[2] > budget:
+                        carried, carried_tokens = [], 0
+                    window, window_tokens = carried, carried_tokens
+                window.append(sentence)
+                window_tokens += sentence[2]
+            if window:
+                chunks.append((speaker, window))
+
+        documents = []
+        for index, (speaker, window) in enumerate(chunks):
+            start, end = window[0][0], window[-1][1]
+            documents.append(Document(
+                page_content=prefix + text[start:end].strip(),
+                metadata={
+                    "source": source,
+                    "start": start,
+                    "end": end,
+                    "speaker": speaker,
+                    "chunk": index,
+                    "tokens": sum(sentence[2] for sentence in window),
+                },
+            ))
+        return documents
+
+    def split_documents(self, documents: dict) -> list:
+        """
+        Split a {filename: content} dictionary (as returned by extract_documents) into Documents.
+        """
+        chunks = []
+        for filename, content in documents.items():
+            chunks.extend(self.split_document(filename, content))
+        return chunks
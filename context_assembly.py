@@ -0,0 +1,201 @@
+"""
+Context Assembly for the RAG System for Portfolio Support
+
+The prompt context used to be the top-3 chunks of `similarity_search`, pasted one after another.
+Neighbouring chunks of one transcript often rank together, so the three passages could be near
+duplicates: chunks that overlap by a sentence or follow each other, all repeating the same
+`[filename]` prefix. ContextAssembler builds the context from a wider candidate set instead:
+  1. Fetches the CONTEXT_FETCH_K nearest chunks and reads their vectors back from the FAISS index
+     (the query vector comes from the query cache), so nothing is embedded twice.
+  2. Picks chunks by maximal marginal relevance: each pick maximizes
+     MMR_LAMBDA * similarity to the query - (1 - MMR_LAMBDA) * similarity to the chunks already
+     picked, so the passages cover distinct content.
+  3. Merges picked chunks of the same source whose start/end offsets overlap or touch into one
+     passage (overlapping text is kept once, the `[filename]` prefix appears once), and keeps
+     picking until there are CONTEXT_PASSAGES passages, the picked chunks reach the token budget
+     of CONTEXT_PASSAGES full chunks (CONTEXT_PASSAGES * chunking.CHUNK_TOKENS), or no candidates
+     are left. Merging therefore never makes the context larger than the plain top-k chunks could be.
+
+Every call logs, and `stats()` accumulates, the estimated tokens of the plain top-k chunks (the
+original prompt context) and of the assembled passages, i.e. the tokens saved per prompt, which
+is negative when the assembled context is larger. Token counts are whitespace-word estimates, as
+in context_format.py; the budget uses the model token counts the chunker stores in metadata.
+"""
+
+import logging
+import threading
+
+from chunking import CHUNK_TOKENS
+
+CONTEXT_PASSAGES = 3
+CONTEXT_FETCH_K = 12
+MMR_LAMBDA = 0.7
+# Chunks of one source this many characters apart or closer are one passage
+ADJACENT_GAP_CHARS = 1
+
+
+def estimate_tokens(text: str) -> int:
+    return len(text.split())
+
+
+def chunk_model_tokens(doc) -> int:
+    """
+    Model tokens of a chunk as counted by the chunker, or a word estimate for chunks without one.
+    """
+    return doc.metadata.get("tokens") or estimate_tokens(doc.page_content)
+
+
+def split_prefix(page_content: str):
+    """
+    Split a chunk into its `[filename]` prefix line and its text.
+    """
+    if page_content.startswith("[") and "\n" in page_content:
+        prefix, text = page_content.split("\n", 1)
+        return prefix, text
+    return "", page_content
+
+
+def mmr_order(query_vector, vectors, limit: int, lambda_mult: float = MMR_LAMBDA) -> list:
+    """
+    Indices of `vectors` in maximal-marginal-relevance order (at most `limit` of them).
+    """
+    import numpy as np
+
+    matrix = np.array(vectors, dtype=np.float32)
+    matrix /= np.clip(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12, None)
+    query = np.array(query_vector, dtype=np.float32)
+    query /= max(float(np.linalg.norm(query)), 1e-12)
+    relevance = matrix @ query
+    pairwise = matrix @ matrix.T
+
+    order = []
+    remaining = list(range(len(matrix)))
+    while remaining and len(order) < limit:
+        if order:
+            redundancy = pairwise[np.ix_(remaining, order)].max(axis=1)
+        else:
+            redundancy = np.zeros(len(remaining), dtype=np.float32)
+        scores = lambda_mult * relevance[remaining] - (1 - lambda_mult) * redundancy
+        best = remaining[int(np.argmax(scores))]
+        order.append(best)
+        remaining.remove(best)
+    return order
+
+
+def merge_passages(docs: list) -> list:
+    """
+    Merge chunks of the same source whose start/end offsets overlap or touch, keeping overlapping
+    text once. Chunks without offsets are kept as they are (exact duplicates dropped). Returns
+    passages as {"source", "start", "end", "prefix", "text", "chunks", "rank"}, ordered by the
+    rank of their best chunk in `docs`.
+    """
+    passages = []
+    spans_by_source = {}
+    for rank, doc in enumerate(docs):
+        prefix, text = split_prefix(doc.page_content)
+        source, start, end = doc.metadata.get("source"), doc.metadata.get("start"), doc.metadata.get("end")
+        if start is None or end is None:
+            if not any(passage["text"] == text for passage in passages):
+                passages.append({"source": source, "start": None, "end": None, "prefix": prefix,
+                                 "text": text, "chunks": 1, "rank": rank})
+            continue
+        spans_by_source.setdefault(source, []).append((start, end, rank, prefix, text))
+
+    for source, spans in spans_by_source.items():
+        current = None
+        for start, end, rank, prefix, text in sorted(spans):
+            if current is not None and start <= current["end"] + ADJACENT_GAP_CHARS:
+                if end > current["end"]:
+                    # Drop the part of this chunk the passage already has.
+                    overlap = max(0, current["end"] - start)
+                    current["text"] = current["text"].rstrip() + " " + text[overlap:].lstrip()
+                    current["end"] = end
+                current["rank"] = min(current["rank"], rank)
+                current["chunks"] += 1
+                continue
+            current = {"source": source, "start": start, "end": end, "prefix": prefix,
+                       "text": text, "chunks": 1, "rank": rank}
+            passages.append(current)
+    return sorted(passages, key=lambda passage: passage["rank"])
+
+
+def format_passages(passages: list) -> str:
+    return "\n\n".join(f"{passage['prefix']}\n{passage['text'].strip()}" if passage["prefix"]
+                       else passage["text"].strip() for passage in passages)
+
+
+class ContextAssembler:
+    """
+    Turn retrieval candidates into k deduplicated, diverse passages for the prompt.
+    """
+
+    def __init__(self, passages: int = CONTEXT_PASSAGES, fetch_k: int = CONTEXT_FETCH_K,
+                 lambda_mult: float = MMR_LAMBDA, token_budget: int = None):
+        self.passages = passages
+        self.fetch_k = fetch_k
+        self.lambda_mult = lambda_mult
+        # Model tokens of the picked chunks, at most as many as `passages` full chunks
+        self.token_budget = token_budget or passages * CHUNK_TOKENS
+        self._lock = threading.Lock()
+        self.prompts = 0
+        self.top_k_tokens = 0
+        self.context_tokens = 0
+
+    def assemble(self, vector_store, query_vector, positions: list) -> str:
+        """
+        Build the context text from candidate FAISS row ids (best match first).
+        """
+        from query_encoding import documents_at
+
+        if not positions:
+            return ""
+        docs = documents_at(vector_store, positions)
+        vectors = [vector_store.index.reconstruct(position) for position in positions]
+        order = mmr_order(query_vector, vectors, len(docs), self.lambda_mult)
+
+        picked = []
+        passages = []
+        budget = self.token_budget
+        for index in order:
+            tokens = chunk_model_tokens(docs[index])
+            if picked and tokens > budget:
+                break
+            picked.append(docs[index])
+            budget -= tokens
+            passages = merge_passages(picked)
+            if len(passages) >= self.passages:
+                break
+
+        context_text = format_passages(passages)
+        # The original context: the plain top-k chunks, pasted one after another
+        top_k_tokens = estimate_tokens("\n\n".join(doc.page_content for doc in docs[:self.passages]))
+        context_tokens = estimate_tokens(context_text)
+        with self._lock:
+            self.prompts += 1
+            self.top_k_tokens += top_k_tokens
+            self.context_tokens += context_tokens
+        logging.info("Assembled %d passages from %d chunks: %d context tokens, %d saved against the top %d",
+                     len(passages), len(picked), context_tokens, top_k_tokens - context_tokens, self.passages)
+        return context_text
+
+    def retrieve(self, retriever, query: str, search_filter: dict = None) -> str:
+        """
+        Retrieve and assemble the context for a query. `retriever` is a query_encoding.QueryBatcher
+        (as returned by the index registry); plain vector stores get their top chunks as they are.
+        """
+        if not hasattr(retriever, "search_positions"):
+            docs = retriever.similarity_search(query, k=self.passages, filter=search_filter)
+            return "\n\n".join(doc.page_content for doc in docs)
+        query_vector, positions = retriever.search_positions(query, self.fetch_k, search_filter)
+        return self.assemble(retriever.vector_store, query_vector, positions)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "prompts": self.prompts,
+                "top_k_tokens": self.top_k_tokens,
+                "context_tokens": self.context_tokens,
+                "tokens_saved": self.top_k_tokens - self.context_tokens,
+                "tokens_saved_per_prompt": (self.top_k_tokens - self.context_tokens) / self.prompts
+                if self.prompts else 0.0,
+            }
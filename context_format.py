@@ -0,0 +1,93 @@
+"""
+Compact API Context Formatting for the RAG System for Portfolio Support
+
+`fetch_api_info()` used to paste raw Python reprs (`str(team_profile)`, `str(investments)`, ...)
+into the prompt: every field, plus quotes, braces and Mongo `_id`s. Every one of those characters
+costs prompt-eval time on CPU inference. `format_api_data()` instead:
+  1. Projects each endpoint's response to the fields worth showing the model (FIELD_PROJECTIONS).
+     Link-like fields are only kept when the query asks for links (INTENT_FIELDS).
+  2. Renders what is left as compact `key: value` lines, one list item per line.
+  3. Truncates long texts to MAX_FIELD_TOKENS and long lists to MAX_LIST_ITEMS.
+
+Token counts here are whitespace-word estimates; they are only used for truncation.
+"""
+
+import re
+
+MAX_FIELD_TOKENS = 60
+MAX_LIST_ITEMS = 5
+
+# Fields kept for each planned lookup (see plan_api_lookups); other fields are dropped
+FIELD_PROJECTIONS = {
+    "ping": ["name", "email"],
+    "team_profile": ["name", "role", "bio", "personal_quote"],
+    "team_insights": ["title", "date"],
+    "investments": ["company_name", "location", "sectors"],
+    "investment_insights": ["title", "date"],
+    "sectors": ["sector", "description", "companies", "investment_team"],
+    "consultations": ["date", "company_name", "consultation_details", "hours"],
+}
+
+# Extra fields kept when the query mentions one of the keywords
+INTENT_FIELDS = [
+    (re.compile(r"\b(link|links|url|urls|website|site|read)\b", re.IGNORECASE), ["link", "url", "website"]),
+]
+
+
+def truncate_text(text: str, max_tokens: int = MAX_FIELD_TOKENS) -> str:
+    words = text.split()
+    if len(words) <= max_tokens:
+        return " ".join(words)
+    return " ".join(words[:max_tokens]) + " ..."
+
+
+def projected_fields(name: str, query: str = "") -> list:
+    fields = list(FIELD_PROJECTIONS.get(name, []))
+    for pattern, extra in INTENT_FIELDS:
+        if pattern.search(query):
+            fields.extend(field for field in extra if field not in fields)
+    return fields
+
+
+def format_value(value) -> str:
+    if isinstance(value, (list, tuple)):
+        items = [format_value(item) for item in value[:MAX_LIST_ITEMS]]
+        if len(value) > MAX_LIST_ITEMS:
+            items.append(f"+{len(value) - MAX_LIST_ITEMS} more")
+        return ", ".join(items)
+    if isinstance(value, dict):
+        return "; ".join(f"{key}: {format_value(item)}" for key, item in value.items())
+    return truncate_text(str(value))
+
+
+def format_record(record: dict, fields: list) -> str:
+    """
+    Render one record as `key: value` pairs, keeping only the projected fields (all fields other
+    than Mongo internals if no projection is defined).
+    """
+    if fields:
+        pairs = [(field, record[field]) for field in fields if record.get(field) not in (None, "", [])]
+    else:
+        pairs = [(key, value) for key, value in record.items() if not key.startswith("_")]
+    return "; ".join(f"{key}: {format_value(value)}" for key, value in pairs)
+
+
+def format_api_data(name: str, data, query: str = "") -> str:
+    """
+    Render an endpoint response compactly for the prompt.
+    """
+    if isinstance(data, str):
+        return data
+    fields = projected_fields(name, query)
+    if isinstance(data, dict):
+        if fields:
+            return "\n".join(f"{field}: {format_value(data[field])}"
+                             for field in fields if data.get(field) not in (None, "", []))
+        return format_record(data, fields).replace("; ", "\n")
+    if isinstance(data, list):
+        lines = [f"- {format_record(item, fields) if isinstance(item, dict) else format_value(item)}"
+                 for item in data[:MAX_LIST_ITEMS]]
+        if len(data) > MAX_LIST_ITEMS:
+            lines.append(f"- +{len(data) - MAX_LIST_ITEMS} more")
+        return "\n".join(lines)
+    return truncate_text(str(data))
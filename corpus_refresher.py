@@ -0,0 +1,185 @@
+"""
+Background Corpus Refresh for the RAG System for Portfolio Support
+
+Picking up new documents from /api/documents/download used to mean restarting the app and waiting
+for a full `build_vector_store()` with no service. CorpusRefresher instead runs in a background
+thread and, every REFRESH_INTERVAL_SECONDS:
+  1. Polls the download endpoint with `If-None-Match`, so an unchanged zip costs a 304 and no body.
+     Pass the ETag of the startup download (`etag=`), or the first poll downloads the zip again.
+  2. If a zip comes back, compares a SHA-256 hash of every document with the ones it last indexed.
+  3. Builds the new index off the request path. Unchanged documents keep their chunks and vectors
+     (read back from the current index), so only new or changed documents are chunked and embedded.
+  4. Swaps the new index into the index registry atomically. Requests already running keep the
+     old retriever and finish on the old index; /chat never waits for a refresh.
+
+`status()` reports the last refresh duration and the corpus' index generation number.
+"""
+
+import hashlib
+import logging
+import threading
+import time
+
+import requests
+
+from chunking import TranscriptChunker, embeddings_tokenizer
+from index_registry import DEFAULT_CORPUS
+from structured_ingest import split_corpus
+from rag_langchain_ai_system import (
+    API_TOKEN,
+    CHUNK_OVERLAP_TOKENS,
+    CHUNK_TOKENS,
+    DOCUMENTS_DOWNLOAD_ENDPOINT,
+    DOWNLOAD_TIMEOUT_SECONDS,
+    extract_documents,
+)
+
+REFRESH_INTERVAL_SECONDS = 300
+
+
+def hash_documents(documents: dict) -> dict:
+    return {filename: hashlib.sha256(content.encode("utf-8")).hexdigest()
+            for filename, content in documents.items()}
+
+
+def download_documents_zip_if_changed(api_token: str, etag: str = None):
+    """
+    Conditionally download the documents zip. Returns (zip_bytes, etag); zip_bytes is None when
+    the server answered 304 Not Modified.
+    """
+    headers = {"Authorization": f"Bearer {api_token}"}
+    if etag:
+        headers["If-None-Match"] = etag
+    response = requests.get(DOCUMENTS_DOWNLOAD_ENDPOINT, headers=headers, timeout=DOWNLOAD_TIMEOUT_SECONDS)
+    if response.status_code == 304:
+        return None, etag
+    response.raise_for_status()
+    return response.content, response.headers.get("ETag")
+
+
+def update_vector_store(vector_store, changed_documents: dict, removed_sources: set):
+    """
+    Build a new FAISS vector store from an existing one: chunks of changed or removed sources are
+    dropped, unchanged chunks keep their stored vectors, and only `changed_documents` are chunked
+    and embedded. The existing vector store is not modified.
+    """
+    from langchain.vectorstores import FAISS
+
+    stale_sources = set(changed_documents) | set(removed_sources)
+    texts, vectors, metadatas = [], [], []
+    for position in range(vector_store.index.ntotal):
+        doc = vector_store.docstore.search(vector_store.index_to_docstore_id[position])
+        if doc.metadata.get("source") in stale_sources:
+            continue
+        texts.append(doc.page_content)
+        vectors.append(vector_store.index.reconstruct(position))
+        metadatas.append(doc.metadata)
+    reused = len(texts)
+
+    embeddings = vector_store.embedding_function
+    chunker = TranscriptChunker(chunk_tokens=CHUNK_TOKENS, overlap_tokens=CHUNK_OVERLAP_TOKENS,
+                                tokenizer=embeddings_tokenizer(embeddings))
+    chunks = split_corpus(changed_documents, chunker)
+    texts.extend(chunk.page_content for chunk in chunks)
+    vectors.extend(embeddings.embed_documents([chunk.page_content for chunk in chunks]))
+    metadatas.extend(chunk.metadata for chunk in chunks)
+    logging.info("Refreshed index: reused %d chunks, embedded %d new chunks", reused, len(chunks))
+
+    return FAISS.from_embeddings(list(zip(texts, vectors)), embeddings, metadatas=metadatas)
+
+
+class CorpusRefresher:
+    """
+    Keep a registry corpus in sync with the documents download endpoint from a background thread.
+    """
+
+    def __init__(self, registry, documents: dict, corpus_id: str = DEFAULT_CORPUS,
+                 interval_seconds: float = REFRESH_INTERVAL_SECONDS, api_token: str = API_TOKEN, etag: str = None):
+        self.registry = registry
+        self.corpus_id = corpus_id
+        self.interval_seconds = interval_seconds
+        self.api_token = api_token
+        self.etag = etag
+        self.hashes = hash_documents(documents)
+        self.last_checked = None
+        self.last_changed = None
+        self.last_refresh_seconds = None
+        self.refreshes = 0
+        self.last_error = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name=f"refresh-{self.corpus_id}", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.wait(self.interval_seconds):
+            try:
+                self.refresh_once()
+                self.last_error = None
+            except Exception as e:
+                logging.error("Corpus refresh for %s failed: %s", self.corpus_id, e)
+                self.last_error = str(e)
+
+    def refresh_once(self) -> bool:
+        """
+        Check for new documents and, if anything changed, build and swap in a new index.
+        Returns True if the index was replaced.
+        """
+        self.last_checked = time.time()
+        zip_bytes, etag = download_documents_zip_if_changed(self.api_token, self.etag)
+        if zip_bytes is None:
+            return False
+        self.etag = etag
+
+        documents = extract_documents(zip_bytes)
+        hashes = hash_documents(documents)
+        changed = {filename: content for filename, content in documents.items()
+                   if self.hashes.get(filename) != hashes[filename]}
+        removed = set(self.hashes) - set(hashes)
+        if not changed and not removed:
+            return False
+
+        start = time.perf_counter()
+        current = self.registry.current(self.corpus_id)
+        if current is None:
+            from rag_langchain_ai_system import build_vector_store
+
+            vector_store = build_vector_store(documents)
+        else:
+            vector_store = update_vector_store(current, changed, removed)
+        build_seconds = time.perf_counter() - start
+
+        pinned = self.registry.is_pinned(self.corpus_id)
+        if not pinned:
+            # Keep the on-disk copy current, so a later lazy load does not bring back stale data.
+            self.registry.save(self.corpus_id, vector_store)
+        self.registry.put(self.corpus_id, vector_store, pinned=pinned, build_seconds=build_seconds)
+
+        self.hashes = hashes
+        self.last_changed = time.time()
+        self.last_refresh_seconds = build_seconds
+        self.refreshes += 1
+        logging.info("Corpus %s refreshed in %.2fs (%d changed, %d removed documents)",
+                     self.corpus_id, build_seconds, len(changed), len(removed))
+        return True
+
+    def status(self) -> dict:
+        corpus_metrics = self.registry.metrics()["corpora"].get(self.corpus_id, {})
+        return {
+            "corpus": self.corpus_id,
+            "generation": corpus_metrics.get("generation", 0),
+            "interval_seconds": self.interval_seconds,
+            "refreshes": self.refreshes,
+            "last_refresh_seconds": self.last_refresh_seconds,
+            "last_checked": self.last_checked,
+            "last_changed": self.last_changed,
+            "etag": self.etag,
+            "documents": len(self.hashes),
+            "last_error": self.last_error,
+        }
@@ -0,0 +1,177 @@
+"""
+Local Entity Snapshot Store for the RAG System for Portfolio Support
+
+The team, investment, sector and consultation data changes rarely (it is seeded by the backend),
+yet every entity lookup in `fetch_api_info()` used to be a remote call at question time, and the
+backend only matches exact names. EntitySnapshotStore instead:
+  1. Pulls the full datasets in one call to /api/sync and keeps them in memory, indexed by
+     normalized name (case, punctuation and whitespace insensitive).
+  2. Re-syncs periodically from a background thread; a failed sync keeps serving the last snapshot.
+  3. Answers the team, investment, sector and consultation lookups planned by `plan_api_lookups()`
+     locally, with the same response shapes as the backend endpoints, in microseconds.
+  4. Matches names fuzzily: exact normalized match first, then a close match (difflib ratio of
+     at least FUZZY_MATCH_CUTOFF), then a unique name containing all the words of the query.
+
+`answer(lookup)` returns NOT_IN_SNAPSHOT for lookups it cannot answer (ping, scrape, or before the
+first successful sync), so callers fall back to the remote endpoint.
+"""
+
+import difflib
+import logging
+import re
+import threading
+import time
+
+SNAPSHOT_REFRESH_SECONDS = 600
+FUZZY_MATCH_CUTOFF = 0.85
+
+NOT_IN_SNAPSHOT = object()
+
+
+def normalize_name(name: str) -> str:
+    """
+    Normalize an entity name for lookups: lower case, punctuation removed, whitespace collapsed.
+    """
+    return " ".join(re.sub(r"[^\w\s&]", " ", str(name).lower()).split())
+
+
+class NameIndex:
+    """
+    Records indexed by normalized name, with fuzzy matching.
+    """
+
+    def __init__(self, records: list, key: str):
+        self.records = {}
+        for record in records:
+            if record.get(key):
+                self.records[normalize_name(record[key])] = record
+        self.names = list(self.records)
+
+    def find(self, name: str):
+        normalized = normalize_name(name)
+        if normalized in self.records:
+            return self.records[normalized]
+        close = difflib.get_close_matches(normalized, self.names, n=1, cutoff=FUZZY_MATCH_CUTOFF)
+        if close:
+            return self.records[close[0]]
+        words = set(normalized.split())
+        containing = [candidate for candidate in self.names if words and words <= set(candidate.split())]
+        if len(containing) == 1:
+            return self.records[containing[0]]
+        return None
+
+
+class EntitySnapshotStore:
+    """
+    In-memory snapshot of the backend entity data, refreshed periodically.
+    `fetch_snapshot()` must return the /api/sync payload.
+    """
+
+    def __init__(self, fetch_snapshot, refresh_seconds: float = SNAPSHOT_REFRESH_SECONDS):
+        self.fetch_snapshot = fetch_snapshot
+        self.refresh_seconds = refresh_seconds
+        self._snapshot = None
+        self._stop = threading.Event()
+        self._thread = None
+        self.last_synced = None
+        self.last_sync_seconds = None
+        self.last_error = None
+
+    def sync(self):
+        """
+        Pull the full datasets and atomically replace the snapshot.
+        """
+        start = time.perf_counter()
+        data = self.fetch_snapshot()
+        consultations = data.get("consultations", [])
+        snapshot = {
+            "team": NameIndex(data.get("team", []), "name"),
+            "investments": NameIndex(data.get("investments", []), "company_name"),
+            "sectors": NameIndex(data.get("sectors", []), "sector"),
+            "consultations": [(record.get("consultation_details", "").lower(), record)
+                              for record in consultations],
+        }
+        self._snapshot = snapshot
+        self.last_synced = time.time()
+        self.last_sync_seconds = time.perf_counter() - start
+        logging.info("Synced entity snapshot: %d team members, %d investments, %d sectors, %d consultations",
+                     len(snapshot["team"].names), len(snapshot["investments"].names),
+                     len(snapshot["sectors"].names), len(consultations))
+
+    def start(self):
+        """
+        Sync now (failures are logged; lookups fall back to the API) and keep syncing in the background.
+        """
+        try:
+            self.sync()
+        except Exception as e:
+            logging.error("Initial entity sync failed: %s", e)
+            self.last_error = str(e)
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="entity-sync", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.wait(self.refresh_seconds):
+            try:
+                self.sync()
+                self.last_error = None
+            except Exception as e:
+                logging.error("Entity sync failed, keeping the previous snapshot: %s", e)
+                self.last_error = str(e)
+
+    def answer(self, lookup: dict):
+        """
+        Answer a planned lookup (see plan_api_lookups) from the snapshot, with the same shape the
+        backend endpoint returns. Returns None if the entity does not exist and NOT_IN_SNAPSHOT if
+        the lookup has to go to the API.
+        """
+        snapshot = self._snapshot
+        if snapshot is None:
+            return NOT_IN_SNAPSHOT
+        name = lookup["name"]
+        params = lookup["params"]
+
+        if name in ("team_profile", "team_insights"):
+            member = snapshot["team"].find(params["name"])
+            if member is None:
+                return None
+            if name == "team_insights":
+                return member.get("related_insights", [])
+            return {key: member.get(key) for key in ("name", "role", "bio", "personal_quote")}
+
+        if name in ("investments", "investment_insights"):
+            investment = snapshot["investments"].find(params["company_name"])
+            if investment is None:
+                return None
+            if name == "investment_insights":
+                return investment.get("insights", [])
+            return {key: investment.get(key) for key in ("company_name", "location", "website", "sectors")}
+
+        if name == "sectors":
+            return snapshot["sectors"].find(params["sector"])
+
+        if name == "consultations":
+            needle = params["name"].lower()
+            return [record for details, record in snapshot["consultations"] if needle in details] or None
+
+        return NOT_IN_SNAPSHOT
+
+    def status(self) -> dict:
+        snapshot = self._snapshot
+        return {
+            "synced": snapshot is not None,
+            "last_synced": self.last_synced,
+            "last_sync_seconds": self.last_sync_seconds,
+            "refresh_seconds": self.refresh_seconds,
+            "last_error": self.last_error,
+            "counts": {
+                "team": len(snapshot["team"].names),
+                "investments": len(snapshot["investments"].names),
+                "sectors": len(snapshot["sectors"].names),
+                "consultations": len(snapshot["consultations"]),
+            } if snapshot is not None else {},
+        }
@@ -5,7 +5,7 @@ Dynamic Entity Extraction, Conversation History, and Reduced Hallucinations
 This Flask App:
   1. Downloads a ZIP file containing MasterClass documents from the /api/documents/download endpoint.
   2. Unzips and reads all text files.
-  3. Splits each document into more manageable text chunks.
+  3. Splits each document into sentence-aligned chunks sized by embedding model tokens.
   4. Uses a Hugging Face embedding model to encode these chunks and build an in‑memory FAISS vector store.
   5. At startup, calls the /ping endpoint to verify API credentials.
   6. Runs an interactive conversation loop that:
@@ -18,9 +18,15 @@ This Flask App:
             • /api/sectors
             • /api/scrape
             • /ping (checked once at startup)
-       - Appends the retrieved API information (or friendly messages if data is unavailable), document context, and conversation history to the prompt.
+       - Builds the prompt with a stable prefix (preamble and conversation history) followed by the document context
+         and API information (or friendly messages if data is unavailable), so Ollama reuses its cached prefix.
        - Uses a Hugging Face language model (via the Ollama integration) to generate an answer.
 
+The pipeline itself (document processing, entity extraction, API aggregation and answer generation)
+lives in rag_langchain_ai_system.py; this module only wires it into a Flask app. See asgi_api.py for
+the async-native counterpart. POST /chat/batch answers a JSONL body of queries in one batch and
+streams JSONL results (batch_answering.py).
+
 Before running, ensure you have installed these packages:
     !pip install langchain_community faiss-cpu sentence-transformers requests flask pyngrok
 
@@ -30,436 +36,135 @@ Author: David Nguyen
 Date: 2/2/2025
 """
 
-import os
-import io
-import zipfile
-import re
-import requests
 import logging
-from flask import Flask, request, jsonify
-
-# LangChain imports
-from langchain.text_splitter import CharacterTextSplitter
-from langchain.vectorstores import FAISS
-from langchain.embeddings import HuggingFaceEmbeddings
-
-# Ollama integration (from LangChain Community) for LLM
-from langchain_community.llms import Ollama
-
-# Set up logging for debugging
-logging.basicConfig(level=logging.INFO)
-# Override logging.error to suppress error messages from appearing on the console.
-logging.error = lambda *args, **kwargs: None
-
-#########################
-# Configuration Section #
-#########################
-
-# Replace the URL with your own API if you are hosting it elsewhere
-API_BASE_URL = "https://rag-langchain-ai-system.onrender.com"
-DOCUMENTS_DOWNLOAD_ENDPOINT = f"{API_BASE_URL}/api/documents/download"
-API_TOKEN = "token"  # Replace with your actual API token
-
-# NOTE: If you are using the sample Express API in this repo, you can call the API endpoint at /auth/token
-# and use the token generated from the response here.
-
-EMBEDDING_MODEL_NAME = "all-MiniLM-L6-v2"
-LLM_MODEL_NAME = "llama2"
-
-###############################
-# API Helper Functions        #
-###############################
-
-def api_get(endpoint: str, params: dict) -> dict:
-    """
-    Call a GET endpoint with Authorization.
-    """
-    headers = {"Authorization": f"Bearer {API_TOKEN}"}
-    url = f"{API_BASE_URL}{endpoint}"
-    response = requests.get(url, headers=headers, params=params)
-    response.raise_for_status()
-    return response.json()
-
-
-# Ping endpoint: verifies token validity
-def get_ping() -> dict:
-    return api_get("/ping", {})
-
-
-# Team endpoints
-def get_team_profile(name: str) -> dict:
-    return api_get("/api/team", {"name": name})
-
-
-def get_team_insights(name: str) -> dict:
-    return api_get("/api/team/insights", {"name": name})
-
-
-# Investments endpoints
-def get_investments(company_name: str) -> dict:
-    return api_get("/api/investments", {"company_name": company_name})
+from flask import Flask, Response, request, jsonify, stream_with_context
+
+# The retrieval-augmented pipeline is shared with the CLI script and the ASGI server (asgi_api.py)
+from rag_langchain_ai_system import (
+    API_TOKEN,
+    get_ping,
+    download_documents_zip_with_etag,
+    extract_documents,
+    build_vector_store,
+    load_embeddings,
+    is_fresh_start,
+    scrape_sessions,
+    entity_store,
+    DEFAULT_SESSION,
+    generate_answer,
+    context_assembler,
+    llm_pool,
+    latency_tracker,
+)
+from index_registry import IndexRegistry, UnknownCorpusError, DEFAULT_CORPUS
+from corpus_refresher import CorpusRefresher
+from batch_answering import BATCH_WORKERS, answer_batch_lines, clamp_workers, parse_batch
 
+##################################
+# Flask App Setup                #
+##################################
 
-def get_investments_insights(company_name: str) -> dict:
-    return api_get("/api/investments/insights", {"company_name": company_name})
+app = Flask(__name__)
 
+# Corpus ID -> FAISS index, loaded lazily and evicted under a memory budget (created at startup)
+registry = None
 
-# Sectors endpoint
-def get_sectors(sector: str) -> dict:
-    return api_get("/api/sectors", {"sector": sector})
+# Background refresh of the startup corpus from the documents download endpoint (created at startup)
+refresher = None
 
+# Global conversation history per corpus and session (for demo purposes)
+conversation_histories = {}
 
-# Consultations endpoint
-def get_consultations(name: str) -> dict:
-    return api_get("/api/consultations", {"name": name})
+@app.route('/chat', methods=['POST'])
+def chat():
+    data = request.get_json()
+    if not data or 'query' not in data:
+        return jsonify({'error': "Missing 'query' parameter"}), 400
+    user_query = data['query']
+    corpus = data.get('corpus', DEFAULT_CORPUS)
+    search_filter = data.get('filter')
+    if search_filter is not None and not isinstance(search_filter, dict):
+        return jsonify({'error': "'filter' must be an object"}), 400
+    try:
+        retriever = registry.get(corpus)
+    except UnknownCorpusError:
+        return jsonify({'error': f"Unknown corpus '{corpus}'"}), 404
 
+    # Each session keeps its own history and its own index of scraped pages.
+    session = f"{corpus}:{data.get('session_id', DEFAULT_SESSION)}"
 
-# Scrape endpoint
-def get_scrape(url: str) -> dict:
-    return api_get("/api/scrape", {"url": url})
+    # If query is a greeting or introductory query, reset history for a fresh start.
+    if is_fresh_start(user_query):
+        conversation_histories[session] = ""
+        scrape_sessions.reset(session)
+        response_text = generate_answer(user_query, "", retriever, session)
+        return jsonify({'response': response_text})
 
+    history = conversation_histories.get(session, "") + f"\nUser: {user_query}"
+    answer = generate_answer(user_query, history, retriever, session, search_filter)
+    conversation_histories[session] = history + f"\nAssistant: {answer}"
+    return jsonify({'response': answer})
 
-#######################################
-# Dynamic Entity Extraction Functions #
-#######################################
 
-def extract_person_name(text: str, keyword: str) -> str:
+@app.route('/chat/batch', methods=['POST'])
+def chat_batch():
     """
-    Extract a person’s name based on a keyword (e.g. "consult", "profile", "team").
-    Looks for patterns like "consulted with <Name>" or "profile for <Name>".
+    Answer a JSONL body of queries (one {"query": ...} object per line) and stream the results
+    back as JSONL, one line per query as it finishes, then a summary line (see batch_answering.py).
     """
-    pattern = re.compile(rf"{keyword}\s+(?:with|for)?\s*([A-Z][a-z]+(?:\s[A-Z][a-z]+)+)", re.IGNORECASE)
-    match = pattern.search(text)
-    if match:
-        return match.group(1).strip()
-    return None
+    corpus = request.args.get('corpus', DEFAULT_CORPUS)
+    try:
+        items = parse_batch(request.get_data(as_text=True).splitlines())
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 413
+    try:
+        retriever = registry.get(corpus)
+    except UnknownCorpusError:
+        return jsonify({'error': f"Unknown corpus '{corpus}'"}), 404
+    workers = clamp_workers(request.args.get('workers', BATCH_WORKERS, type=int))
+    return Response(stream_with_context(answer_batch_lines(items, retriever, workers)),
+                    mimetype='application/x-ndjson')
 
 
-def extract_company_name(text: str) -> str:
+@app.route('/corpora', methods=['GET'])
+def corpora():
     """
-    Extract a company name from the text.
-    Looks for patterns like "company <CompanyName>".
+    Memory and load-time metrics for each corpus.
     """
-    pattern = re.compile(r"company\s+([A-Z][a-zA-Z0-9& ]+)", re.IGNORECASE)
-    match = pattern.search(text)
-    if match:
-        return match.group(1).strip()
-    return None
+    return jsonify(registry.metrics())
 
 
-def extract_sector(text: str) -> str:
+@app.route('/refresh', methods=['GET'])
+def refresh_status():
     """
-    Extract a sector name from the text.
-    Looks for patterns like "sector of <Sector Name>" or "sector <Sector Name>".
+    Duration of the last background refresh and the current index generation.
     """
-    pattern = re.compile(r"sector(?:s)?(?:\s+of)?\s+([A-Za-z ]+)", re.IGNORECASE)
-    match = pattern.search(text)
-    if match:
-        return match.group(1).strip()
-    return None
+    return jsonify(refresher.status())
 
 
-def extract_url(text: str) -> str:
+@app.route('/llm', methods=['GET'])
+def llm_status():
     """
-    Extract a URL from the text.
+    Prompt tokens and time spent re-evaluating prompts, per session, and context tokens saved
+    by context assembly.
     """
-    match = re.search(r"(https?://\S+)", text)
-    if match:
-        return match.group(1).strip()
-    return None
-
+    return jsonify(dict(llm_pool.stats(), context=context_assembler.stats()))
 
-##################################
-# Document Download & Processing #
-##################################
 
-def download_documents_zip(api_token: str) -> bytes:
+@app.route('/latency', methods=['GET'])
+def latency():
     """
-    Download a zip file containing documents from the API using the provided API token.
+    Per-request critical-path latency: stage durations, deadline misses, LLM and total time.
     """
-    headers = {"Authorization": f"Bearer {api_token}"}
-    try:
-        logging.info("Requesting documents zip from API...")
-        response = requests.get(DOCUMENTS_DOWNLOAD_ENDPOINT, headers=headers)
-        response.raise_for_status()
-        logging.info("Successfully downloaded documents zip.")
-        return response.content
-    except Exception as e:
-        logging.error("Failed to download documents zip: %s", e)
-        raise
-
-
-def extract_documents(zip_bytes: bytes) -> dict:
-    """
-    Extract text documents from a zip file provided as bytes.
-    """
-    documents = {}
-    with zipfile.ZipFile(io.BytesIO(zip_bytes)) as z:
-        for file_info in z.infolist():
-            if file_info.filename.endswith(".txt"):
-                with z.open(file_info) as f:
-                    content = f.read().decode("utf-8")
-                    documents[file_info.filename] = content
-                    logging.info("Extracted document: %s", file_info.filename)
-    if not documents:
-        logging.warning("No text documents found in the zip file.")
-    return documents
-
-
-def build_vector_store(documents: dict) -> FAISS:
-    """
-    Build a FAISS vector store from a dictionary of documents.
-
-    The function formats each document by appending its source filename, splits the text
-    into chunks using a CharacterTextSplitter, generates embeddings for the text chunks using
-    a specified HuggingFace model, and finally builds a FAISS vector store with these embeddings.
-    """
-    all_texts = []
-    for filename, content in documents.items():
-        text_with_source = f"[{filename}]\n{content}"
-        all_texts.append(text_with_source)
-    text_splitter = CharacterTextSplitter(separator="\n", chunk_size=500, chunk_overlap=100)
-    texts = []
-    for text in all_texts:
-        texts.extend(text_splitter.split_text(text))
-    logging.info("Total text chunks generated: %d", len(texts))
-    embeddings = HuggingFaceEmbeddings(model_name=EMBEDDING_MODEL_NAME)
-    vector_store = FAISS.from_texts(texts, embeddings)
-    logging.info("Built FAISS vector store.")
-    return vector_store
-
-
-###############################
-# LLM Initialization (Ollama) #
-###############################
-
-try:
-    llm = Ollama(model=LLM_MODEL_NAME)
-    logging.info("Successfully initialized Ollama model: %s", LLM_MODEL_NAME)
-except Exception as e:
-    logging.error("Error initializing the LLM: %s", e)
-    raise
-
-
-##############################
-# API Information Aggregation
-##############################
-
-def fetch_api_info(query: str, conversation_history: str) -> str:
-    """
-    Dynamically extract entities from the query or conversation history and call all relevant API endpoints.
-    Returns a formatted string with retrieved API data or friendly messages if not found.
-    """
-    additional_info = ""
-
-    # If the query is a simple greeting, return nothing extra.
-    if query.strip().lower() in ["hello", "hi", "hey"]:
-        return additional_info
-
-    # Ping endpoint: (call once at startup; here we include it if mentioned)
-    if "ping" in query.lower():
-        try:
-            ping_info = get_ping()
-            additional_info += "\n[Ping Info]\n" + str(ping_info) + "\n"
-        except Exception as e:
-            logging.error("Error fetching ping info: %s", e)
-            additional_info += "\n[Note: Unable to verify API credentials at this time.]\n"
-
-    # Consultations (if query contains "consult")
-    if "consult" in query.lower():
-        person = extract_person_name(query, "consult")
-        if not person:
-            person = extract_person_name(conversation_history, "consult")
-        if person:
-            try:
-                consultations = get_consultations(person)
-                if consultations:
-                    additional_info += f"\n[Consultations for {person}]\n" + str(consultations) + "\n"
-                else:
-                    additional_info += f"\n[Note: No consultations found for {person}.]\n"
-            except Exception as e:
-                logging.error("Error fetching consultations for %s: %s", person, e)
-                additional_info += f"\n[Note: No consultations found for {person}.]\n"
-        else:
-            additional_info += "\n[Note: No consultant name found for consultation lookup.]\n"
-
-    # Team profile and insights (if query mentions "profile" or "team")
-    if "profile" in query.lower() or "team" in query.lower():
-        person = extract_person_name(query, "profile")
-        if not person:
-            person = extract_person_name(query, "team")
-        if not person:
-            person = extract_person_name(conversation_history, "profile")
-        if person:
-            try:
-                team_profile = get_team_profile(person)
-                if team_profile:
-                    additional_info += f"\n[Team Profile for {person}]\n" + str(team_profile) + "\n"
-                else:
-                    additional_info += f"\n[Note: No team profile found for {person}.]\n"
-            except Exception as e:
-                logging.error("Error fetching team profile for %s: %s", person, e)
-                additional_info += f"\n[Note: No team profile found for {person}.]\n"
-            try:
-                team_insights = get_team_insights(person)
-                if team_insights:
-                    additional_info += f"\n[Team Insights for {person}]\n" + str(team_insights) + "\n"
-                else:
-                    additional_info += f"\n[Note: No team insights found for {person}.]\n"
-            except Exception as e:
-                logging.error("Error fetching team insights for %s: %s", person, e)
-                additional_info += f"\n[Note: No team insights found for {person}.]\n"
-        else:
-            additional_info += "\n[Note: No person name found for team profile lookup.]\n"
-
-    # Investments and investment insights (if query mentions "investment", "invest", or "company")
-    if "investment" in query.lower() or "invest" in query.lower() or "company" in query.lower():
-        company = extract_company_name(query)
-        if not company:
-            company = extract_company_name(conversation_history)
-        if company:
-            try:
-                investments = get_investments(company)
-                if investments:
-                    additional_info += f"\n[Investments info for {company}]\n" + str(investments) + "\n"
-                else:
-                    additional_info += f"\n[Note: No investment info found for {company}.]\n"
-            except Exception as e:
-                logging.error("Error fetching investments for %s: %s", company, e)
-                additional_info += f"\n[Note: No investment info found for {company}.]\n"
-            try:
-                inv_insights = get_investments_insights(company)
-                if inv_insights:
-                    additional_info += f"\n[Investment Insights for {company}]\n" + str(inv_insights) + "\n"
-                else:
-                    additional_info += f"\n[Note: No investment insights found for {company}.]\n"
-            except Exception as e:
-                logging.error("Error fetching investment insights for %s: %s", company, e)
-                additional_info += f"\n[Note: No investment insights found for {company}.]\n"
-        else:
-            additional_info += "\n[Note: No company name found for investment lookup.]\n"
-
-    # Sector information (if query mentions "sector")
-    if "sector" in query.lower():
-        sector = extract_sector(query)
-        if not sector:
-            sector = extract_sector(conversation_history)
-        if sector:
-            try:
-                sectors_info = get_sectors(sector)
-                if sectors_info:
-                    additional_info += f"\n[Sectors info for {sector}]\n" + str(sectors_info) + "\n"
-                else:
-                    additional_info += f"\n[Note: No sector info found for {sector}.]\n"
-            except Exception as e:
-                logging.error("Error fetching sector info for %s: %s", sector, e)
-                additional_info += f"\n[Note: No sector info found for {sector}.]\n"
-        else:
-            additional_info += "\n[Note: No sector name found for lookup.]\n"
-
-    # Scrape endpoint (if a URL is present)
-    url = extract_url(query)
-    if not url:
-        url = extract_url(conversation_history)
-    if url:
-        try:
-            scrape_info = get_scrape(url)
-            if scrape_info:
-                additional_info += f"\n[Scraped Content from {url}]\n" + str(scrape_info) + "\n"
-            else:
-                additional_info += f"\n[Note: No scraped content found for {url}.]\n"
-        except Exception as e:
-            logging.error("Error scraping URL %s: %s", url, e)
-            additional_info += f"\n[Note: Unable to scrape content from {url}.]\n"
-
-    return additional_info
-
-
-##################################
-# Retrieval-Augmented Generation #
-##################################
-
-def generate_answer(query: str, conversation_history: str, vector_store: FAISS) -> str:
-    """
-    Generate an answer by combining document-based context, additional API info, and conversation history.
-    For simple greetings or introductory queries, return a generic introduction.
-    """
-    lower_query = query.strip().lower()
-    # Generic introduction for greetings.
-    if lower_query in ["hello", "hi", "hey"]:
-        return ("Hello! I'm your assistant here to help with information about PeakSpan MasterClasses, "
-                "team profiles, investments, sectors, and more. How can I assist you today?")
-
-    # Check for introductory queries like "what are you and what can you do"
-    if "what are you" in lower_query and "what can you do" in lower_query:
-        return ("I am an intelligent assistant designed to provide you with up-to-date information "
-                "about PeakSpan MasterClasses, team profiles, investments, sectors, and related insights. "
-                "I retrieve document-based context and external API data to help answer your questions accurately. "
-                "How may I assist you today?")
-
-    try:
-        retrieved_docs = vector_store.similarity_search(query, k=3)
-        context_text = "\n\n".join([doc.page_content for doc in retrieved_docs])
-    except Exception as e:
-        logging.error("Error during similarity search: %s", e)
-        context_text = ""
-
-    api_info = fetch_api_info(query, conversation_history)
-
-    prompt = (
-        "You are a knowledgeable assistant with access to PeakSpan MasterClass documents and external API data.\n\n"
-        "Relevant Document Context:\n"
-        f"{context_text}\n\n"
-        "Additional API Information:\n"
-        f"{api_info}\n\n"
-        "Conversation History:\n"
-        f"{conversation_history}\n\n"
-        f"User: {query}\n"
-        "Assistant:"
-    )
-
-    try:
-        response = llm.invoke(prompt)
-        return response
-    except Exception as e:
-        logging.error("Error invoking the LLM: %s", e)
-        return "Sorry, I encountered an error while generating the answer."
-
-
-##################################
-# Flask App Setup                #
-##################################
-
-app = Flask(__name__)
-
-# Global conversation history (for demo purposes)
-global_conversation_history = ""
-
-@app.route('/chat', methods=['POST'])
-def chat():
-    global global_conversation_history
-    data = request.get_json()
-    if not data or 'query' not in data:
-        return jsonify({'error': "Missing 'query' parameter"}), 400
-    user_query = data['query']
-
-    # If query is a greeting or introductory query, reset history for a fresh start.
-    lower_query = user_query.strip().lower()
-    if lower_query in ["hello", "hi", "hey"] or ("what are you" in lower_query and "what can you do" in lower_query):
-        global_conversation_history = ""
-        response_text = generate_answer(user_query, global_conversation_history, vector_store)
-        return jsonify({'response': response_text})
-
-    global_conversation_history += f"\nUser: {user_query}"
-    answer = generate_answer(user_query, global_conversation_history, vector_store)
-    global_conversation_history += f"\nAssistant: {answer}"
-    return jsonify({'response': answer})
+    return jsonify(latency_tracker.stats())
 
 ##################################
 # App Startup and Initialization #
 ##################################
 
-if __name__ == "__main__":
+def main(host: str = "0.0.0.0", port: int = 5000, use_ngrok: bool = True, debug: bool = True):
+    global registry, refresher
+
     # 1. Verify API credentials via the ping endpoint
     try:
         ping_info = get_ping()
@@ -469,31 +174,42 @@ if __name__ == "__main__":
         print("Error: Unable to verify API credentials. Please check your token.")
         exit(1)
 
+    # Pull the entity datasets once, then keep them in sync in the background
+    entity_store.start()
+
     # 2. Download and process documents
     try:
-        zip_bytes = download_documents_zip(API_TOKEN)
+        zip_bytes, etag = download_documents_zip_with_etag(API_TOKEN)
         docs = extract_documents(zip_bytes)
         if not docs:
             print("No documents found. Exiting.")
             exit(1)
-        vector_store = build_vector_store(docs)
+        # The startup corpus stays in memory; other corpora load from disk on first use
+        registry = IndexRegistry(load_embeddings())
+        registry.put(DEFAULT_CORPUS, build_vector_store(docs), pinned=True)
+        refresher = CorpusRefresher(registry, docs, etag=etag)
+        refresher.start()
     except Exception as e:
         print("Error during document preparation:", e)
         exit(1)
 
     print("Documents are loaded and indexed. The Flask app is starting...")
 
-    # Ngrok integration for Colab (to expose the local Flask server to the internet -- remove if running locally)
-    from pyngrok import ngrok
+    if use_ngrok:
+        # Ngrok integration for Colab (to expose the local Flask server to the internet -- remove if running locally)
+        from pyngrok import ngrok
+
+        # Set your ngrok authtoken (replace "YOUR_NGROK_AUTH_TOKEN" with your actual token)
+        # TODO: Remove this line if you are running the code in a local environment
+        ngrok.set_auth_token("YOUR_NGROK_AUTH_TOKEN")  # PLACE THE TOKEN HERE
+        public_url = ngrok.connect(port)
+        print("Public URL:", public_url)
 
-    # Set your ngrok authtoken (replace "YOUR_NGROK_AUTH_TOKEN" with your actual token)
-    # TODO: Remove this line if you are running the code in a local environment
-    ngrok.set_auth_token("YOUR_NGROK_AUTH_TOKEN")  # PLACE THE TOKEN HERE
-    public_url = ngrok.connect(5000)
-    print("Public URL:", public_url)
+    app.run(host=host, port=port, debug=debug)
 
-    app.run(host="0.0.0.0", port=5000, debug=True)
+
+if __name__ == "__main__":
+    main()
 
 # NOTE: This approach uses NGROK to expose the local Flask server to the internet. If you are simply
-# running this code in a local environment, you can remove the NGROK integration and run the Flask app
-# using the app.run() method without any arguments.
+# running this code in a local environment, run `python rag_cli.py serve` instead (no NGROK unless --ngrok).
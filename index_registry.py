@@ -0,0 +1,306 @@
+"""
+Multi-Corpus Index Registry for the RAG System for Portfolio Support
+
+One deployment serves separate document collections (corpora), e.g. one per portfolio team.
+Each corpus is a FAISS index saved on disk under INDEX_ROOT/<corpus_id> (FAISS.save_local format).
+IndexRegistry maps corpus IDs to those indexes and:
+  1. Loads an index lazily, the first time a query is routed to its corpus.
+  2. Keeps loaded indexes under a memory budget, evicting the least recently used ones first.
+     Pinned corpora (e.g. the one built from the documents zip at startup) are never evicted.
+  3. Swaps a corpus to a newly built index atomically (`put`), bumping its generation number.
+     Requests that already hold the old retriever finish on the old index.
+  4. Reports per-corpus memory, load-time and generation metrics (see `metrics()`).
+
+Every loaded corpus is wrapped in a query_encoding.QueryBatcher, so `get(corpus_id)` returns an
+object with the usual `similarity_search(query, k, filter)` method. Its metadata index (for
+filtered search, see metadata_index.py) is built when the corpus is installed, off the request
+path. All corpora share one embeddings model.
+
+Build an on-disk corpus from a directory of .txt, .csv and .jsonl files, a single .csv or .jsonl
+file, or a documents zip with:
+    python index_registry.py <corpus_id> <path>
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from query_encoding import QueryBatcher
+
+INDEX_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "indexes")
+INDEX_MEMORY_BUDGET_BYTES = 1024 * 1024 * 1024
+DEFAULT_CORPUS = "masterclass"
+
+CORPUS_ID_PATTERN = re.compile(r"^[A-Za-z0-9_-]+$")
+
+
+class UnknownCorpusError(KeyError):
+    pass
+
+
+def estimate_index_bytes(vector_store) -> int:
+    """
+    Estimate the resident size of a FAISS vector store: the float32 vectors plus the chunk text
+    and metadata kept in the docstore.
+    """
+    index = vector_store.index
+    total = index.ntotal * index.d * 4
+    for doc in getattr(vector_store.docstore, "_dict", {}).values():
+        total += len(doc.page_content.encode("utf-8"))
+        total += sum(len(str(key)) + len(str(value)) for key, value in doc.metadata.items())
+    return total
+
+
+class IndexRegistry:
+    """
+    Map corpus IDs to FAISS indexes, loading them on first use and evicting them (LRU) when the
+    loaded indexes exceed the memory budget.
+    """
+
+    def __init__(self, embeddings, root_dir: str = INDEX_ROOT,
+                 memory_budget_bytes: int = INDEX_MEMORY_BUDGET_BYTES):
+        self.embeddings = embeddings
+        self.root_dir = root_dir
+        self.memory_budget_bytes = memory_budget_bytes
+        self._loaded = OrderedDict()  # corpus_id -> entry, least recently used first
+        self._pinned = set()
+        self._metrics = {}
+        self._lock = threading.Lock()
+        self._load_locks = {}  # corpus_id -> lock, only while a load is in flight
+
+    def _path(self, corpus_id: str) -> str:
+        if not isinstance(corpus_id, str) or not CORPUS_ID_PATTERN.match(corpus_id):
+            raise UnknownCorpusError(corpus_id)
+        return os.path.join(self.root_dir, corpus_id)
+
+    def _corpus_metrics(self, corpus_id: str) -> dict:
+        return self._metrics.setdefault(corpus_id, {
+            "loaded": False,
+            "pinned": False,
+            "bytes": 0,
+            "chunks": 0,
+            "loads": 0,
+            "evictions": 0,
+            "last_load_seconds": None,
+            "generation": 0,
+            "last_build_seconds": None,
+            "queries": 0,
+            "last_used": None,
+        })
+
+    def corpus_ids(self) -> list:
+        """
+        All known corpora: loaded ones plus every index directory under root_dir.
+        """
+        on_disk = []
+        if os.path.isdir(self.root_dir):
+            on_disk = [name for name in os.listdir(self.root_dir)
+                       if CORPUS_ID_PATTERN.match(name) and os.path.isdir(os.path.join(self.root_dir, name))]
+        with self._lock:
+            return sorted(set(on_disk) | set(self._loaded))
+
+    def put(self, corpus_id: str, vector_store, pinned: bool = False, build_seconds: float = None):
+        """
+        Register an already built vector store, atomically replacing any index the corpus had.
+        Pinned corpora are never evicted.
+        """
+        self._path(corpus_id)
+        entry = self._entry(vector_store)
+        with self._lock:
+            self._install(corpus_id, entry, vector_store, load_seconds=None)
+            metrics = self._metrics[corpus_id]
+            metrics["generation"] += 1
+            if build_seconds is not None:
+                metrics["last_build_seconds"] = build_seconds
+            if pinned:
+                self._pinned.add(corpus_id)
+                metrics["pinned"] = True
+            self._evict()
+
+    def is_pinned(self, corpus_id: str) -> bool:
+        with self._lock:
+            return corpus_id in self._pinned
+
+    def current(self, corpus_id: str):
+        """
+        The vector store currently serving a corpus, or None if it is not loaded.
+        """
+        with self._lock:
+            entry = self._loaded.get(corpus_id)
+            return entry["retriever"].vector_store if entry is not None else None
+
+    def save(self, corpus_id: str, vector_store):
+        """
+        Write a vector store to disk so it can be loaded lazily later.
+        """
+        vector_store.save_local(self._path(corpus_id))
+        logging.info("Saved corpus %s to %s", corpus_id, self._path(corpus_id))
+
+    def get(self, corpus_id: str) -> QueryBatcher:
+        """
+        Return the retriever for a corpus, loading its index from disk on first use.
+        Raises UnknownCorpusError if the corpus has no index.
+        """
+        path = self._path(corpus_id)
+        with self._lock:
+            entry = self._touch(corpus_id)
+            if entry is not None:
+                return entry["retriever"]
+        # Unknown corpus IDs never get a load lock, so arbitrary IDs cannot grow the registry.
+        if not os.path.isdir(path):
+            raise UnknownCorpusError(corpus_id)
+        with self._lock:
+            load_lock = self._load_locks.setdefault(corpus_id, threading.Lock())
+
+        try:
+            return self._load(corpus_id, path, load_lock)
+        finally:
+            with self._lock:
+                # Later requests find the corpus loaded, or retry the load with a new lock.
+                if self._load_locks.get(corpus_id) is load_lock:
+                    del self._load_locks[corpus_id]
+
+    def _load(self, corpus_id: str, path: str, load_lock) -> QueryBatcher:
+        # Load outside the registry lock so other corpora stay available meanwhile.
+        with load_lock:
+            with self._lock:
+                entry = self._touch(corpus_id)
+                if entry is not None:
+                    return entry["retriever"]
+            if not os.path.isdir(path):
+                raise UnknownCorpusError(corpus_id)
+            from langchain.vectorstores import FAISS
+
+            start = time.perf_counter()
+            # The index files are written by this application (see save()), so they are trusted.
+            vector_store = FAISS.load_local(path, self.embeddings, allow_dangerous_deserialization=True)
+            load_seconds = time.perf_counter() - start
+            logging.info("Loaded corpus %s in %.2fs", corpus_id, load_seconds)
+
+            entry = self._entry(vector_store)
+            with self._lock:
+                self._install(corpus_id, entry, vector_store, load_seconds)
+                metrics = self._metrics[corpus_id]
+                metrics["generation"] = max(metrics["generation"], 1)
+                self._touch(corpus_id)
+                self._evict(keep=corpus_id)
+                return entry["retriever"]
+
+    @staticmethod
+    def _entry(vector_store) -> dict:
+        from metadata_index import MetadataIndex
+        from query_encoding import QueryBatcher
+
+        # Built outside the registry lock: estimating the size and indexing metadata walk the whole docstore.
+        return {
+            "retriever": QueryBatcher(vector_store, metadata_index=MetadataIndex(vector_store)),
+            "bytes": estimate_index_bytes(vector_store),
+        }
+
+    def _install(self, corpus_id: str, entry: dict, vector_store, load_seconds):
+        previous = self._loaded.pop(corpus_id, None)
+        if previous is not None:
+            previous["retriever"].close()
+        self._loaded[corpus_id] = entry
+        metrics = self._corpus_metrics(corpus_id)
+        metrics.update({
+            "loaded": True,
+            "bytes": entry["bytes"],
+            "chunks": vector_store.index.ntotal,
+        })
+        if load_seconds is not None:
+            metrics["loads"] += 1
+            metrics["last_load_seconds"] = load_seconds
+
+    def _touch(self, corpus_id: str):
+        entry = self._loaded.get(corpus_id)
+        if entry is not None:
+            self._loaded.move_to_end(corpus_id)
+            metrics = self._metrics[corpus_id]
+            metrics["queries"] += 1
+            metrics["last_used"] = time.time()
+        return entry
+
+    def _evict(self, keep: str = None):
+        """
+        Evict least recently used, unpinned corpora until the loaded ones fit the memory budget.
+        """
+        total = sum(entry["bytes"] for entry in self._loaded.values())
+        for corpus_id in list(self._loaded):
+            if total <= self.memory_budget_bytes:
+                break
+            if corpus_id in self._pinned or corpus_id == keep:
+                continue
+            entry = self._loaded.pop(corpus_id)
+            entry["retriever"].close()
+            total -= entry["bytes"]
+            metrics = self._metrics[corpus_id]
+            metrics["loaded"] = False
+            metrics["evictions"] += 1
+            logging.info("Evicted corpus %s (%d bytes)", corpus_id, entry["bytes"])
+
+    def metrics(self) -> dict:
+        """
+        Per-corpus memory and load-time metrics, plus the registry totals.
+        """
+        corpus_ids = self.corpus_ids()
+        with self._lock:
+            corpora = {}
+            for corpus_id in corpus_ids:
+                corpora[corpus_id] = dict(self._corpus_metrics(corpus_id))
+            return {
+                "memory_budget_bytes": self.memory_budget_bytes,
+                "loaded_bytes": sum(entry["bytes"] for entry in self._loaded.values()),
+                "corpora": corpora,
+            }
+
+
+def build_corpus(corpus_id: str, source: str) -> int:
+    """
+    Build and save the index of a corpus from a directory (.txt files and CSV / JSONL tables), a
+    single .csv / .jsonl file or a documents zip. Returns the number of vectors saved.
+    """
+    from rag_langchain_ai_system import build_vector_store, extract_documents, load_embeddings
+    from structured_ingest import TABULAR_EXTENSIONS, ingest_file
+
+    docs, tables = {}, []
+    if os.path.isdir(source):
+        for filename in sorted(os.listdir(source)):
+            if filename.endswith(".txt"):
+                with open(os.path.join(source, filename), encoding="utf-8") as f:
+                    docs[filename] = f.read()
+            elif filename.lower().endswith(TABULAR_EXTENSIONS):
+                tables.append(os.path.join(source, filename))
+    elif source.lower().endswith(TABULAR_EXTENSIONS):
+        tables.append(source)
+    else:
+        with open(source, "rb") as f:
+            docs = extract_documents(f.read())
+    # Tables are streamed from disk and embedded in batches rather than read into memory whole
+    vector_store = build_vector_store(docs) if docs else None
+    for path in tables:
+        vector_store = ingest_file(path, load_embeddings(), vector_store)
+    if vector_store is None:
+        raise ValueError(f"No documents found in {source}.")
+    IndexRegistry(load_embeddings()).save(corpus_id, vector_store)
+    return vector_store.index.ntotal
+
+
+if __name__ == "__main__":
+    import sys
+
+    if len(sys.argv) != 3:
+        print("Usage: python index_registry.py <corpus_id> <directory, .csv/.jsonl file or documents zip>")
+        sys.exit(1)
+    try:
+        build_corpus(sys.argv[1], sys.argv[2])
+    except ValueError as e:
+        print(e)
+        sys.exit(1)
@@ -0,0 +1,141 @@
+"""
+Session-Pinned LLM Instances for the RAG System for Portfolio Support
+
+Ollama keeps the evaluated prompt of a loaded model cached and only evaluates the tokens after
+the longest prefix it has seen before. generate_answer() lays the prompt out so each turn of a
+session extends the previous one (stable preamble and append-only history first, volatile
+retrieved context last). This module makes sure that cache is there to hit:
+  1. Each session is pinned to one Ollama instance (stable hash over OLLAMA_BASE_URLS), so all of
+     its turns land on the same warm KV cache.
+  2. Requests carry `keep_alive`, so the model (and its cache) stays loaded between turns.
+  3. Ollama's `prompt_eval_count` / `prompt_eval_duration` are recorded per session, so the time
+     spent re-evaluating prompts can be tracked (see `stats()`). Only the MAX_STATS_SESSIONS most
+     recently active sessions are listed; the totals cover every session.
+  4. `warm_up(session_id)` asks the session's instance to load the model (an empty /api/generate
+     request), so a cold model loads while retrieval and API lookups are still running. Instances
+     used or warmed up within WARM_UP_SKIP_SECONDS are assumed warm and not pinged, and an
+     instance being warmed up is not pinged again; a failed warm-up does not count.
+
+The Ollama clients are created on first use, so importing this module does not load LangChain.
+"""
+
+import logging
+import threading
+import time
+import zlib
+from collections import OrderedDict
+
+import requests
+
+WARM_UP_SKIP_SECONDS = 60
+WARM_UP_TIMEOUT_SECONDS = 120
+MAX_STATS_SESSIONS = 256
+
+
+class SessionLLMPool:
+    """
+    One Ollama client per instance URL; sessions are pinned to an instance by a stable hash.
+    """
+
+    def __init__(self, model: str, base_urls: list, keep_alive=None, max_stats_sessions: int = MAX_STATS_SESSIONS):
+        self.model = model
+        self.base_urls = list(base_urls)
+        self.keep_alive = keep_alive
+        self.max_stats_sessions = max_stats_sessions
+        self._clients = None
+        self._last_used = {}
+        self._warming = set()
+        self._stats = OrderedDict()
+        self._totals = {"prompt_eval_tokens": 0, "prompt_eval_seconds": 0.0}
+        self._lock = threading.Lock()
+
+    @property
+    def clients(self) -> list:
+        if self._clients is None:
+            from langchain_community.llms import Ollama
+
+            with self._lock:
+                if self._clients is None:
+                    self._clients = [Ollama(model=self.model, base_url=url, keep_alive=self.keep_alive)
+                                     for url in self.base_urls]
+                    logging.info("Initialized Ollama model %s on %d instance(s)", self.model, len(self.base_urls))
+        return self._clients
+
+    def for_session(self, session_id: str):
+        return self.clients[zlib.crc32(session_id.encode("utf-8")) % len(self.clients)]
+
+    def warm_up(self, session_id: str) -> bool:
+        """
+        Load the model on the session's instance unless it was used recently or is being warmed up.
+        Returns True if a warm-up request was sent.
+        """
+        base_url = self.for_session(session_id).base_url
+        with self._lock:
+            last_used = self._last_used.get(base_url)
+            if base_url in self._warming or (last_used is not None
+                                             and time.monotonic() - last_used < WARM_UP_SKIP_SECONDS):
+                return False
+            self._warming.add(base_url)
+        payload = {"model": self.model}
+        if self.keep_alive is not None:
+            payload["keep_alive"] = self.keep_alive
+        try:
+            requests.post(f"{base_url}/api/generate", json=payload,
+                          timeout=WARM_UP_TIMEOUT_SECONDS).raise_for_status()
+            with self._lock:
+                self._last_used[base_url] = time.monotonic()
+        finally:
+            with self._lock:
+                self._warming.discard(base_url)
+        return True
+
+    def _record(self, session_id: str, result) -> str:
+        generation = result.generations[0][0]
+        info = generation.generation_info or {}
+        base_url = self.for_session(session_id).base_url
+        with self._lock:
+            self._last_used[base_url] = time.monotonic()
+        prompt_tokens = info.get("prompt_eval_count") or 0
+        prompt_seconds = (info.get("prompt_eval_duration") or 0) / 1e9
+        total_seconds = (info.get("total_duration") or 0) / 1e9
+        with self._lock:
+            stats = self._stats.setdefault(session_id, {
+                "turns": 0,
+                "prompt_eval_tokens": 0,
+                "prompt_eval_seconds": 0.0,
+                "total_seconds": 0.0,
+            })
+            self._stats.move_to_end(session_id)
+            while len(self._stats) > self.max_stats_sessions:
+                self._stats.popitem(last=False)
+            self._totals["prompt_eval_tokens"] += prompt_tokens
+            self._totals["prompt_eval_seconds"] += prompt_seconds
+            stats["turns"] += 1
+            stats["prompt_eval_tokens"] += prompt_tokens
+            stats["prompt_eval_seconds"] += prompt_seconds
+            stats["total_seconds"] += total_seconds
+        logging.info("LLM turn for session %s: %d prompt tokens evaluated in %.2fs (%.2fs total)",
+                     session_id, prompt_tokens, prompt_seconds, total_seconds)
+        return generation.text
+
+    def invoke(self, prompt: str, session_id: str) -> str:
+        result = self.for_session(session_id).generate([prompt])
+        return self._record(session_id, result)
+
+    async def ainvoke(self, prompt: str, session_id: str) -> str:
+        result = await self.for_session(session_id).agenerate([prompt])
+        return self._record(session_id, result)
+
+    def stats(self) -> dict:
+        """
+        Prompt re-evaluation per recently active session, and totals over all sessions.
+        """
+        with self._lock:
+            sessions = {session_id: dict(stats) for session_id, stats in self._stats.items()}
+            totals = dict(self._totals)
+        return {
+            "instances": self.base_urls,
+            "prompt_eval_tokens": totals["prompt_eval_tokens"],
+            "prompt_eval_seconds": totals["prompt_eval_seconds"],
+            "sessions": sessions,
+        }
@@ -0,0 +1,90 @@
+"""
+Metadata-Filtered Retrieval for the RAG System for Portfolio Support
+
+Every query used to search every chunk. LangChain's own `similarity_search(filter=...)` does not
+help much: it still scans the whole index, then drops the hits that fail the filter, so a narrow
+filter can come back empty. Filtered search here works the other way round:
+  1. MetadataIndex is an inverted index from (field, value) to FAISS row ids, built once per loaded
+     index (the index registry builds it when a corpus is installed). Every scalar metadata field
+     is indexed (source, doc_type, speaker, CSV/JSONL fields such as genre or author), except
+     per-chunk positions and long values.
+  2. A filter such as {"doc_type": "csv", "genre": ["Business", "Fantasy"]} is resolved to a
+     candidate id set by intersecting the postings of each field (a list of values means any of
+     them). String values match case-insensitively.
+  3. Only the candidates are scanned: FAISS searches with an IDSelectorBatch, so the top k always
+     come from the filtered set.
+"""
+
+import threading
+
+import faiss
+import numpy as np
+
+# Per-chunk positions: high cardinality and never useful as filters
+UNINDEXED_FIELDS = {"start", "end", "chunk", "tokens", "row", "position"}
+MAX_INDEXED_VALUE_CHARS = 200
+
+
+def value_key(value):
+    if isinstance(value, str):
+        return value.strip().casefold()
+    return value
+
+
+class MetadataIndex:
+    """
+    Inverted index of chunk metadata: field -> value -> FAISS row ids.
+    """
+
+    def __init__(self, vector_store):
+        self.postings = {}
+        self._lock = threading.Lock()
+        for position, docstore_id in vector_store.index_to_docstore_id.items():
+            self.add(position, vector_store.docstore.search(docstore_id).metadata)
+
+    def add(self, position: int, metadata: dict):
+        with self._lock:
+            for field, value in metadata.items():
+                if field in UNINDEXED_FIELDS:
+                    continue
+                for item in value if isinstance(value, list) else [value]:
+                    if isinstance(item, (str, int, float, bool)) and len(str(item)) <= MAX_INDEXED_VALUE_CHARS:
+                        self.postings.setdefault(field, {}).setdefault(value_key(item), set()).add(position)
+
+    def fields(self) -> dict:
+        """
+        Indexed fields and their number of distinct values.
+        """
+        return {field: len(values) for field, values in self.postings.items()}
+
+    def candidates(self, search_filter: dict) -> set:
+        """
+        Row ids matching every field of the filter (any of the values, for a list).
+        """
+        result = None
+        for field, wanted in search_filter.items():
+            values = self.postings.get(field, {})
+            matching = set()
+            for item in wanted if isinstance(wanted, (list, tuple, set)) else [wanted]:
+                matching |= values.get(value_key(item), set())
+            result = matching if result is None else result & matching
+            if not result:
+                return set()
+        return result if result is not None else set()
+
+
+def filtered_search_positions(vector_store, metadata_index: MetadataIndex, vector, k: int,
+                              search_filter: dict) -> list:
+    """
+    FAISS row ids of the k chunks nearest to `vector` among those matching the filter, best match first.
+    """
+    candidates = metadata_index.candidates(search_filter)
+    if not candidates:
+        return []
+    query = np.array([vector], dtype=np.float32)
+    if getattr(vector_store, "_normalize_L2", False):
+        faiss.normalize_L2(query)
+    ids = np.array(sorted(candidates), dtype=np.int64)
+    selector = faiss.IDSelectorBatch(len(ids), faiss.swig_ptr(ids))
+    _, indices = vector_store.index.search(query, min(k, len(ids)), params=faiss.SearchParameters(sel=selector))
+    return [int(i) for i in indices[0] if i != -1]
@@ -0,0 +1,137 @@
+"""
+ONNX Runtime Embedding Backend for the RAG System for Portfolio Support
+
+`HuggingFaceEmbeddings` runs all-MiniLM-L6-v2 through sentence-transformers and PyTorch, so every
+index build and every query embedding goes through the full torch stack on CPU, and loading the
+model imports torch at startup. OnnxEmbeddings runs the same model exported to ONNX instead:
+  1. Inference runs on onnxruntime, optionally with the int8 dynamically quantized export.
+  2. Text is tokenized with the `tokenizers` library from the model's own tokenizer.json, truncated
+     at the model's 256 word pieces like sentence-transformers does.
+  3. Token embeddings are mean pooled over the attention mask and L2 normalized, the same pipeline
+     as the sentence-transformers model, so the vectors stay compatible with the PyTorch backend.
+
+Select it with `EMBEDDING_BACKEND = "onnx"` in rag_langchain_ai_system.py, after exporting once:
+    python onnx_embeddings.py export            # writes models/all-MiniLM-L6-v2-onnx
+Export needs torch, transformers and onnxruntime; serving only needs onnxruntime, tokenizers and numpy.
+Chunkers for these embeddings count tokens with the same exported tokenizer.json (`tokenizer_file`,
+see chunking.embeddings_tokenizer), so building or refreshing an index does not import transformers
+either.
+
+`python benchmarks.py embeddings` compares both backends: build throughput, per-query latency, RSS,
+import time, and recall against the PyTorch backend.
+"""
+
+import argparse
+import logging
+import os
+
+from langchain.embeddings.base import Embeddings
+
+MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+ONNX_MODEL_DIR = os.path.join("models", "all-MiniLM-L6-v2-onnx")
+MODEL_FILE = "model.onnx"
+QUANTIZED_MODEL_FILE = "model-int8.onnx"
+TOKENIZER_FILE = "tokenizer.json"
+MAX_SEQUENCE_TOKENS = 256
+EMBED_BATCH_SIZE = 32
+
+
+class OnnxEmbeddings(Embeddings):
+    """
+    Sentence embeddings from an ONNX export of all-MiniLM-L6-v2 (see export_onnx_model).
+    """
+
+    def __init__(self, model_dir: str = ONNX_MODEL_DIR, quantized: bool = True,
+                 batch_size: int = EMBED_BATCH_SIZE, intra_op_threads: int = 0):
+        import onnxruntime
+        from tokenizers import Tokenizer
+
+        model_file = QUANTIZED_MODEL_FILE if quantized else MODEL_FILE
+        model_path = os.path.join(model_dir, model_file)
+        if not os.path.exists(model_path):
+            raise FileNotFoundError(f"{model_path} not found; run `python onnx_embeddings.py export` first")
+
+        self.tokenizer_file = os.path.join(model_dir, TOKENIZER_FILE)
+        self.tokenizer = Tokenizer.from_file(self.tokenizer_file)
+        self.tokenizer.enable_truncation(max_length=MAX_SEQUENCE_TOKENS)
+        self.tokenizer.enable_padding()
+
+        options = onnxruntime.SessionOptions()
+        options.intra_op_num_threads = intra_op_threads
+        self.session = onnxruntime.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+        self.input_names = {model_input.name for model_input in self.session.get_inputs()}
+        self.batch_size = batch_size
+        logging.info("Loaded ONNX embedding model %s", model_path)
+
+    def _embed_batch(self, texts: list):
+        import numpy as np
+
+        encodings = self.tokenizer.encode_batch(texts)
+        input_ids = np.array([encoding.ids for encoding in encodings], dtype=np.int64)
+        attention_mask = np.array([encoding.attention_mask for encoding in encodings], dtype=np.int64)
+        inputs = {"input_ids": input_ids, "attention_mask": attention_mask}
+        if "token_type_ids" in self.input_names:
+            inputs["token_type_ids"] = np.array([encoding.type_ids for encoding in encodings], dtype=np.int64)
+
+        token_embeddings = self.session.run(None, inputs)[0]
+        mask = attention_mask[:, :, None].astype(np.float32)
+        pooled = (token_embeddings * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        norms = np.linalg.norm(pooled, axis=1, keepdims=True)
+        return pooled / np.clip(norms, 1e-12, None)
+
+    def embed_documents(self, texts: list) -> list:
+        vectors = []
+        for start in range(0, len(texts), self.batch_size):
+            vectors.extend(self._embed_batch(texts[start:start + self.batch_size]).tolist())
+        return vectors
+
+    def embed_query(self, text: str) -> list:
+        return self._embed_batch([text])[0].tolist()
+
+
+def export_onnx_model(output_dir: str = ONNX_MODEL_DIR, model_name: str = MODEL_NAME, quantize: bool = True):
+    """
+    Export the transformer to ONNX (dynamic batch and sequence axes), save its tokenizer.json next
+    to it and, if asked, write an int8 dynamically quantized copy.
+    """
+    import torch
+    from transformers import AutoModel, AutoTokenizer
+
+    os.makedirs(output_dir, exist_ok=True)
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    tokenizer.save_pretrained(output_dir)
+    model = AutoModel.from_pretrained(model_name)
+    model.eval()
+
+    sample = tokenizer(["An example sentence to trace the model."], return_tensors="pt")
+    names = ["input_ids", "attention_mask", "token_type_ids"]
+    model_path = os.path.join(output_dir, MODEL_FILE)
+    with torch.no_grad():
+        torch.onnx.export(
+            model,
+            tuple(sample[name] for name in names),
+            model_path,
+            input_names=names,
+            output_names=["last_hidden_state"],
+            dynamic_axes={name: {0: "batch", 1: "sequence"} for name in names + ["last_hidden_state"]},
+            opset_version=14,
+        )
+    logging.info("Exported %s to %s", model_name, model_path)
+
+    if quantize:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+
+        quantized_path = os.path.join(output_dir, QUANTIZED_MODEL_FILE)
+        quantize_dynamic(model_path, quantized_path, weight_type=QuantType.QInt8)
+        logging.info("Wrote int8 quantized model to %s", quantized_path)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Export all-MiniLM-L6-v2 for the ONNX embedding backend.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    export = subparsers.add_parser("export", help="Export (and quantize) the embedding model to ONNX.")
+    export.add_argument("--output", default=ONNX_MODEL_DIR, help=f"Output directory (default: {ONNX_MODEL_DIR}).")
+    export.add_argument("--no-quantize", action="store_true", help="Skip the int8 quantized copy.")
+    arguments = parser.parse_args()
+    export_onnx_model(arguments.output, quantize=not arguments.no_quantize)
@@ -0,0 +1,289 @@
+"""
+Query Encoding for the RAG System for Portfolio Support
+
+Every `vector_store.similarity_search(query, k=3)` call re-encodes the query with the embedding
+model, even when the same question was asked a moment ago, and concurrent requests are encoded
+one at a time. This module provides:
+  1. CachedQueryEmbeddings: an embeddings wrapper with an LRU cache from normalized query text to
+     its embedding. all-MiniLM-L6-v2 uses an uncased tokenizer, so lower-casing and collapsing
+     whitespace does not change the vector.
+  2. QueryBatcher: a small batching queue. Queries that arrive within a few milliseconds of each
+     other are encoded in one forward pass (cache misses only) and searched with one batched FAISS
+     call. It exposes the same `similarity_search(query, k, filter)` method as the vector store,
+     so it can be passed wherever the pipeline expects one. Filtered queries skip the batch and
+     search the candidates of a metadata_index.MetadataIndex.
+  3. batch_search_positions / batch_similarity_search: one FAISS search for a matrix of query
+     vectors, returning FAISS row ids or Documents.
+  4. QueryBatcher.search_positions_batch: a whole offline batch (see batch_answering.py) encoded in
+     one pass and searched with one FAISS call, without waiting on the batching window.
+
+Both classes keep counters (see `stats()`) so the CPU time saved per query can be reported.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+import faiss
+import numpy as np
+from langchain.embeddings.base import Embeddings
+
+from metadata_index import MetadataIndex, filtered_search_positions
+
+QUERY_CACHE_SIZE = 4096
+BATCH_WINDOW_MS = 5
+MAX_BATCH_SIZE = 32
+
+
+def normalize_query(text: str) -> str:
+    """
+    Normalize query text for use as a cache key (case and whitespace insensitive).
+    """
+    return " ".join(text.lower().split())
+
+
+class CachedQueryEmbeddings(Embeddings):
+    """
+    Wrap an Embeddings object with an LRU cache for query embeddings.
+    Document embeddings are passed through untouched.
+    """
+
+    def __init__(self, embeddings: Embeddings, maxsize: int = QUERY_CACHE_SIZE):
+        self.embeddings = embeddings
+        self.maxsize = maxsize
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.encoded = 0
+        self.encode_batches = 0
+        self.encode_cpu_seconds = 0.0
+
+    @property
+    def tokenizer_file(self):
+        # The wrapped model's tokenizer.json, if it has one (see chunking.embeddings_tokenizer)
+        return getattr(self.embeddings, "tokenizer_file", None)
+
+    def embed_documents(self, texts: list) -> list:
+        return self.embeddings.embed_documents(texts)
+
+    def embed_query(self, text: str) -> list:
+        return self.embed_queries([text])[0]
+
+    def embed_queries(self, texts: list) -> list:
+        """
+        Embed several queries at once. Cached queries are served from memory; the rest are
+        encoded together in a single forward pass.
+        """
+        keys = [normalize_query(text) for text in texts]
+        vectors = {}
+        with self._lock:
+            for key in keys:
+                if key in self._cache:
+                    self._cache.move_to_end(key)
+                    vectors[key] = self._cache[key]
+                    self.hits += 1
+                elif key not in vectors:
+                    vectors[key] = None
+                    self.misses += 1
+                else:
+                    # Repeated within the same batch: encoded once below.
+                    self.hits += 1
+
+        missing = [key for key, vector in vectors.items() if vector is None]
+        if missing:
+            start = time.process_time()
+            encoded = self.embeddings.embed_documents(missing)
+            elapsed = time.process_time() - start
+            with self._lock:
+                self.encoded += len(missing)
+                self.encode_batches += 1
+                self.encode_cpu_seconds += elapsed
+                for key, vector in zip(missing, encoded):
+                    vectors[key] = vector
+                    self._cache[key] = vector
+                    self._cache.move_to_end(key)
+                while len(self._cache) > self.maxsize:
+                    self._cache.popitem(last=False)
+
+        return [vectors[key] for key in keys]
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            cpu_per_encode = self.encode_cpu_seconds / self.encoded if self.encoded else 0.0
+            return {
+                "cached_queries": len(self._cache),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "encoded": self.encoded,
+                "encode_batches": self.encode_batches,
+                "encode_cpu_seconds": self.encode_cpu_seconds,
+                "cpu_seconds_per_encoded_query": cpu_per_encode,
+                "cpu_seconds_per_query": self.encode_cpu_seconds / lookups if lookups else 0.0,
+            }
+
+
+def batch_search_positions(vector_store, vectors: list, k: int) -> list:
+    """
+    Search a LangChain FAISS vector store with several query vectors in one FAISS call.
+    Returns one list of FAISS row ids per query vector, best match first.
+    """
+    matrix = np.array(vectors, dtype=np.float32)
+    if getattr(vector_store, "_normalize_L2", False):
+        faiss.normalize_L2(matrix)
+    _, indices = vector_store.index.search(matrix, k)
+    return [[int(i) for i in row if i != -1] for row in indices]
+
+
+def documents_at(vector_store, positions: list) -> list:
+    return [vector_store.docstore.search(vector_store.index_to_docstore_id[i]) for i in positions]
+
+
+def batch_similarity_search(vector_store, vectors: list, k: int) -> list:
+    """
+    Search a LangChain FAISS vector store with several query vectors in one FAISS call.
+    Returns one list of Documents per query vector, best match first.
+    """
+    return [documents_at(vector_store, row) for row in batch_search_positions(vector_store, vectors, k)]
+
+
+class QueryBatcher:
+    """
+    Collect queries arriving within `window_ms` of each other, encode them in one forward pass
+    and run one batched FAISS search. Callers block in `similarity_search` until their batch is
+    done, so this is a drop-in for `vector_store.similarity_search` in threaded servers.
+    """
+
+    def __init__(self, vector_store, window_ms: float = BATCH_WINDOW_MS, max_batch_size: int = MAX_BATCH_SIZE,
+                 metadata_index: MetadataIndex = None):
+        self.vector_store = vector_store
+        self.metadata_index = metadata_index
+        self._metadata_lock = threading.Lock()
+        embeddings = vector_store.embedding_function
+        if not isinstance(embeddings, CachedQueryEmbeddings):
+            embeddings = CachedQueryEmbeddings(embeddings)
+        self.embeddings = embeddings
+        self.window = window_ms / 1000
+        self.max_batch_size = max_batch_size
+        self._pending = []
+        self._condition = threading.Condition()
+        self._worker = None
+        self._closed = False
+        self.batches = 0
+        self.queries = 0
+        self.search_cpu_seconds = 0.0
+
+    def metadata(self) -> MetadataIndex:
+        """
+        The metadata index of the vector store, built once by the first filtered query (concurrent
+        filtered queries wait for it instead of each building their own).
+        """
+        with self._metadata_lock:
+            if self.metadata_index is None:
+                self.metadata_index = MetadataIndex(self.vector_store)
+            return self.metadata_index
+
+    def similarity_search(self, query: str, k: int = 3, filter: dict = None) -> list:
+        _, positions = self.search_positions(query, k, filter)
+        return documents_at(self.vector_store, positions)
+
+    def search_positions(self, query: str, k: int = 3, search_filter: dict = None):
+        """
+        Return (query vector, FAISS row ids of the k best chunks), so callers can reuse the vectors
+        already in hand (see context_assembly.py). Filtered queries skip the batch and search only
+        the chunks whose metadata matches the filter (see metadata_index.py).
+        """
+        if search_filter:
+            vector = self.embeddings.embed_query(query)
+            return vector, filtered_search_positions(self.vector_store, self.metadata(), vector, k, search_filter)
+        future = Future()
+        with self._condition:
+            if self._closed:
+                # Closed (e.g. evicted or swapped out) while a request still held it: search directly.
+                vector = self.embeddings.embed_query(query)
+                return vector, batch_search_positions(self.vector_store, [vector], k)[0]
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._run, name="query-batcher", daemon=True)
+                self._worker.start()
+            self._pending.append((query, k, future))
+            self._condition.notify()
+        return future.result()
+
+    def search_positions_batch(self, queries: list, k: int = 3, search_filters: list = None) -> list:
+        """
+        Return (query vector, FAISS row ids) for every query of a batch: all queries are encoded
+        together (cache misses only), the unfiltered ones are searched with one FAISS call and the
+        filtered ones against their metadata candidates.
+        """
+        search_filters = search_filters or [None] * len(queries)
+        vectors = self.embeddings.embed_queries(queries)
+        results = [None] * len(queries)
+        unfiltered = [i for i, search_filter in enumerate(search_filters) if not search_filter]
+        if unfiltered:
+            start = time.process_time()
+            rows = batch_search_positions(self.vector_store, [vectors[i] for i in unfiltered], k)
+            self.search_cpu_seconds += time.process_time() - start
+            self.batches += 1
+            self.queries += len(unfiltered)
+            for i, positions in zip(unfiltered, rows):
+                results[i] = (vectors[i], positions)
+        for i, search_filter in enumerate(search_filters):
+            if search_filter:
+                results[i] = (vectors[i], filtered_search_positions(self.vector_store, self.metadata(),
+                                                                    vectors[i], k, search_filter))
+        return results
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._pending and not self._closed:
+                    self._condition.wait()
+                if self._closed and not self._pending:
+                    return
+                # Wait a few milliseconds for concurrent queries to join this batch.
+                deadline = time.monotonic() + self.window
+                while len(self._pending) < self.max_batch_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._condition.wait(remaining)
+                batch = self._pending[:self.max_batch_size]
+                del self._pending[:self.max_batch_size]
+            self._process(batch)
+
+    def _process(self, batch: list):
+        try:
+            vectors = self.embeddings.embed_queries([query for query, _, _ in batch])
+            start = time.process_time()
+            results = batch_search_positions(self.vector_store, vectors, max(k for _, k, _ in batch))
+            self.search_cpu_seconds += time.process_time() - start
+            self.batches += 1
+            self.queries += len(batch)
+        except Exception as e:
+            for _, _, future in batch:
+                future.set_exception(e)
+            return
+        for (_, k, future), vector, positions in zip(batch, vectors, results):
+            future.set_result((vector, positions[:k]))
+
+    def close(self):
+        """
+        Stop the worker thread once pending queries are done. Later calls search the vector store
+        directly, so requests that still hold this batcher keep working.
+        """
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+
+    def stats(self) -> dict:
+        stats = self.embeddings.stats()
+        stats.update({
+            "batches": self.batches,
+            "batched_queries": self.queries,
+            "mean_batch_size": self.queries / self.batches if self.batches else 0.0,
+            "search_cpu_seconds": self.search_cpu_seconds,
+        })
+        return stats
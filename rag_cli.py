@@ -0,0 +1,250 @@
+"""
+Command-Line Interface for the RAG System for Portfolio Support
+
+Usage:
+    python rag_cli.py build-index masterclasses data/
+    python rag_cli.py query "Who consulted with Jane Doe?" --corpus masterclasses
+    python rag_cli.py batch questions.jsonl --corpus masterclasses --output answers.jsonl
+    python rag_cli.py serve --app asgi --port 8000
+    python rag_cli.py bench context --chunk-overlap 40
+    python rag_cli.py imports --json > import-times.json
+
+Every entry point used to import the whole stack up front: LangChain, FAISS, sentence-transformers
+and torch, and an Ollama client was created at import, so `--help`, a health probe or a test paid
+several seconds before doing anything. The pipeline modules now load those dependencies behind the
+components that need them (the embedding model, the vector store, the first LLM call), and this
+CLI only imports the module a subcommand needs, when it runs:
+  - `build-index` builds and saves a corpus for the index registry (see index_registry.build_corpus).
+  - `query` answers one question, from a saved corpus or from the downloaded documents.
+  - `batch` answers a JSONL file of questions in one batch (see batch_answering.py) and writes
+    JSONL results, one line per question as it finishes, then a summary line.
+  - `serve` starts the Flask app (flask_api.py) or the ASGI app (asgi_api.py, on uvicorn).
+  - `bench` runs a benchmark of benchmarks.py.
+  - `imports` reports the import time of each entry module in a fresh interpreter
+    (`python -X importtime`): the total, the slowest imports and which heavy dependencies were
+    loaded. `--json` output can be kept per release to track startup cost, and `--max-seconds`
+    fails the command when a module exceeds the budget.
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+# Modules whose import time `imports` reports by default
+ENTRY_MODULES = ["rag_cli", "rag_langchain_ai_system", "flask_api", "asgi_api"]
+# Dependencies that should only load when an index, the embedding model or the LLM is used
+HEAVY_DEPENDENCIES = ["langchain", "langchain_community", "faiss", "numpy", "torch",
+                      "sentence_transformers", "transformers", "onnxruntime"]
+IMPORT_REPORT_TOP = 10
+
+
+def parse_import_times(stderr: str) -> list:
+    """
+    Parse `python -X importtime` output into (module, self seconds, cumulative seconds, depth)
+    tuples, in import order. Depth 0 is an import made by the measured statement itself.
+    """
+    imports = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        if not self_us.strip().isdigit():
+            continue
+        stripped = name.lstrip(" ")
+        depth = (len(name) - len(stripped) - 1) // 2
+        imports.append((stripped, int(self_us) / 1e6, int(cumulative_us) / 1e6, depth))
+    return imports
+
+
+def measure_import(module: str) -> dict:
+    """
+    Import a module in a fresh interpreter and report its import time.
+    """
+    completed = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                               capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+    imports = parse_import_times(completed.stderr)
+    loaded = {name for name, _, _, _ in imports}
+    slowest = sorted((entry for entry in imports if entry[0] != module), key=lambda entry: entry[2], reverse=True)
+    return {
+        "module": module,
+        "ok": completed.returncode == 0,
+        "error": completed.stderr.strip().splitlines()[-1] if completed.returncode else None,
+        "seconds": sum(cumulative for _, _, cumulative, depth in imports if depth == 0),
+        "modules_loaded": len(imports),
+        "heavy_dependencies": [name for name in HEAVY_DEPENDENCIES if name in loaded],
+        "slowest": [{"module": name, "cumulative_seconds": cumulative}
+                    for name, _, cumulative, _ in slowest[:IMPORT_REPORT_TOP]],
+    }
+
+
+def json_object(text: str) -> dict:
+    """
+    argparse type of a JSON object option (e.g. --filter); anything else is a usage error.
+    """
+    try:
+        value = json.loads(text)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(f"invalid JSON ({e})")
+    if not isinstance(value, dict):
+        raise argparse.ArgumentTypeError("must be a JSON object")
+    return value
+
+
+##################################
+# Subcommands                    #
+##################################
+
+def run_build_index(args):
+    from index_registry import build_corpus
+
+    try:
+        vectors = build_corpus(args.corpus, args.source)
+    except ValueError as e:
+        print(e)
+        return 1
+    print(f"Saved corpus {args.corpus} ({vectors} vectors).")
+
+
+def load_retriever(corpus: str = None):
+    """
+    The retriever of a saved corpus, or of the downloaded documents if no corpus is given.
+    Returns None (after printing why) if it cannot be loaded.
+    """
+    from rag_langchain_ai_system import load_embeddings, prepare_vector_store
+
+    if not corpus:
+        return prepare_vector_store()
+    from index_registry import IndexRegistry, UnknownCorpusError
+
+    try:
+        return IndexRegistry(load_embeddings()).get(corpus)
+    except UnknownCorpusError:
+        print(f"Unknown corpus '{corpus}'.")
+        return None
+
+
+def run_query(args):
+    from rag_langchain_ai_system import DEFAULT_SESSION, generate_answer
+
+    retriever = load_retriever(args.corpus)
+    if retriever is None:
+        return 1
+    print(generate_answer(args.question, f"\nUser: {args.question}", retriever,
+                          args.session or DEFAULT_SESSION, args.filter))
+
+
+def run_batch(args):
+    from batch_answering import answer_batch_lines, parse_batch
+
+    with open(args.input, encoding="utf-8") as f:
+        try:
+            items = parse_batch(f)
+        except ValueError as e:
+            print(e)
+            return 1
+    retriever = load_retriever(args.corpus)
+    if retriever is None:
+        return 1
+    output = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+    try:
+        for line in answer_batch_lines(items, retriever, args.workers):
+            output.write(line)
+            output.flush()
+    finally:
+        if output is not sys.stdout:
+            output.close()
+
+
+def run_serve(args):
+    if args.app == "asgi":
+        import uvicorn
+
+        uvicorn.run("asgi_api:app", host=args.host, port=args.port or 8000)
+        return
+    import flask_api
+
+    flask_api.main(host=args.host, port=args.port or 5000, use_ngrok=args.ngrok, debug=args.debug)
+
+
+def run_bench(args):
+    import benchmarks
+
+    arguments = benchmarks.build_parser().parse_args(args.arguments)
+    arguments.func(arguments)
+
+
+def run_imports(args):
+    reports = [measure_import(module) for module in args.modules.split(",")]
+    if args.json:
+        print(json.dumps(reports, indent=2))
+    else:
+        for report in reports:
+            status = f"{report['seconds']:.3f}s" if report["ok"] else f"FAILED ({report['error']})"
+            heavy = ", ".join(report["heavy_dependencies"]) or "none"
+            print(f"{report['module']:25} {status}  modules={report['modules_loaded']}  heavy: {heavy}")
+            for entry in report["slowest"][:args.top]:
+                print(f"    {entry['cumulative_seconds']:.3f}s  {entry['module']}")
+    over = [report["module"] for report in reports
+            if args.max_seconds is not None and (not report["ok"] or report["seconds"] > args.max_seconds)]
+    if over:
+        print(f"Over the {args.max_seconds}s import budget: {', '.join(over)}", file=sys.stderr)
+        return 1
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="RAG system for portfolio support.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    build_index = subparsers.add_parser("build-index", help="Build and save a corpus for the index registry.")
+    build_index.add_argument("corpus", help="Corpus ID.")
+    build_index.add_argument("source", help="Directory (.txt and CSV / JSONL files), .csv / .jsonl file or documents zip.")
+    build_index.set_defaults(func=run_build_index)
+
+    query = subparsers.add_parser("query", help="Answer one question.")
+    query.add_argument("question")
+    query.add_argument("--corpus", help="Saved corpus to search (default: download and index the documents).")
+    query.add_argument("--filter", type=json_object, help='Metadata filter as a JSON object, e.g. \'{"doc_type": "csv"}\'.')
+    query.add_argument("--session", help="Session ID (selects the Ollama instance).")
+    query.set_defaults(func=run_query)
+
+    batch = subparsers.add_parser("batch", help="Answer a JSONL file of questions in one batch.")
+    batch.add_argument("input", help='JSONL file, one {"query": ..., "id": ..., "filter": {...}} object per line.')
+    batch.add_argument("--corpus", help="Saved corpus to search (default: download and index the documents).")
+    batch.add_argument("--output", help="JSONL file to write the results to (default: stdout).")
+    batch.add_argument("--workers", type=int, default=os.cpu_count() or 4,
+                       help="Questions answered in parallel (default and maximum: number of cores).")
+    batch.set_defaults(func=run_batch)
+
+    serve = subparsers.add_parser("serve", help="Start the Flask or ASGI app.")
+    serve.add_argument("--app", choices=["flask", "asgi"], default="flask", help="App to serve (default: flask).")
+    serve.add_argument("--host", default="0.0.0.0", help="Bind address (default: 0.0.0.0).")
+    serve.add_argument("--port", type=int, help="Port (default: 5000 for flask, 8000 for asgi).")
+    serve.add_argument("--ngrok", action="store_true", help="Expose the Flask app through ngrok (Colab).")
+    serve.add_argument("--debug", action="store_true", help="Run Flask in debug mode.")
+    serve.set_defaults(func=run_serve)
+
+    bench = subparsers.add_parser("bench", help="Run a benchmark of benchmarks.py.", add_help=False)
+    bench.add_argument("arguments", nargs=argparse.REMAINDER, help="Benchmark and its options.")
+    bench.set_defaults(func=run_bench)
+
+    imports = subparsers.add_parser("imports", help="Import time of the entry modules, in a fresh interpreter each.")
+    imports.add_argument("--modules", default=",".join(ENTRY_MODULES),
+                         help=f"Comma separated modules (default: {','.join(ENTRY_MODULES)}).")
+    imports.add_argument("--top", type=int, default=5, help="Slowest imports to list per module (default: 5).")
+    imports.add_argument("--json", action="store_true", help="Print the full report as JSON.")
+    imports.add_argument("--max-seconds", type=float, help="Fail if any module takes longer to import.")
+    imports.set_defaults(func=run_imports)
+    return parser
+
+
+if __name__ == "__main__":
+    parser = build_parser()
+    # Options after `bench` (including --help) belong to the benchmark
+    arguments, unknown = parser.parse_known_args()
+    if unknown and arguments.command != "bench":
+        parser.error(f"unrecognized arguments: {' '.join(unknown)}")
+    if unknown:
+        arguments.arguments = unknown + arguments.arguments
+    sys.exit(arguments.func(arguments))
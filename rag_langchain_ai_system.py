@@ -4,22 +4,34 @@ Dynamic Entity Extraction, Conversation History, and Reduced Hallucinations
 
 This script:
   1. Downloads a ZIP file containing MasterClass documents from the /api/documents/download endpoint.
-  2. Unzips and reads all text files.
-  3. Splits each document into more manageable text chunks.
-  4. Uses a Hugging Face embedding model to encode these chunks and build an in‑memory FAISS vector store.
+  2. Unzips and reads all text files, and any CSV / JSONL tables.
+  3. Splits each document into sentence-aligned chunks sized by embedding model tokens (table rows into chunks
+     with typed metadata, see structured_ingest.py).
+  4. Uses a Hugging Face embedding model (on PyTorch, or exported to ONNX Runtime) to encode these chunks and build an in‑memory FAISS vector store.
   5. At startup, calls the /ping endpoint to verify API credentials.
   6. Runs an interactive conversation loop that:
-       - Retrieves relevant document chunks based on the user's query.
+       - Retrieves relevant document chunks based on the user's query (optionally restricted by a metadata filter),
+         merging overlapping or adjacent chunks and picking diverse passages (see context_assembly.py).
        - Dynamically extracts entities (person names, company names, sectors, URLs) from the query or conversation history.
-       - Based on keywords (e.g. "consult", "profile", "investment", "sector", "scrape"), calls the corresponding API endpoints:
+       - Based on keywords (e.g. "consult", "profile", "investment", "sector", "scrape"), calls the corresponding API endpoints
+         (team, investment, sector and consultation lookups are answered from a local snapshot synced via /api/sync):
             • /api/consultations
             • /api/team and /api/team/insights
             • /api/investments and /api/investments/insights
             • /api/sectors
             • /api/scrape
             • /ping (checked once at startup)
-       - Appends the retrieved API information (or friendly messages if data is unavailable), document context, and conversation history to the prompt.
-       - Uses a Hugging Face language model (via the Ollama integration) to generate an answer.
+       - Runs retrieval, the API lookups and an LLM warm-up concurrently, each bounded by a deadline (a lookup that
+         misses it becomes a "data unavailable" note), and logs the critical-path latency of every request.
+       - Builds the prompt with a stable prefix (preamble and append-only conversation history) followed by the
+         volatile document context and API information (or friendly messages if data is unavailable), so the
+         LLM can reuse its cached prompt prefix across turns.
+       - Uses a Hugging Face language model (via the Ollama integration) to generate an answer, pinning each
+         session to one warm Ollama instance.
+
+LangChain, FAISS and the embedding model are only imported when an index is built or loaded, and the
+Ollama clients are created on the first LLM call, so importing this module (e.g. from `rag_cli.py --help`,
+a health probe or the Flask app) stays cheap. `python rag_cli.py imports` reports the import time.
 
 Before running, ensure you have installed these packages:
     !pip install langchain_community faiss-cpu sentence-transformers requests
@@ -30,20 +42,43 @@ Author: David Nguyen
 Date: 2/2/2025
 """
 
+from __future__ import annotations
+
 import os
 import io
 import zipfile
 import re
+import time
 import requests
 import logging
+from typing import TYPE_CHECKING
+
+# LangChain imports (loaded on first use, see load_embeddings and build_vector_store)
+if TYPE_CHECKING:
+    from langchain.vectorstores import FAISS
+    from query_encoding import CachedQueryEmbeddings
+
+# Ollama integration (from LangChain Community) for LLM, with sessions pinned to warm instances
+from llm_sessions import SessionLLMPool
+
+# Deduplicated, diverse passages for the prompt context
+from context_assembly import ContextAssembler
 
-# LangChain imports
-from langchain.text_splitter import CharacterTextSplitter
-from langchain.vectorstores import FAISS
-from langchain.embeddings import HuggingFaceEmbeddings
+# Concurrent request stages with deadlines, and per-request latency reports
+from request_executor import STAGE_DEADLINES, LatencyTracker, RequestExecutor, RequestTimings, unavailable_note
 
-# Ollama integration (from LangChain Community) for LLM
-from langchain_community.llms import Ollama
+# Sentence- and token-aware chunking, and row chunking of CSV / JSONL tables
+from chunking import TranscriptChunker, embeddings_tokenizer
+from structured_ingest import TABULAR_EXTENSIONS, split_corpus
+
+# Scraped-page cache and per-session scrape index
+from scrape_cache import ScrapeCache, ScrapeSessions, DEFAULT_SESSION
+
+# Local snapshot of the team, investment, sector and consultation data
+from entity_store import EntitySnapshotStore, NOT_IN_SNAPSHOT
+
+# Compact, field-projected rendering of API responses for the prompt
+from context_format import format_api_data
 
 # Set up logging for debugging
 logging.basicConfig(level=logging.INFO)
@@ -64,23 +99,62 @@ API_TOKEN = "token"  # Call the /auth/token endpoint first to get a token
 # and use the token generated from the response here.
 
 EMBEDDING_MODEL_NAME = "all-MiniLM-L6-v2"
+
+# "huggingface" (sentence-transformers on PyTorch) or "onnx" (onnxruntime, see onnx_embeddings.py).
+# Both produce compatible vectors, but rebuild saved indexes after switching.
+EMBEDDING_BACKEND = "huggingface"
+ONNX_MODEL_DIR = os.path.join("models", "all-MiniLM-L6-v2-onnx")
+ONNX_QUANTIZED = True
 LLM_MODEL_NAME = "llama2"
 
+# Ollama instances to spread sessions over (each session always uses the same one), and how long
+# an idle model and its cached prompt stay loaded
+OLLAMA_BASE_URLS = ["http://localhost:11434"]
+LLM_KEEP_ALIVE = "30m"
+
+# Chunk size in embedding model tokens, and how many tokens of whole sentences consecutive chunks share
+CHUNK_TOKENS = 200
+CHUNK_OVERLAP_TOKENS = 0
+
+# Seconds before a backend call gives up. The default leaves a cold backend time to wake up (e.g. the
+# startup ping); lookups made while answering a query pass their stage deadline instead
+# (request_executor.STAGE_DEADLINES), so a hung backend does not keep holding a worker thread.
+API_TIMEOUT_SECONDS = 30
+SCRAPE_TIMEOUT_SECONDS = STAGE_DEADLINES["scrape"]
+SYNC_TIMEOUT_SECONDS = 30
+DOWNLOAD_TIMEOUT_SECONDS = 120
+
 ###############################
 # API Helper Functions        #
 ###############################
 
-def api_get(endpoint: str, params: dict) -> dict:
+def api_get(endpoint: str, params: dict, timeout: float = API_TIMEOUT_SECONDS) -> dict:
     """
     Call a GET endpoint with Authorization.
     """
     headers = {"Authorization": f"Bearer {API_TOKEN}"}
     url = f"{API_BASE_URL}{endpoint}"
-    response = requests.get(url, headers=headers, params=params)
+    response = requests.get(url, headers=headers, params=params, timeout=timeout)
     response.raise_for_status()
     return response.json()
 
 
+def api_get_conditional(endpoint: str, params: dict, etag: str = None, timeout: float = API_TIMEOUT_SECONDS):
+    """
+    Call a GET endpoint with Authorization and If-None-Match.
+    Returns (data, etag); data is None if the server answered 304 Not Modified.
+    """
+    headers = {"Authorization": f"Bearer {API_TOKEN}"}
+    if etag:
+        headers["If-None-Match"] = etag
+    url = f"{API_BASE_URL}{endpoint}"
+    response = requests.get(url, headers=headers, params=params, timeout=timeout)
+    if response.status_code == 304:
+        return None, etag
+    response.raise_for_status()
+    return response.json(), response.headers.get("ETag")
+
+
 # Ping endpoint: verifies token validity
 def get_ping() -> dict:
     return api_get("/ping", {})
@@ -173,30 +247,38 @@ def extract_url(text: str) -> str:
 # Document Download & Processing #
 ##################################
 
-def download_documents_zip(api_token: str) -> bytes:
+def download_documents_zip_with_etag(api_token: str) -> tuple:
     """
-    Download a zip file containing documents from the API using the provided API token.
+    Download the documents zip and return (zip_bytes, etag). The ETag seeds the corpus refresher,
+    so its first poll gets a 304 instead of downloading the same zip again.
     """
     headers = {"Authorization": f"Bearer {api_token}"}
     try:
         logging.info("Requesting documents zip from API...")
-        response = requests.get(DOCUMENTS_DOWNLOAD_ENDPOINT, headers=headers)
+        response = requests.get(DOCUMENTS_DOWNLOAD_ENDPOINT, headers=headers, timeout=DOWNLOAD_TIMEOUT_SECONDS)
         response.raise_for_status()
         logging.info("Successfully downloaded documents zip.")
-        return response.content
+        return response.content, response.headers.get("ETag")
     except Exception as e:
         logging.error("Failed to download documents zip: %s", e)
         raise
 
 
+def download_documents_zip(api_token: str) -> bytes:
+    """
+    Download a zip file containing documents from the API using the provided API token.
+    """
+    return download_documents_zip_with_etag(api_token)[0]
+
+
 def extract_documents(zip_bytes: bytes) -> dict:
     """
-    Extract text documents from a zip file provided as bytes.
+    Extract text documents and CSV / JSONL tables from a zip file provided as bytes.
     """
     documents = {}
     with zipfile.ZipFile(io.BytesIO(zip_bytes)) as z:
         for file_info in z.infolist():
-            if file_info.filename.endswith(".txt"):
+            if file_info.filename.endswith(".txt") or file_info.filename.lower().endswith(TABULAR_EXTENSIONS):
                 with z.open(file_info) as f:
                     content = f.read().decode("utf-8")
                     documents[file_info.filename] = content
@@ -206,187 +288,309 @@ def extract_documents(zip_bytes: bytes) -> dict:
     return documents
 
 
-def build_vector_store(documents: dict) -> FAISS:
+_embeddings = {}
+
+
+def load_embeddings(backend: str = None) -> CachedQueryEmbeddings:
+    """
+    Load the embedding model of `backend` (default: the configured EMBEDDING_BACKEND) once per
+    process, wrapped in the query embedding cache. All vector stores (and corpora in the index
+    registry) share this instance. Chunkers for it count tokens with its own tokenizer (see
+    chunking.embeddings_tokenizer).
+    """
+    backend = backend or EMBEDDING_BACKEND
+    if backend not in _embeddings:
+        # LRU cache for query embeddings
+        from query_encoding import CachedQueryEmbeddings
+
+        if backend == "onnx":
+            from onnx_embeddings import OnnxEmbeddings
+
+            embeddings = OnnxEmbeddings(ONNX_MODEL_DIR, quantized=ONNX_QUANTIZED)
+        else:
+            from langchain.embeddings import HuggingFaceEmbeddings
+
+            embeddings = HuggingFaceEmbeddings(model_name=EMBEDDING_MODEL_NAME)
+        _embeddings[backend] = CachedQueryEmbeddings(embeddings)
+    return _embeddings[backend]
+
+
+def build_vector_store(documents: dict, embeddings=None) -> FAISS:
     """
     Build a FAISS vector store from a dictionary of documents.
 
-    The function formats each document by appending its source filename, splits the text
-    into chunks using a CharacterTextSplitter, generates embeddings for the text chunks using
-    a specified HuggingFace model, and finally builds a FAISS vector store with these embeddings.
-    """
-    all_texts = []
-    for filename, content in documents.items():
-        text_with_source = f"[{filename}]\n{content}"
-        all_texts.append(text_with_source)
-    text_splitter = CharacterTextSplitter(separator="\n", chunk_size=500, chunk_overlap=100)
-    texts = []
-    for text in all_texts:
-        texts.extend(text_splitter.split_text(text))
-    logging.info("Total text chunks generated: %d", len(texts))
-    embeddings = HuggingFaceEmbeddings(model_name=EMBEDDING_MODEL_NAME)
-    vector_store = FAISS.from_texts(texts, embeddings)
+    The function splits each document into chunks on sentence and speaker-turn boundaries, sized
+    by embedding model tokens (see chunking.TranscriptChunker); CSV / JSONL tables are split row by
+    row (see structured_ingest.RowChunker). Every chunk is prefixed with its source filename and
+    carries source and doc_type metadata, plus offsets and speaker (text) or typed row fields
+    (tables). It then generates embeddings for the chunks using a specified HuggingFace model (see
+    load_embeddings), and finally builds a FAISS vector store with these embeddings.
+    """
+    from langchain.vectorstores import FAISS
+
+    embeddings = embeddings or load_embeddings()
+    chunker = TranscriptChunker(chunk_tokens=CHUNK_TOKENS, overlap_tokens=CHUNK_OVERLAP_TOKENS,
+                                tokenizer=embeddings_tokenizer(embeddings))
+    chunks = split_corpus(documents, chunker)
+    logging.info("Total text chunks generated: %d", len(chunks))
+    vector_store = FAISS.from_documents(chunks, embeddings)
     logging.info("Built FAISS vector store.")
     return vector_store
 
 
+# Builds the prompt context from the retrieved chunks
+context_assembler = ContextAssembler()
+
+# Runs retrieval and the API lookups of a request concurrently, with per-stage deadlines
+latency_tracker = LatencyTracker()
+request_executor = RequestExecutor(latency_tracker)
+
+
 ###############################
 # LLM Initialization (Ollama) #
 ###############################
 
-try:
-    llm = Ollama(model=LLM_MODEL_NAME)
-    logging.info("Successfully initialized Ollama model: %s", LLM_MODEL_NAME)
-except Exception as e:
-    logging.error("Error initializing the LLM: %s", e)
-    raise
+# The Ollama clients are created on the first LLM call
+llm_pool = SessionLLMPool(LLM_MODEL_NAME, OLLAMA_BASE_URLS, keep_alive=LLM_KEEP_ALIVE)
+
+
+def get_llm():
+    """
+    The Ollama client of the default session, for callers outside the chat pipeline (benchmarks).
+    """
+    return llm_pool.for_session(DEFAULT_SESSION)
 
 
 ###############################
 # API Information Aggregation #
 ###############################
 
-def fetch_api_info(query: str, conversation_history: str) -> str:
+GREETINGS = ["hello", "hi", "hey"]
+
+
+def api_lookup(name: str, endpoint: str, params: dict, label: str, empty_note, error_note: str) -> dict:
     """
-    Dynamically extract entities from the query or conversation history and call all relevant API endpoints.
-    Returns a formatted string with retrieved API data or friendly messages if not found.
+    Describe a single API call needed to answer a query, without performing it.
+    `empty_note` is used when the endpoint returns nothing (None means always show the result)
+    and `error_note` when the call fails.
+    """
+    return {
+        "name": name,
+        "endpoint": endpoint,
+        "params": params,
+        "label": label,
+        "empty_note": empty_note,
+        "error_note": error_note,
+    }
+
+
+def format_api_note(note: str) -> str:
+    return f"\n[Note: {note}]\n"
+
+
+def format_api_result(lookup: dict, result, query: str = "") -> str:
+    """
+    Format the data returned for a lookup, or its friendly note if nothing was found.
+    The data is projected to the fields relevant to the query and rendered compactly
+    (see context_format.format_api_data).
     """
-    additional_info = ""
+    if not result and lookup["empty_note"] is not None:
+        return format_api_note(lookup["empty_note"])
+    return f"\n[{lookup['label']}]\n" + format_api_data(lookup["name"], result, query) + "\n"
+
+
+def format_api_error(lookup: dict) -> str:
+    return format_api_note(lookup["error_note"])
+
+
+def plan_api_lookups(query: str, conversation_history: str) -> list:
+    """
+    Dynamically extract entities from the query or conversation history and work out which
+    API endpoints are relevant. Returns an ordered list whose items are either lookups (see
+    api_lookup) or already formatted notes explaining why a lookup could not be made.
+    None of the endpoints are called here, so the plan can be executed sync or async.
+    """
+    plan = []
+    lower_query = query.lower()
 
     # If the query is a simple greeting, return nothing extra.
-    if query.strip().lower() in ["hello", "hi", "hey"]:
-        return additional_info
+    if query.strip().lower() in GREETINGS:
+        return plan
 
     # Ping endpoint: (call once at startup; here we include it if mentioned)
-    if "ping" in query.lower():
-        try:
-            ping_info = get_ping()
-            additional_info += "\n[Ping Info]\n" + str(ping_info) + "\n"
-        except Exception as e:
-            logging.error("Error fetching ping info: %s", e)
-            additional_info += "\n[Note: Unable to verify API credentials at this time.]\n"
+    if "ping" in lower_query:
+        plan.append(api_lookup("ping", "/ping", {}, "Ping Info", None,
+                               "Unable to verify API credentials at this time."))
 
     # Consultations (if query contains "consult")
-    if "consult" in query.lower():
+    if "consult" in lower_query:
         person = extract_person_name(query, "consult")
         if not person:
             person = extract_person_name(conversation_history, "consult")
         if person:
-            try:
-                consultations = get_consultations(person)
-                if consultations:
-                    additional_info += f"\n[Consultations for {person}]\n" + str(consultations) + "\n"
-                else:
-                    additional_info += f"\n[Note: No consultations found for {person}.]\n"
-            except Exception as e:
-                logging.error("Error fetching consultations for %s: %s", person, e)
-                additional_info += f"\n[Note: No consultations found for {person}.]\n"
+            plan.append(api_lookup("consultations", "/api/consultations", {"name": person},
+                                   f"Consultations for {person}",
+                                   f"No consultations found for {person}.",
+                                   f"No consultations found for {person}."))
         else:
-            additional_info += "\n[Note: No consultant name found for consultation lookup.]\n"
+            plan.append(format_api_note("No consultant name found for consultation lookup."))
 
     # Team profile and insights (if query mentions "profile" or "team")
-    if "profile" in query.lower() or "team" in query.lower():
+    if "profile" in lower_query or "team" in lower_query:
         person = extract_person_name(query, "profile")
         if not person:
             person = extract_person_name(query, "team")
         if not person:
             person = extract_person_name(conversation_history, "profile")
         if person:
-            try:
-                team_profile = get_team_profile(person)
-                if team_profile:
-                    additional_info += f"\n[Team Profile for {person}]\n" + str(team_profile) + "\n"
-                else:
-                    additional_info += f"\n[Note: No team profile found for {person}.]\n"
-            except Exception as e:
-                logging.error("Error fetching team profile for %s: %s", person, e)
-                additional_info += f"\n[Note: No team profile found for {person}.]\n"
-            try:
-                team_insights = get_team_insights(person)
-                if team_insights:
-                    additional_info += f"\n[Team Insights for {person}]\n" + str(team_insights) + "\n"
-                else:
-                    additional_info += f"\n[Note: No team insights found for {person}.]\n"
-            except Exception as e:
-                logging.error("Error fetching team insights for %s: %s", person, e)
-                additional_info += f"\n[Note: No team insights found for {person}.]\n"
+            plan.append(api_lookup("team_profile", "/api/team", {"name": person},
+                                   f"Team Profile for {person}",
+                                   f"No team profile found for {person}.",
+                                   f"No team profile found for {person}."))
+            plan.append(api_lookup("team_insights", "/api/team/insights", {"name": person},
+                                   f"Team Insights for {person}",
+                                   f"No team insights found for {person}.",
+                                   f"No team insights found for {person}."))
         else:
-            additional_info += "\n[Note: No person name found for team profile lookup.]\n"
+            plan.append(format_api_note("No person name found for team profile lookup."))
 
     # Investments and investment insights (if query mentions "investment", "invest", or "company")
-    if "investment" in query.lower() or "invest" in query.lower() or "company" in query.lower():
+    if "investment" in lower_query or "invest" in lower_query or "company" in lower_query:
         company = extract_company_name(query)
         if not company:
             company = extract_company_name(conversation_history)
         if company:
-            try:
-                investments = get_investments(company)
-                if investments:
-                    additional_info += f"\n[Investments info for {company}]\n" + str(investments) + "\n"
-                else:
-                    additional_info += f"\n[Note: No investment info found for {company}.]\n"
-            except Exception as e:
-                logging.error("Error fetching investments for %s: %s", company, e)
-                additional_info += f"\n[Note: No investment info found for {company}.]\n"
-            try:
-                inv_insights = get_investments_insights(company)
-                if inv_insights:
-                    additional_info += f"\n[Investment Insights for {company}]\n" + str(inv_insights) + "\n"
-                else:
-                    additional_info += f"\n[Note: No investment insights found for {company}.]\n"
-            except Exception as e:
-                logging.error("Error fetching investment insights for %s: %s", company, e)
-                additional_info += f"\n[Note: No investment insights found for {company}.]\n"
+            plan.append(api_lookup("investments", "/api/investments", {"company_name": company},
+                                   f"Investments info for {company}",
+                                   f"No investment info found for {company}.",
+                                   f"No investment info found for {company}."))
+            plan.append(api_lookup("investment_insights", "/api/investments/insights", {"company_name": company},
+                                   f"Investment Insights for {company}",
+                                   f"No investment insights found for {company}.",
+                                   f"No investment insights found for {company}."))
         else:
-            additional_info += "\n[Note: No company name found for investment lookup.]\n"
+            plan.append(format_api_note("No company name found for investment lookup."))
 
     # Sector information (if query mentions "sector")
-    if "sector" in query.lower():
+    if "sector" in lower_query:
         sector = extract_sector(query)
         if not sector:
             sector = extract_sector(conversation_history)
         if sector:
-            try:
-                sectors_info = get_sectors(sector)
-                if sectors_info:
-                    additional_info += f"\n[Sectors info for {sector}]\n" + str(sectors_info) + "\n"
-                else:
-                    additional_info += f"\n[Note: No sector info found for {sector}.]\n"
-            except Exception as e:
-                logging.error("Error fetching sector info for %s: %s", sector, e)
-                additional_info += f"\n[Note: No sector info found for {sector}.]\n"
+            plan.append(api_lookup("sectors", "/api/sectors", {"sector": sector},
+                                   f"Sectors info for {sector}",
+                                   f"No sector info found for {sector}.",
+                                   f"No sector info found for {sector}."))
         else:
-            additional_info += "\n[Note: No sector name found for lookup.]\n"
+            plan.append(format_api_note("No sector name found for lookup."))
 
-    # Scrape endpoint (if a URL is present)
+    # Scrape endpoint (if a URL is present). A URL only found in the history was scraped on an
+    # earlier turn, so it is answered from the session's scrape index (see scraped_context).
     url = extract_url(query)
+    from_query = url is not None
     if not url:
         url = extract_url(conversation_history)
     if url:
-        try:
-            scrape_info = get_scrape(url)
-            if scrape_info:
-                additional_info += f"\n[Scraped Content from {url}]\n" + str(scrape_info) + "\n"
-            else:
-                additional_info += f"\n[Note: No scraped content found for {url}.]\n"
-        except Exception as e:
-            logging.error("Error scraping URL %s: %s", url, e)
-            additional_info += f"\n[Note: Unable to scrape content from {url}.]\n"
+        lookup = api_lookup("scrape", "/api/scrape", {"url": url},
+                            f"Scraped Content from {url}",
+                            f"No scraped content found for {url}.",
+                            f"Unable to scrape content from {url}.")
+        lookup["from_query"] = from_query
+        plan.append(lookup)
+
+    return plan
+
+
+# Entity lookups are answered from a periodically synced local snapshot (started in main)
+entity_store = EntitySnapshotStore(lambda: api_get("/api/sync", {}, timeout=SYNC_TIMEOUT_SECONDS))
+
+
+def resolve_api_lookup(lookup: dict, timeout: float = API_TIMEOUT_SECONDS):
+    """
+    Return the data for a planned lookup: from the local entity snapshot when it can answer,
+    otherwise from the API endpoint (giving up after `timeout` seconds).
+    """
+    result = entity_store.answer(lookup)
+    if result is NOT_IN_SNAPSHOT:
+        result = api_get(lookup["endpoint"], lookup["params"], timeout=timeout)
+    return result
+
+
+# Scraped pages are fetched once per TTL and indexed once per session
+scrape_cache = ScrapeCache(lambda url, etag: api_get_conditional("/api/scrape", {"url": url}, etag,
+                                                                 timeout=SCRAPE_TIMEOUT_SECONDS))
+scrape_sessions = ScrapeSessions(load_embeddings)
+
+
+def scraped_context(lookup: dict, query: str, session_id: str = DEFAULT_SESSION) -> str:
+    """
+    Resolve a scrape lookup: make sure the page is chunked and embedded into the session's scrape
+    index (fetching it through the cache only when needed), then return just the passages
+    relevant to the current query instead of the whole scraped payload.
+    """
+    url = lookup["params"]["url"]
+    try:
+        indexed_version = scrape_sessions.indexed_version(session_id, url)
+        if lookup.get("from_query") or indexed_version is None:
+            entry = scrape_cache.get(url)
+            if not entry["payload"]:
+                return format_api_note(lookup["empty_note"])
+            if entry["version"] != indexed_version:
+                scrape_sessions.add(session_id, url, entry)
+        passages = scrape_sessions.search(session_id, url, query)
+    except Exception as e:
+        logging.error("Error scraping URL %s: %s", url, e)
+        return format_api_error(lookup)
+    if not passages:
+        return format_api_note(lookup["empty_note"])
+
+    title = passages[0].metadata.get("title")
+    date_published = passages[0].metadata.get("date_published")
+    lines = []
+    if title:
+        lines.append(f"Title: {title}" + (f" (published {date_published})" if date_published else ""))
+    # Drop the "[url]" prefix every chunk carries; the section header already names the URL.
+    lines.extend(passage.page_content.split("\n", 1)[-1] for passage in passages)
+    return format_api_result(lookup, "\n...\n".join(lines))
+
+
+def resolve_api_info(lookup: dict, query: str, session_id: str = DEFAULT_SESSION,
+                     timeout: float = API_TIMEOUT_SECONDS) -> str:
+    """
+    Resolve one planned lookup and return its formatted section, or a friendly note if the data
+    was not found or the call failed.
+    """
+    if lookup["name"] == "scrape":
+        return scraped_context(lookup, query, session_id)
+    try:
+        result = resolve_api_lookup(lookup, timeout)
+    except Exception as e:
+        logging.error("Error fetching %s with %s: %s", lookup["endpoint"], lookup["params"], e)
+        return format_api_error(lookup)
+    return format_api_result(lookup, result, query)
 
-    return additional_info
+
+def fetch_api_info(query: str, conversation_history: str, session_id: str = DEFAULT_SESSION) -> str:
+    """
+    Dynamically extract entities from the query or conversation history and call all relevant API endpoints.
+    Returns a formatted string with retrieved API data or friendly messages if not found.
+    """
+    return "".join(item if isinstance(item, str) else resolve_api_info(item, query, session_id)
+                   for item in plan_api_lookups(query, conversation_history))
 
 
 ##################################
 # Retrieval-Augmented Generation #
 ##################################
 
-def generate_answer(query: str, conversation_history: str, vector_store: FAISS) -> str:
+def canned_answer(query: str) -> str:
     """
-    Generate an answer by combining document-based context, additional API info, and conversation history.
-    For simple greetings or introductory queries, return a generic introduction.
+    Return a generic introduction for simple greetings or introductory queries, or None
+    if the query needs the full retrieval-augmented pipeline.
     """
     lower_query = query.strip().lower()
     # Generic introduction for greetings.
-    if lower_query in ["hello", "hi", "hey"]:
+    if lower_query in GREETINGS:
         return ("Hello! I'm your assistant here to help with information about PeakSpan MasterClasses, "
                 "team profiles, investments, sectors, and more. How can I assist you today?")
 
@@ -396,41 +600,93 @@ def generate_answer(query: str, conversation_history: str, vector_store: FAISS)
                 "about PeakSpan MasterClasses, team profiles, investments, sectors, and related insights. "
                 "I retrieve document-based context and external API data to help answer your questions accurately. "
                 "How may I assist you today?")
+    return None
 
-    try:
-        retrieved_docs = vector_store.similarity_search(query, k=3)
-        context_text = "\n\n".join([doc.page_content for doc in retrieved_docs])
-    except Exception as e:
-        logging.error("Error during similarity search: %s", e)
-        context_text = ""
 
-    api_info = fetch_api_info(query, conversation_history)
+def is_fresh_start(query: str) -> bool:
+    """
+    Greetings and introductory queries reset the conversation history.
+    """
+    return canned_answer(query) is not None
+
 
-    prompt = (
-        "You are a knowledgeable assistant with access to PeakSpan MasterClass documents and external API data.\n\n"
+PROMPT_PREAMBLE = (
+    "You are a knowledgeable assistant with access to PeakSpan MasterClass documents and external API data.\n\n"
+)
+
+
+def build_prompt(query: str, conversation_history: str, context_text: str, api_info: str) -> str:
+    """
+    The preamble and the conversation history come first: the history only ever grows, so each
+    turn's prompt starts with the previous turn's prompt up to the history, and Ollama only has
+    to evaluate the new turn and the per-query context. Retrieved context goes last.
+    """
+    return (
+        PROMPT_PREAMBLE
+        + "Conversation History:\n"
+        f"{conversation_history}\n\n"
         "Relevant Document Context:\n"
         f"{context_text}\n\n"
         "Additional API Information:\n"
         f"{api_info}\n\n"
-        "Conversation History:\n"
-        f"{conversation_history}\n\n"
         f"User: {query}\n"
         "Assistant:"
     )
 
+
+def generate_answer(query: str, conversation_history: str, vector_store: FAISS,
+                    session_id: str = DEFAULT_SESSION, search_filter: dict = None) -> str:
+    """
+    Generate an answer by combining document-based context, additional API info, and conversation history.
+    For simple greetings or introductory queries, return a generic introduction.
+    `session_id` selects the session's index of scraped pages and its Ollama instance.
+    `search_filter` (e.g. {"source": "books.csv", "genre": "Business"}) restricts document retrieval
+    to chunks with matching metadata.
+    """
+    canned = canned_answer(query)
+    if canned is not None:
+        return canned
+
+    # Retrieval, every API lookup and the LLM warm-up start together; each has a deadline.
+    timings = RequestTimings()
+    request_executor.background("warmup", lambda: llm_pool.warm_up(session_id))
+    plan = plan_api_lookups(query, conversation_history)
+    stages = [("retrieval", lambda: context_assembler.retrieve(vector_store, query, search_filter), "")]
+    for index, item in enumerate(plan):
+        if not isinstance(item, str):
+            stages.append((f"{'scrape' if item['name'] == 'scrape' else 'api'}:{index}:{item['name']}",
+                           lambda item=item: resolve_api_info(item, query, session_id,
+                                                              request_executor.deadlines["api"]),
+                           unavailable_note(item["label"])))
+    results = request_executor.run(stages, timings)
+
+    context_text = results.pop("retrieval")
+    api_results = iter(results.values())
+    api_info = "".join(item if isinstance(item, str) else next(api_results) for item in plan)
+
+    prompt = build_prompt(query, conversation_history, context_text, api_info)
+
+    llm_start = time.perf_counter()
     try:
-        response = llm.invoke(prompt)
-        return response
+        return llm_pool.invoke(prompt, session_id)
     except Exception as e:
         logging.error("Error invoking the LLM: %s", e)
         return "Sorry, I encountered an error while generating the answer."
+    finally:
+        latency_tracker.add(timings.report(llm_seconds=time.perf_counter() - llm_start))
 
 
 ##############################
 # Main Interactive Loop      #
 ##############################
 
-def main():
+def prepare_vector_store():
+    """
+    Verify the API credentials, start the entity snapshot sync, then download and index the
+    documents. Returns the batched vector store, or None (after printing why) if a step failed.
+    """
+    from query_encoding import QueryBatcher
+
     # 1. Verify API credentials via the ping endpoint
     try:
         ping_info = get_ping()
@@ -440,6 +696,9 @@ def main():
         print("Error: Unable to verify API credentials. Please check your token.")
         return
 
+    # Pull the entity datasets once, then keep them in sync in the background
+    entity_store.start()
+
     # 2. Download and process documents
     try:
         zip_bytes = download_documents_zip(API_TOKEN)
@@ -447,10 +706,17 @@ def main():
         if not docs:
             print("No documents found. Exiting.")
             return
-        vector_store = build_vector_store(docs)
+        vector_store = QueryBatcher(build_vector_store(docs))
     except Exception as e:
         print("Error during document preparation:", e)
         return
+    return vector_store
+
+
+def main():
+    vector_store = prepare_vector_store()
+    if vector_store is None:
+        return
 
     print("Documents are loaded and indexed. You can now start asking questions!")
     print("Type 'exit' or 'quit' to end the session.")
@@ -0,0 +1,191 @@
+"""
+Concurrent Request Stages for the RAG System for Portfolio Support
+
+`generate_answer()` used to run retrieval, every API lookup and the LLM call strictly one after
+another, although nothing depends on anything else until the prompt is built, and one slow
+backend endpoint held up the whole answer. RequestExecutor runs the independent stages of a
+request together:
+  1. Retrieval and each planned API lookup are submitted at once; the LLM warm-up ping
+     (llm_sessions.SessionLLMPool.warm_up) runs alongside in the background. Retrieval, lookups
+     and background stages each have their own thread pool, so lookups stuck on a hung backend
+     or warm-ups stuck on a hung Ollama cannot take the threads retrieval needs.
+  2. Every stage has a deadline (STAGE_DEADLINES, measured from the start of the request). A stage
+     that misses it is replaced by its fallback, e.g. a "data unavailable" note for an API lookup,
+     and the prompt is built without waiting for it. Late results are discarded; backend lookups
+     pass their deadline as the request timeout (see resolve_api_lookup), so the thread is freed
+     soon after.
+  3. Each request gets a timing report: per-stage durations, which stages timed out, how long the
+     prompt waited for its inputs, the stage on the critical path, the LLM time and the total.
+     LatencyTracker keeps the reports for the /latency endpoint.
+
+asgi_api.py applies the same deadlines with asyncio and reports through the same tracker.
+"""
+
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+
+# Seconds from the start of the request by which each kind of stage must be done
+STAGE_DEADLINES = {
+    "retrieval": 3.0,
+    "api": 2.0,
+    "scrape": 6.0,
+}
+STAGE_WORKERS = 32
+RETRIEVAL_WORKERS = 16
+BACKGROUND_WORKERS = 4
+LATENCY_HISTORY = 1000
+
+
+def stage_kind(name: str) -> str:
+    """
+    The deadline group of a stage name: "retrieval", "api:<lookup>" -> "api", "scrape".
+    """
+    return name.split(":", 1)[0]
+
+
+def unavailable_note(label: str) -> str:
+    return f"\n[Note: {label} data unavailable: the backend did not answer in time.]\n"
+
+
+class RequestTimings:
+    """
+    Stage timings of one request.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.stages = {}
+        self.timed_out = []
+        self.ready_seconds = None
+
+    def stage(self, name: str, seconds: float, timed_out: bool = False):
+        self.stages[name] = seconds
+        if timed_out:
+            self.timed_out.append(name)
+
+    def inputs_ready(self):
+        """
+        Mark the moment the prompt has everything it waits for.
+        """
+        self.ready_seconds = time.perf_counter() - self.started
+
+    def report(self, llm_seconds: float = None) -> dict:
+        # Stages that missed their deadline may still finish (and record their time) meanwhile
+        stages = dict(self.stages)
+        critical = max(stages, key=stages.get) if stages else None
+        return {
+            "stages": stages,
+            "timed_out": list(self.timed_out),
+            "critical_stage": critical,
+            "inputs_ready_seconds": self.ready_seconds,
+            "llm_seconds": llm_seconds,
+            "total_seconds": time.perf_counter() - self.started,
+        }
+
+
+class LatencyTracker:
+    """
+    Keep the timing reports of recent requests and summarize them.
+    """
+
+    def __init__(self, history: int = LATENCY_HISTORY):
+        self.reports = deque(maxlen=history)
+        self.timeouts = {}
+        self._lock = threading.Lock()
+
+    def add(self, report: dict):
+        with self._lock:
+            self.reports.append(report)
+            for name in report["timed_out"]:
+                self.timeouts[stage_kind(name)] = self.timeouts.get(stage_kind(name), 0) + 1
+        logging.info("Request critical path: inputs ready in %.2fs (slowest stage %s), LLM %.2fs, total %.2fs%s",
+                     report["inputs_ready_seconds"] or 0.0, report["critical_stage"], report["llm_seconds"] or 0.0,
+                     report["total_seconds"],
+                     f", timed out: {', '.join(report['timed_out'])}" if report["timed_out"] else "")
+
+    def stats(self) -> dict:
+        with self._lock:
+            reports = list(self.reports)
+            timeouts = dict(self.timeouts)
+        if not reports:
+            return {"requests": 0, "timeouts": timeouts}
+        totals = sorted(report["total_seconds"] for report in reports)
+        ready = sorted(report["inputs_ready_seconds"] or 0.0 for report in reports)
+        critical = {}
+        for report in reports:
+            if report["critical_stage"]:
+                kind = stage_kind(report["critical_stage"])
+                critical[kind] = critical.get(kind, 0) + 1
+        return {
+            "requests": len(reports),
+            "total_p50_seconds": totals[len(totals) // 2],
+            "total_p95_seconds": totals[min(len(totals) - 1, int(len(totals) * 0.95))],
+            "inputs_ready_p50_seconds": ready[len(ready) // 2],
+            "critical_stage_counts": critical,
+            "timeouts": timeouts,
+            "last": reports[-1],
+        }
+
+
+class RequestExecutor:
+    """
+    Run the independent stages of a request concurrently, each bounded by its deadline.
+    """
+
+    def __init__(self, tracker: LatencyTracker, max_workers: int = STAGE_WORKERS, deadlines: dict = None,
+                 retrieval_workers: int = RETRIEVAL_WORKERS, background_workers: int = BACKGROUND_WORKERS):
+        self.tracker = tracker
+        self.deadlines = dict(STAGE_DEADLINES, **(deadlines or {}))
+        self.pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="request-stage")
+        self.retrieval_pool = ThreadPoolExecutor(max_workers=retrieval_workers, thread_name_prefix="request-retrieval")
+        self.background_pool = ThreadPoolExecutor(max_workers=background_workers, thread_name_prefix="request-background")
+
+    def _pool_for(self, name: str) -> ThreadPoolExecutor:
+        return self.retrieval_pool if stage_kind(name) == "retrieval" else self.pool
+
+    def _timed(self, name: str, timings: RequestTimings, function):
+        def run():
+            start = time.perf_counter()
+            try:
+                return function()
+            finally:
+                timings.stage(name, time.perf_counter() - start)
+        return run
+
+    def background(self, name: str, function):
+        """
+        Start a stage nobody waits for (e.g. the LLM warm-up); failures are only logged.
+        """
+        def run():
+            try:
+                function()
+            except Exception as e:
+                logging.error("Background stage %s failed: %s", name, e)
+        self.background_pool.submit(run)
+
+    def run(self, stages: list, timings: RequestTimings) -> dict:
+        """
+        Run (name, function, fallback) stages concurrently and return {name: result}. A stage that
+        raises or misses its deadline yields its fallback. `timings` records every stage.
+        """
+        futures = [(name, self._pool_for(name).submit(self._timed(name, timings, function)), fallback)
+                   for name, function, fallback in stages]
+        results = {}
+        for name, future, fallback in futures:
+            deadline = self.deadlines.get(stage_kind(name), max(self.deadlines.values()))
+            remaining = deadline - (time.perf_counter() - timings.started)
+            try:
+                results[name] = future.result(timeout=max(remaining, 0))
+            except FutureTimeoutError:
+                logging.error("Stage %s missed its %.1fs deadline", name, deadline)
+                timings.stage(name, deadline, timed_out=True)
+                results[name] = fallback
+            except Exception as e:
+                logging.error("Stage %s failed: %s", name, e)
+                results[name] = fallback
+        timings.inputs_ready()
+        return results
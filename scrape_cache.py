@@ -0,0 +1,181 @@
+"""
+Scraped-Page Cache and Per-Session Scrape Index for the RAG System for Portfolio Support
+
+`fetch_api_info()` used to look for a URL in the whole conversation history, so once a user
+pasted a link, /api/scrape was called again on every later turn, and the whole scraped payload
+was pasted into the prompt with `str(scrape_info)`. This module provides:
+  1. ScrapeCache: scraped payloads cached by URL. Entries are fresh for SCRAPE_TTL_SECONDS; after
+     that they are revalidated with the ETag the API sent (`If-None-Match`), so an unchanged page
+     costs a 304 and no body. The cache holds at most MAX_SCRAPE_ENTRIES pages (least recently
+     used first out), and pages not revalidated within SCRAPE_STALE_SECONDS are dropped.
+  2. ScrapeSessions: one small FAISS index per conversation session. Each scraped page is chunked
+     and embedded once into the session's index; every turn then retrieves only the passages of
+     that page that are relevant to the current query.
+"""
+
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from chunking import TranscriptChunker, embeddings_tokenizer
+
+SCRAPE_TTL_SECONDS = 900
+# Expired entries are kept this long for ETag revalidation, then dropped
+SCRAPE_STALE_SECONDS = 4 * SCRAPE_TTL_SECONDS
+MAX_SCRAPE_ENTRIES = 256
+SCRAPE_CHUNK_TOKENS = 120
+SCRAPE_PASSAGES = 3
+MAX_SCRAPE_SESSIONS = 256
+DEFAULT_SESSION = "default"
+
+
+class ScrapeCache:
+    """
+    Cache scraped payloads by URL with a TTL, revalidating expired entries by ETag (LRU bounded).
+    `fetch(url, etag)` must return (payload, etag), with payload None on 304 Not Modified.
+    """
+
+    def __init__(self, fetch, ttl_seconds: float = SCRAPE_TTL_SECONDS, max_entries: int = MAX_SCRAPE_ENTRIES,
+                 stale_seconds: float = SCRAPE_STALE_SECONDS):
+        self.fetch = fetch
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.stale_seconds = stale_seconds
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        # Versions are unique across the cache, so a page dropped and fetched again never reuses
+        # the version a session index was built from
+        self._version = 0
+        self.evicted = 0
+        self.hits = 0
+        self.revalidated = 0
+        self.fetches = 0
+
+    def get(self, url: str) -> dict:
+        """
+        Return {"payload", "etag", "version", "fetched_at"} for a URL. `version` changes whenever
+        the scraped content changes, so indexes built from it know when to rebuild.
+        """
+        with self._lock:
+            self._prune()
+            entry = self._entries.get(url)
+            if entry is not None:
+                self._entries.move_to_end(url)
+                if time.time() - entry["fetched_at"] < self.ttl_seconds:
+                    self.hits += 1
+                    return entry
+
+        payload, etag = self.fetch(url, entry["etag"] if entry is not None else None)
+        with self._lock:
+            if payload is None and entry is not None:
+                entry["fetched_at"] = time.time()
+                self.revalidated += 1
+                return entry
+            self._version += 1
+            entry = {"payload": payload, "etag": etag, "version": self._version, "fetched_at": time.time()}
+            self._entries[url] = entry
+            self._entries.move_to_end(url)
+            self.fetches += 1
+            self._prune()
+            return entry
+
+    def _prune(self):
+        """
+        Drop entries too stale to revalidate and the least recently used beyond max_entries.
+        Called with the lock held.
+        """
+        now = time.time()
+        for url in [url for url, entry in self._entries.items() if now - entry["fetched_at"] >= self.stale_seconds]:
+            del self._entries[url]
+            self.evicted += 1
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evicted += 1
+
+
+def scraped_text(payload) -> str:
+    """
+    The text of a scraped payload worth indexing (title and content of the /api/scrape response).
+    """
+    if isinstance(payload, dict):
+        parts = [payload.get("title"), payload.get("content")]
+        return "\n".join(str(part) for part in parts if part)
+    return str(payload)
+
+
+class ScrapeSessions:
+    """
+    One small FAISS index of scraped passages per conversation session (LRU bounded).
+    """
+
+    def __init__(self, load_embeddings, max_sessions: int = MAX_SCRAPE_SESSIONS,
+                 chunk_tokens: int = SCRAPE_CHUNK_TOKENS):
+        self.load_embeddings = load_embeddings
+        self.max_sessions = max_sessions
+        self.chunk_tokens = chunk_tokens
+        self._chunker = None
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _session(self, session_id: str) -> dict:
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                session = {"index": None, "urls": {}, "lock": threading.Lock()}
+                self._sessions[session_id] = session
+            self._sessions.move_to_end(session_id)
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+            return session
+
+    def reset(self, session_id: str):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def indexed_version(self, session_id: str, url: str):
+        session = self._session(session_id)
+        entry = session["urls"].get(url)
+        return entry["version"] if entry is not None else None
+
+    def add(self, session_id: str, url: str, entry: dict):
+        """
+        Chunk and embed a scraped page into the session index, replacing an older version of it.
+        """
+        from langchain.vectorstores import FAISS
+
+        if self._chunker is None:
+            self._chunker = TranscriptChunker(chunk_tokens=self.chunk_tokens, speaker_turns=False,
+                                              tokenizer=embeddings_tokenizer(self.load_embeddings()))
+        chunks = self._chunker.split_document(url, scraped_text(entry["payload"]))
+        payload = entry["payload"] if isinstance(entry["payload"], dict) else {}
+        for chunk in chunks:
+            chunk.metadata["title"] = payload.get("title")
+            chunk.metadata["date_published"] = payload.get("date_published")
+
+        session = self._session(session_id)
+        with session["lock"]:
+            previous = session["urls"].pop(url, None)
+            if previous is not None and previous["ids"]:
+                session["index"].delete(previous["ids"])
+            ids = []
+            if chunks:
+                if session["index"] is None:
+                    session["index"] = FAISS.from_documents(chunks, self.load_embeddings())
+                    ids = list(session["index"].index_to_docstore_id.values())
+                else:
+                    ids = session["index"].add_documents(chunks)
+            session["urls"][url] = {"version": entry["version"], "ids": ids}
+            logging.info("Indexed %d passages from %s for session %s", len(ids), url, session_id)
+
+    def search(self, session_id: str, url: str, query: str, k: int = SCRAPE_PASSAGES) -> list:
+        """
+        The passages of a scraped page most relevant to the query.
+        """
+        session = self._session(session_id)
+        with session["lock"]:
+            if session["index"] is None or url not in session["urls"]:
+                return []
+            index = session["index"]
+            # The index is small: let the source filter see every passage, not just the top 20.
+            return index.similarity_search(query, k=k, filter={"source": url}, fetch_k=index.index.ntotal)
@@ -0,0 +1,269 @@
+"""
+Structured (CSV / JSONL) Ingestion for the RAG System for Portfolio Support
+
+`extract_documents()` used to keep only the `.txt` files of the documents zip, and every chunk
+was free text. Tabular sources such as `data/books.csv` (2,382 books, 3 MB) could not be indexed.
+This module turns rows into chunks:
+  1. Rows are read one at a time (csv.DictReader or one JSON object per line), so a large file is
+     never parsed into memory at once. `ingest_file()` also embeds and indexes rows in batches of
+     INGEST_BATCH_ROWS straight from disk.
+  2. Short fields become typed metadata and a `field: value` header that is repeated in every
+     chunk of the row. A CSV column is typed int, float or bool only if all of its cells parse as
+     one, and cells with leading zeros (ISBNs, zip codes) are never numbers, so a title "1984" or
+     an ISBN "0002005883" stays the string it was and string filters keep matching.
+  3. Long text fields (descriptions, bodies) are split on sentences by chunking.TranscriptChunker
+     into what is left of the chunk size after the row's header (its tokens are counted), so no
+     chunk is truncated by the embedding model. Header lines of very wide rows that would leave
+     less than MIN_BODY_TOKENS are left out of the text (they stay in the metadata).
+  4. Every chunk records its source, doc_type ("csv", "jsonl" or "txt") and row number, so
+     retrieval can be filtered by them (see metadata_index.py).
+
+`split_corpus()` is the single entry point used by build_vector_store() and the corpus refresher:
+it sends `.csv` / `.jsonl` documents through the row chunker and everything else through the
+transcript chunker.
+"""
+
+import csv
+import io
+import json
+import logging
+import os
+import re
+
+from chunking import TranscriptChunker, embeddings_tokenizer
+
+TABULAR_EXTENSIONS = (".csv", ".jsonl")
+INGEST_BATCH_ROWS = 512
+# Fields with values up to this long are metadata and go into the row header; longer ones are body text
+MAX_METADATA_CHARS = 200
+# Tokens every chunk of a row with body text keeps for the body
+MIN_BODY_TOKENS = 60
+# Metadata keys set by the chunkers; row fields with these names are stored as "<name>_field"
+RESERVED_METADATA = {"source", "doc_type", "row", "start", "end", "speaker", "chunk", "tokens"}
+
+INTEGER = re.compile(r"^[+-]?\d+$")
+FLOAT = re.compile(r"^[+-]?(\d+\.\d*|\.\d+|\d+)([eE][+-]?\d+)?$")
+# "007", "0002005883": identifiers, not numbers ("0" and "0.5" are numbers)
+LEADING_ZERO = re.compile(r"^[+-]?0\d")
+URL = re.compile(r"^https?://\S+$")
+
+
+def doc_type(filename: str) -> str:
+    return os.path.splitext(filename)[1].lstrip(".").lower() or "txt"
+
+
+def value_type(text: str) -> str:
+    """
+    "int", "float", "bool" or "str": what a stripped CSV cell looks like.
+    """
+    if LEADING_ZERO.match(text):
+        return "str"
+    if INTEGER.match(text):
+        return "int"
+    if FLOAT.match(text):
+        return "float"
+    if text.lower() in ("true", "false"):
+        return "bool"
+    return "str"
+
+
+def column_types(rows) -> dict:
+    """
+    The type of every CSV column whose non-empty cells all look like one type ("int", "float",
+    with ints allowed, or "bool"). Other columns are strings and are left out.
+    """
+    types = {}
+    for row in rows:
+        for key, value in row.items():
+            if key is None or not isinstance(value, str) or not value.strip():
+                continue
+            kind = value_type(value.strip())
+            current = types.get(key, kind)
+            if current != kind:
+                kind = "float" if {current, kind} == {"int", "float"} else "str"
+            types[key] = kind
+    return {key: kind for key, kind in types.items() if kind != "str"}
+
+
+def infer_value(text, kind: str = None):
+    """
+    Type a CSV cell as its column's `kind` (see column_types), or, without one, as int, float or
+    bool where the cell looks like one. Otherwise (and for empty cells) the stripped string.
+    """
+    if not isinstance(text, str):
+        return text
+    value = text.strip()
+    kind = kind or value_type(value)
+    if not value or kind == "str":
+        return value
+    if kind == "int":
+        return int(value)
+    if kind == "float":
+        return float(value)
+    return value.lower() == "true"
+
+
+def iter_rows(filename: str, stream):
+    """
+    Yield one dict per row of a CSV or JSONL text stream. CSV columns are typed by a first pass
+    over a seekable stream (see column_types); other streams are typed cell by cell.
+    """
+    if doc_type(filename) == "csv":
+        types = None
+        if stream.seekable():
+            start = stream.tell()
+            types = column_types(csv.DictReader(stream))
+            stream.seek(start)
+        for row in csv.DictReader(stream):
+            yield {key: infer_value(value, types.get(key, "str") if types is not None else None)
+                   for key, value in row.items() if key is not None}
+        return
+    for line_number, line in enumerate(stream, start=1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as e:
+            logging.warning("Skipping line %d of %s: %s", line_number, filename, e)
+            continue
+        if isinstance(row, dict):
+            yield row
+
+
+class RowChunker:
+    """
+    Turn table rows into Documents: short fields become typed metadata and a header line, long
+    text fields are split on sentences with the header repeated in every chunk.
+    """
+
+    def __init__(self, chunker: TranscriptChunker = None):
+        chunker = chunker or TranscriptChunker()
+        self.chunk_tokens = chunker.chunk_tokens
+        self.tokenizer = chunker.tokenizer
+        self._body_chunkers = {}
+
+    def count_tokens(self, texts: list) -> list:
+        if not texts:
+            return []
+        return [len(ids) for ids in self.tokenizer(texts, add_special_tokens=False)["input_ids"]]
+
+    def _body_chunker(self, source: str, body_tokens: int) -> TranscriptChunker:
+        # Body chunks are split with a `[source]` prefix that is replaced by the row header
+        chunk_tokens = body_tokens + self.count_tokens([f"[{source}]\n"])[0]
+        if chunk_tokens not in self._body_chunkers:
+            self._body_chunkers[chunk_tokens] = TranscriptChunker(chunk_tokens=chunk_tokens, tokenizer=self.tokenizer,
+                                                                  speaker_turns=False)
+        return self._body_chunkers[chunk_tokens]
+
+    @staticmethod
+    def _metadata_value(value):
+        if isinstance(value, (str, int, float, bool)) or value is None:
+            return value
+        if isinstance(value, list) and all(isinstance(item, (str, int, float, bool)) for item in value):
+            return value
+        return None
+
+    def split_row(self, source: str, row_number: int, row: dict) -> list:
+        from langchain.docstore.document import Document
+
+        metadata = {"source": source, "doc_type": doc_type(source), "row": row_number}
+        header, body = [], []
+        for key, value in row.items():
+            if value in (None, "", []):
+                continue
+            text = ", ".join(map(str, value)) if isinstance(value, list) else str(value)
+            if len(text) > MAX_METADATA_CHARS:
+                body.append(text)
+                continue
+            field = f"{key}_field" if key in RESERVED_METADATA else key
+            if self._metadata_value(value) is not None:
+                metadata[field] = value
+            # Links are kept as metadata but would only cost tokens in the embedded text
+            if not URL.match(text):
+                header.append(f"{key}: {text}")
+
+        prefix = f"[{source}]\n"
+        header_text = prefix + "\n".join(header)
+        header_tokens = self.count_tokens([header_text])[0]
+        if not body:
+            return [Document(page_content=header_text, metadata=dict(metadata, chunk=0, tokens=header_tokens))]
+        if header_tokens > self.chunk_tokens - MIN_BODY_TOKENS:
+            # A wide row: keep the header lines that fit, the rest stay in the metadata only
+            budget = self.chunk_tokens - MIN_BODY_TOKENS - self.count_tokens([prefix])[0]
+            kept = []
+            for line, tokens in zip(header, self.count_tokens(header)):
+                if tokens > budget:
+                    break
+                kept.append(line)
+                budget -= tokens
+            header_text = prefix + "\n".join(kept)
+            header_tokens = self.count_tokens([header_text])[0]
+        documents = []
+        body_chunker = self._body_chunker(source, self.chunk_tokens - header_tokens)
+        for index, chunk in enumerate(body_chunker.split_document(source, "\n".join(body))):
+            text = chunk.page_content.split("\n", 1)[1]
+            documents.append(Document(page_content=f"{header_text}\n{text}",
+                                      metadata=dict(metadata, chunk=index,
+                                                    tokens=header_tokens + chunk.metadata["tokens"])))
+        return documents
+
+    def iter_chunks(self, source: str, stream):
+        """
+        Yield the chunks of every row of a CSV or JSONL stream, one row at a time.
+        """
+        for row_number, row in enumerate(iter_rows(source, stream)):
+            yield from self.split_row(source, row_number, row)
+
+
+def split_corpus(documents: dict, chunker: TranscriptChunker = None) -> list:
+    """
+    Split a {filename: content} dictionary (as returned by extract_documents) into Documents:
+    tabular files row by row, everything else with the transcript chunker. Every chunk gets a
+    doc_type.
+    """
+    chunker = chunker or TranscriptChunker()
+    row_chunker = None
+    chunks = []
+    for filename, content in documents.items():
+        if filename.lower().endswith(TABULAR_EXTENSIONS):
+            row_chunker = row_chunker or RowChunker(chunker)
+            chunks.extend(row_chunker.iter_chunks(filename, io.StringIO(content)))
+            continue
+        for chunk in chunker.split_document(filename, content):
+            chunk.metadata["doc_type"] = doc_type(filename)
+            chunks.append(chunk)
+    return chunks
+
+
+def ingest_file(path: str, embeddings, vector_store=None, chunker: TranscriptChunker = None,
+                batch_rows: int = INGEST_BATCH_ROWS):
+    """
+    Stream a CSV or JSONL file from disk into a FAISS vector store (a new one if None), embedding
+    INGEST_BATCH_ROWS rows at a time. Returns the vector store.
+    """
+    from langchain.vectorstores import FAISS
+
+    source = os.path.basename(path)
+    row_chunker = RowChunker(chunker or TranscriptChunker(tokenizer=embeddings_tokenizer(embeddings)))
+    rows = chunks = 0
+    with open(path, encoding="utf-8", newline="") as f:
+        batch = []
+        for row_number, row in enumerate(iter_rows(source, f)):
+            batch.extend(row_chunker.split_row(source, row_number, row))
+            rows += 1
+            if rows % batch_rows == 0:
+                vector_store = _add_batch(vector_store, batch, embeddings, FAISS)
+                chunks += len(batch)
+                batch = []
+        if batch:
+            vector_store = _add_batch(vector_store, batch, embeddings, FAISS)
+            chunks += len(batch)
+    logging.info("Ingested %d rows (%d chunks) from %s", rows, chunks, path)
+    return vector_store
+
+
+def _add_batch(vector_store, batch: list, embeddings, faiss_store):
+    if vector_store is None:
+        return faiss_store.from_documents(batch, embeddings)
+    vector_store.add_documents(batch)
+    return vector_store
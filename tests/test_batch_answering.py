@@ -0,0 +1,45 @@
+import json
+
+import pytest
+
+pytest.importorskip("requests")
+
+from batch_answering import MAX_BATCH_ITEMS, clamp_workers, parse_batch, BATCH_WORKERS  # noqa: E402
+
+
+def test_parse_batch_items_and_defaults():
+    items = parse_batch([
+        json.dumps({"query": "Who is Jane?", "id": "q1", "filter": {"doc_type": "txt"}, "session_id": "s"}),
+        "",
+        b'{"query": "Sectors?", "history": "User: hi"}',
+    ])
+    assert items[0] == {"index": 0, "id": "q1", "query": "Who is Jane?", "history": "\nUser: Who is Jane?",
+                        "filter": {"doc_type": "txt"}, "session_id": "s"}
+    assert items[1]["index"] == 1 and items[1]["id"] == 1
+    assert items[1]["history"] == "User: hi\nUser: Sectors?"
+    assert items[1]["filter"] is None
+
+
+def test_parse_batch_invalid_lines_become_errors():
+    items = parse_batch([
+        "not json",
+        json.dumps({"id": "x"}),
+        json.dumps({"query": "q", "id": "f", "filter": "txt"}),
+        json.dumps({"query": "q", "id": "h", "history": ["a"]}),
+    ])
+    assert [(item["index"], item["id"]) for item in items] == [(0, None), (1, None), (2, "f"), (3, "h")]
+    assert items[0]["error"].startswith("Invalid JSON")
+    assert items[1]["error"] == "Missing 'query' parameter"
+    assert items[2]["error"] == "'filter' must be an object"
+    assert items[3]["error"] == "'history' must be a string"
+
+
+def test_parse_batch_size_limit():
+    with pytest.raises(ValueError):
+        parse_batch([json.dumps({"query": "q"})] * (MAX_BATCH_ITEMS + 1))
+
+
+def test_clamp_workers():
+    assert clamp_workers(0) == 1
+    assert clamp_workers("2") == min(2, BATCH_WORKERS)
+    assert clamp_workers(10 ** 6) == BATCH_WORKERS
@@ -0,0 +1,122 @@
+from types import SimpleNamespace
+
+import pytest
+
+import chunking
+from chunking import TranscriptChunker, embeddings_tokenizer, split_sentences, split_speaker_turns
+
+
+class WordTokenizer:
+    """
+    One token per whitespace separated word, called like a transformers tokenizer.
+    """
+
+    def __call__(self, texts, add_special_tokens=True):
+        return {"input_ids": [text.split() for text in texts]}
+
+
+def chunker(chunk_tokens, overlap_tokens=0, speaker_turns=True):
+    return TranscriptChunker(chunk_tokens=chunk_tokens, overlap_tokens=overlap_tokens, tokenizer=WordTokenizer(),
+                             speaker_turns=speaker_turns)
+
+
+def turns(text):
+    return [(speaker, text[start:end].strip()) for speaker, start, end in split_speaker_turns(text)]
+
+
+def test_speaker_turns_line_start():
+    assert turns("Jane: Hi.\nBob: Hello.") == [("Jane", "Jane: Hi."), ("Bob", "Bob: Hello.")]
+
+
+def test_inline_turns_of_a_consistently_labelled_transcript():
+    text = "Welcome everyone. Jane Doe: Thanks for having me. Bob: Glad to be here. Jane Doe: Great. Bob: Yes."
+    assert turns(text) == [(None, "Welcome everyone."), ("Jane Doe", "Jane Doe: Thanks for having me."),
+                           ("Bob", "Bob: Glad to be here."), ("Jane Doe", "Jane Doe: Great."), ("Bob", "Bob: Yes.")]
+
+
+def test_inline_label_of_a_known_speaker():
+    text = "Jane: We grew fast. Bob: We did.\nBob: Then we slowed down."
+    assert [speaker for speaker, _ in turns(text)] == ["Jane", "Bob", "Bob"]
+
+
+@pytest.mark.parametrize("text", [
+    "Read the manual first. Note: the warranty is void if opened.",
+    "Unpack the box. Step 1: remove the cover. Step 2: plug it in.",
+    "Revenue grew last year. Q3 2024: best quarter so far.",
+    "It was late. WARNING: spoilers ahead. Note: the ending is sad.",
+    "He looked at his friend. So Mark: what now? He had no answer.",
+    "The story starts. Lesson One: build trust.",
+])
+def test_prose_labels_are_not_speakers(text):
+    assert split_speaker_turns(text) == [(None, 0, len(text))]
+
+
+def test_speaker_label_needs_sentence_boundary():
+    text = "We asked the team what matters: growth and retention."
+    assert split_speaker_turns(text) == [(None, 0, len(text))]
+
+
+def test_split_sentences_offsets():
+    text = "One two. Three four! Five?"
+    assert [text[start:end].strip() for start, end in split_sentences(text, 0, len(text))] == [
+        "One two.", "Three four!", "Five?"]
+
+
+def test_long_sentence_split_on_words():
+    text = "a b c d e f g"
+    pieces = chunker(10)._split_long_sentence(text, 0, len(text), 3)
+    assert [text[start:end].strip() for start, end, _ in pieces] == ["a b c", "d e f", "g"]
+    assert [tokens for _, _, tokens in pieces] == [3, 3, 1]
+
+
+def test_chunks_keep_sentence_boundaries_and_budget():
+    pytest.importorskip("langchain")
+    text = " ".join(f"Sentence {i} has five words." for i in range(10))
+    # "[doc.txt]" is one token of the budget
+    documents = chunker(11).split_document("doc.txt", text)
+    assert len(documents) == 5
+    for document in documents:
+        assert document.page_content.startswith("[doc.txt]\n")
+        assert document.page_content.endswith(".")
+        assert document.metadata["tokens"] <= 10
+        assert text[document.metadata["start"]:document.metadata["end"]].strip() == \
+            document.page_content.split("\n", 1)[1]
+    assert [document.metadata["chunk"] for document in documents] == list(range(5))
+
+
+def test_chunks_overlap_by_whole_sentences():
+    pytest.importorskip("langchain")
+    text = " ".join(f"Sentence {i} has five words." for i in range(6))
+    documents = chunker(11, overlap_tokens=5).split_document("doc.txt", text)
+    for previous, current in zip(documents, documents[1:]):
+        last_sentence = previous.page_content.rsplit(".", 2)[-2].strip() + "."
+        assert current.page_content.split("\n", 1)[1].startswith(last_sentence)
+        assert current.metadata["start"] < previous.metadata["end"]
+
+
+def test_chunks_follow_speaker_turns():
+    pytest.importorskip("langchain")
+    text = "Jane: We grew fast.\nBob: We did."
+    documents = chunker(50).split_document("talk.txt", text)
+    assert [(document.metadata["speaker"], document.page_content) for document in documents] == [
+        ("Jane", "[talk.txt]\nJane: We grew fast."), ("Bob", "[talk.txt]\nBob: We did.")]
+
+
+def test_speaker_turns_off_for_other_text():
+    pytest.importorskip("langchain")
+    text = "Note: the cover is new.\nBob: a character."
+    chunks = chunker(50, speaker_turns=False).split_document("books.csv", text)
+    assert [(chunk.metadata["speaker"], chunk.page_content) for chunk in chunks] == [
+        (None, "[books.csv]\nNote: the cover is new.\nBob: a character.")]
+
+
+def test_tokenizer_follows_the_embeddings(monkeypatch):
+    monkeypatch.setattr(chunking, "load_tokenizer", lambda tokenizer_file=None: tokenizer_file)
+    onnx = SimpleNamespace(tokenizer_file="models/onnx/tokenizer.json")
+    assert embeddings_tokenizer(onnx) == "models/onnx/tokenizer.json"
+    assert embeddings_tokenizer(SimpleNamespace()) is None
+
+
+def test_overlap_must_be_smaller_than_chunk():
+    with pytest.raises(ValueError):
+        chunker(10, overlap_tokens=10)
@@ -0,0 +1,76 @@
+from types import SimpleNamespace
+
+import pytest
+
+from context_assembly import merge_passages, mmr_order
+
+
+SOURCE = "First part of the talk. The overlapping sentence. The last part here. Unrelated closing remark."
+
+
+def chunk(source, start, end, text=None):
+    """
+    A chunk as the chunker builds it: the stripped text between its offsets, after its prefix.
+    """
+    text = SOURCE[start:end].strip() if text is None else text
+    return SimpleNamespace(page_content=f"[{source}]\n{text}", metadata={"source": source, "start": start, "end": end})
+
+
+def sentence_offsets(*sentences):
+    start = SOURCE.index(sentences[0])
+    return start, SOURCE.index(sentences[-1]) + len(sentences[-1]) + 1
+
+
+def test_merge_overlapping_chunks_keeps_text_once():
+    first = sentence_offsets("First part of the talk.", "The overlapping sentence.")
+    second = sentence_offsets("The overlapping sentence.", "The last part here.")
+    passages = merge_passages([chunk("a.txt", *second), chunk("a.txt", *first)])
+    assert len(passages) == 1
+    passage = passages[0]
+    assert (passage["start"], passage["end"], passage["chunks"], passage["rank"]) == (first[0], second[1], 2, 0)
+    assert passage["prefix"] == "[a.txt]"
+    assert passage["text"] == SOURCE[first[0]:second[1]].strip()
+    assert passage["text"].count("The overlapping sentence.") == 1
+
+
+def test_merge_contained_chunk_adds_nothing():
+    outer = sentence_offsets("First part of the talk.", "The last part here.")
+    inner = sentence_offsets("The overlapping sentence.")
+    passages = merge_passages([chunk("a.txt", *inner), chunk("a.txt", *outer)])
+    assert [(passage["text"], passage["chunks"]) for passage in passages] == [(SOURCE[outer[0]:outer[1]].strip(), 2)]
+
+
+def test_merge_adjacent_chunks_but_not_distant_ones():
+    first = sentence_offsets("First part of the talk.")
+    second = sentence_offsets("The overlapping sentence.")
+    last = sentence_offsets("Unrelated closing remark.")
+    passages = merge_passages([chunk("a.txt", *first), chunk("a.txt", *second), chunk("a.txt", *last)])
+    assert [(passage["text"], passage["chunks"]) for passage in passages] == [
+        (SOURCE[first[0]:second[1]].strip(), 2), (SOURCE[last[0]:last[1]].strip(), 1)]
+
+
+def test_merge_keeps_sources_apart_and_orders_by_best_rank():
+    passages = merge_passages([
+        chunk("b.txt", 0, 24),
+        chunk("a.txt", 0, 24),
+        chunk("b.txt", 24, 50),
+    ])
+    assert [passage["source"] for passage in passages] == ["b.txt", "a.txt"]
+
+
+def test_merge_drops_duplicate_chunks_without_offsets():
+    docs = [SimpleNamespace(page_content="same", metadata={}), SimpleNamespace(page_content="same", metadata={})]
+    assert len(merge_passages(docs)) == 1
+
+
+def test_mmr_prefers_relevant_then_diverse():
+    pytest.importorskip("numpy")
+    query = [1.0, 0.0]
+    vectors = [[1.0, 0.0], [0.99, 0.01], [0.6, 0.8]]
+    assert mmr_order(query, vectors, 3, lambda_mult=0.3)[:2] == [0, 2]
+    assert mmr_order(query, vectors, 3, lambda_mult=1.0) == [0, 1, 2]
+
+
+def test_mmr_respects_limit():
+    pytest.importorskip("numpy")
+    assert len(mmr_order([1.0, 0.0], [[1.0, 0.0], [0.0, 1.0], [0.5, 0.5]], 2)) == 2
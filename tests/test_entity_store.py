@@ -0,0 +1,34 @@
+from entity_store import NameIndex, normalize_name
+
+RECORDS = [
+    {"name": "Jane Doe", "title": "Partner"},
+    {"name": "John Smith", "title": "Principal"},
+    {"name": "Acme Holdings & Co.", "title": None},
+    {"name": "", "title": "ignored"},
+]
+
+
+def test_normalize_name():
+    assert normalize_name("  Acme Holdings & Co. ") == "acme holdings & co"
+
+
+def test_find_exact_after_normalizing():
+    assert NameIndex(RECORDS, "name").find("jane   DOE")["title"] == "Partner"
+
+
+def test_find_fuzzy():
+    assert NameIndex(RECORDS, "name").find("Jon Smith")["title"] == "Principal"
+
+
+def test_find_by_unique_words():
+    assert NameIndex(RECORDS, "name").find("Acme")["name"] == "Acme Holdings & Co."
+
+
+def test_find_ambiguous_or_unknown():
+    index = NameIndex(RECORDS + [{"name": "Jane Roe"}], "name")
+    assert index.find("Jane") is None
+    assert index.find("Nobody Here") is None
+
+
+def test_records_without_key_are_skipped():
+    assert NameIndex(RECORDS, "name").names == ["jane doe", "john smith", "acme holdings & co"]
@@ -0,0 +1,48 @@
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("faiss")
+pytest.importorskip("numpy")
+
+from metadata_index import MetadataIndex  # noqa: E402
+
+
+def vector_store(metadatas):
+    docs = {f"id{i}": SimpleNamespace(metadata=metadata) for i, metadata in enumerate(metadatas)}
+    return SimpleNamespace(index_to_docstore_id={i: f"id{i}" for i in range(len(metadatas))},
+                           docstore=SimpleNamespace(search=docs.get))
+
+
+@pytest.fixture
+def index():
+    return MetadataIndex(vector_store([
+        {"source": "a.txt", "doc_type": "txt", "speaker": "Jane Doe", "start": 0},
+        {"source": "a.txt", "doc_type": "txt", "speaker": "Bob", "start": 10},
+        {"source": "books.csv", "doc_type": "csv", "year": 1949, "tags": ["fiction", "classic"]},
+    ]))
+
+
+def test_candidates_match_every_field(index):
+    assert index.candidates({"doc_type": "txt"}) == {0, 1}
+    assert index.candidates({"doc_type": "txt", "speaker": "Bob"}) == {1}
+    assert index.candidates({"doc_type": "csv", "speaker": "Bob"}) == set()
+
+
+def test_candidates_match_any_listed_value(index):
+    assert index.candidates({"speaker": ["Bob", "Jane Doe"]}) == {0, 1}
+
+
+def test_candidates_ignore_case_of_strings(index):
+    assert index.candidates({"speaker": " jane doe"}) == {0}
+
+
+def test_candidates_of_typed_and_list_values(index):
+    assert index.candidates({"year": 1949}) == {2}
+    assert index.candidates({"tags": "classic"}) == {2}
+
+
+def test_unindexed_and_unknown_fields_match_nothing(index):
+    assert index.candidates({"start": 0}) == set()
+    assert index.candidates({"missing": "x"}) == set()
+    assert index.candidates({}) == set()
@@ -0,0 +1,81 @@
+import threading
+import time
+
+import pytest
+
+from request_executor import LatencyTracker, RequestExecutor, RequestTimings, stage_kind
+
+DEADLINES = {"retrieval": 0.5, "api": 0.2, "scrape": 0.3}
+
+
+@pytest.fixture
+def executor():
+    executor = RequestExecutor(LatencyTracker(), deadlines=DEADLINES)
+    yield executor
+    for pool in (executor.pool, executor.retrieval_pool, executor.background_pool):
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+def test_stage_kind():
+    assert [stage_kind(name) for name in ("retrieval", "api:0:team", "scrape:1:scrape")] == ["retrieval", "api", "scrape"]
+
+
+def test_stages_in_time_slow_and_failing(executor):
+    release = threading.Event()
+
+    def hang():
+        release.wait(5)
+        return "late"
+
+    def fail():
+        raise RuntimeError("backend down")
+
+    timings = RequestTimings()
+    start = time.perf_counter()
+    results = executor.run([
+        ("retrieval", lambda: "context", ""),
+        ("api:0:team", hang, "team unavailable"),
+        ("api:1:sectors", fail, "sectors unavailable"),
+        ("scrape:2:scrape", lambda: "page", "page unavailable"),
+    ], timings)
+    elapsed = time.perf_counter() - start
+    release.set()
+
+    assert results == {"retrieval": "context", "api:0:team": "team unavailable",
+                       "api:1:sectors": "sectors unavailable", "scrape:2:scrape": "page"}
+    # The hung stage is given up at its deadline, not waited for
+    assert DEADLINES["api"] <= elapsed < DEADLINES["retrieval"]
+    assert timings.timed_out == ["api:0:team"]
+    assert timings.ready_seconds is not None
+    assert set(timings.stages) == {"retrieval", "api:0:team", "api:1:sectors", "scrape:2:scrape"}
+
+
+def test_deadline_counts_from_request_start(executor):
+    timings = RequestTimings()
+    time.sleep(DEADLINES["api"])
+    results = executor.run([("api:0:team", lambda: time.sleep(0.1) or "data", "unavailable")], timings)
+    assert results == {"api:0:team": "unavailable"}
+    assert timings.timed_out == ["api:0:team"]
+
+
+def test_unknown_stage_kind_uses_the_longest_deadline(executor):
+    timings = RequestTimings()
+    results = executor.run([("other", lambda: time.sleep(DEADLINES["scrape"]) or "done", "fallback")], timings)
+    assert results == {"other": "done"}
+    assert timings.timed_out == []
+
+
+def test_timed_out_stages_are_counted_by_the_tracker(executor):
+    timings = RequestTimings()
+    executor.run([("api:0:team", lambda: time.sleep(0.5), "unavailable")], timings)
+    executor.tracker.add(timings.report(llm_seconds=0.1))
+    stats = executor.tracker.stats()
+    assert stats["requests"] == 1
+    assert stats["timeouts"] == {"api": 1}
+
+
+def test_background_failures_are_only_logged(executor):
+    done = threading.Event()
+    executor.background("warmup", lambda: 1 / 0)
+    executor.background("warmup", done.set)
+    assert done.wait(1)
@@ -0,0 +1,101 @@
+import pytest
+
+import scrape_cache
+from scrape_cache import ScrapeCache
+
+
+class FakeFetch:
+    """
+    /api/scrape stand-in: serves `pages`, answering 304 when the ETag matches.
+    """
+
+    def __init__(self):
+        self.pages = {}
+        self.calls = []
+
+    def __call__(self, url, etag):
+        self.calls.append((url, etag))
+        payload, current = self.pages.get(url, ({"content": url}, f"etag-{url}"))
+        if etag is not None and etag == current:
+            return None, etag
+        return payload, current
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(scrape_cache.time, "time", lambda: now[0])
+    return now
+
+
+def test_fresh_entries_are_served_from_memory(clock):
+    fetch = FakeFetch()
+    cache = ScrapeCache(fetch, ttl_seconds=60)
+    first = cache.get("a")
+    clock[0] += 59
+    assert cache.get("a") is first
+    assert fetch.calls == [("a", None)]
+    assert (cache.fetches, cache.hits) == (1, 1)
+
+
+def test_expired_entry_is_revalidated_by_etag(clock):
+    fetch = FakeFetch()
+    cache = ScrapeCache(fetch, ttl_seconds=60)
+    first = cache.get("a")
+    clock[0] += 61
+    again = cache.get("a")
+    # 304: the cached entry is reused and fresh again, with the same version
+    assert again is first and again["version"] == first["version"] and again["fetched_at"] == clock[0]
+    assert fetch.calls == [("a", None), ("a", "etag-a")]
+    assert (cache.fetches, cache.revalidated) == (1, 1)
+    clock[0] += 30
+    cache.get("a")
+    assert len(fetch.calls) == 2
+
+
+def test_changed_page_gets_a_new_version(clock):
+    fetch = FakeFetch()
+    cache = ScrapeCache(fetch, ttl_seconds=60)
+    first = cache.get("a")
+    fetch.pages["a"] = ({"content": "new"}, "etag-2")
+    clock[0] += 61
+    changed = cache.get("a")
+    assert changed["payload"] == {"content": "new"} and changed["etag"] == "etag-2"
+    assert changed["version"] > first["version"]
+
+
+def test_least_recently_used_entry_is_evicted_at_the_bound(clock):
+    fetch = FakeFetch()
+    cache = ScrapeCache(fetch, ttl_seconds=60, max_entries=2)
+    cache.get("a")
+    cache.get("b")
+    cache.get("a")
+    cache.get("c")
+    assert list(cache._entries) == ["a", "c"]
+    assert cache.evicted == 1
+    cache.get("b")
+    assert fetch.calls[-1] == ("b", None)
+
+
+def test_stale_entries_are_dropped(clock):
+    fetch = FakeFetch()
+    cache = ScrapeCache(fetch, ttl_seconds=60, stale_seconds=300)
+    cache.get("a")
+    clock[0] += 200
+    cache.get("b")
+    assert list(cache._entries) == ["a", "b"]
+    clock[0] += 150
+    first_b = cache._entries["b"]
+    cache.get("b")
+    # "a" was last fetched 350s ago: dropped, and fetched in full (no ETag) next time
+    assert list(cache._entries) == ["b"] and cache._entries["b"] is first_b
+    cache.get("a")
+    assert fetch.calls[-1] == ("a", None)
+
+
+def test_refetched_page_never_reuses_a_version(clock):
+    fetch = FakeFetch()
+    cache = ScrapeCache(fetch, ttl_seconds=60, max_entries=1)
+    version = cache.get("a")["version"]
+    cache.get("b")
+    assert cache.get("a")["version"] != version